@@ -0,0 +1,14 @@
+from sys import argv
+
+from cmdline_module import batch_cmdline_interpret
+
+from batch_module import HMbatch
+
+
+
+### ---- MAIN ---- ###    
+batch_param = batch_cmdline_interpret(argv)
+HMbatch(batch_file      = batch_param["batch"], 
+        batch_cores     = batch_param["cores"], 
+        project_cores   = batch_param["project_cores"], 
+        extra_args      = batch_param["extra_args"])
@@ -12,30 +12,45 @@ from stage_modules import HierarchicalMethod
 
 from cmdline_module import cmdline_interpret
 
+from journal_module import new_Journal
+from journal_module import check_Journal_resumable
+
+from bpp_cache_module import init_BPP_cache
+from bpp_cache_module import BPP_cache_report
+
+from core_scheduler_module import set_Core_limit
+from core_scheduler_module import inherit_Core_block
+
+from speculation_module import cancel_Speculative
+from speculation_module import speculation_Report
+
+from helper_functions import read_MasterControl
+
 def delimit_steps  (
     mc_file,
     p_state,
+    resume = False
                     ):
 
     if   p_state == "A00":
-        HierarchicalMethod(mc_file)
+        HierarchicalMethod(mc_file, resume = resume)
 
     elif p_state == "A01+A00":
-        guide_tree = StartingTopolgy(mc_file)
-        HierarchicalMethod(mc_file, input_guide_tree = guide_tree)
+        guide_tree = StartingTopolgy(mc_file, resume = resume)
+        HierarchicalMethod(mc_file, input_guide_tree = guide_tree, resume = resume)
         
     elif p_state == "A11+A00":
-        guide_tree, imap = StartingDelimitation(mc_file)
-        HierarchicalMethod(mc_file, input_guide_tree = guide_tree, input_imap = imap)
+        guide_tree, imap = StartingDelimitation(mc_file, resume = resume)
+        HierarchicalMethod(mc_file, input_guide_tree = guide_tree, input_imap = imap, resume = resume)
     
     elif p_state == "A01+A11+A00":
-        tree = StartingTopolgy(mc_file)
-        guide_tree, imap = StartingDelimitation(mc_file, starting_tree = tree)
-        HierarchicalMethod(mc_file, input_guide_tree = guide_tree, input_imap = imap)
+        tree = StartingTopolgy(mc_file, resume = resume)
+        guide_tree, imap = StartingDelimitation(mc_file, starting_tree = tree, resume = resume)
+        HierarchicalMethod(mc_file, input_guide_tree = guide_tree, input_imap = imap, resume = resume)
 
-def HMpipeline(mc_file, checkonly):
+def HMpipeline(mc_file, checkonly, resume = False):
     # check if any of the parameters in master control file are erroneously specified
-    check_Master_Control(mc_file)
+    check_Master_Control(mc_file, resume)
     
     # check which parameters are provided, and set the pipeline to begin the appropriate stage
     p_state = find_initial_State(mc_file)
@@ -49,11 +64,29 @@ def HMpipeline(mc_file, checkonly):
     # exit if pipeline is in check only mode
     if checkonly == True: exit()
 
-    #run the appropriate stages of the pipeline
-    delimit_steps(mc_file, p_state)
+    # start a new journal of the progress of the run, or continue the journal of an interrupted run
+    if resume == True:
+        check_Journal_resumable(mc_file, p_state)
+    else:
+        new_Journal(mc_file, p_state)
+
+    # limit the cores that the BPP jobs of the run may use
+    set_Core_limit(read_MasterControl(mc_file)["max_cores"])
+    inherit_Core_block()
+
+    # reuse the results of identical BPP jobs from previous runs in the working directory
+    init_BPP_cache("HMDelimit_BPP_cache")
+
+    #run the appropriate stages of the pipeline, and report the use of the BPP result cache and speculation at the end
+    try:
+        delimit_steps(mc_file, p_state, resume)
+    finally:
+        cancel_Speculative()
+        speculation_Report()
+        BPP_cache_report()
 
 
 
 ### ---- MAIN ---- ###    
-mc_file, checkonly = cmdline_interpret(argv)
-HMpipeline(mc_file, checkonly)
\ No newline at end of file
+mc_file, checkonly, resume = cmdline_interpret(argv)
+HMpipeline(mc_file, checkonly, resume)
\ No newline at end of file
@@ -0,0 +1,12 @@
+from sys import argv
+
+from cmdline_module import replay_cmdline_interpret
+
+from replay_module import HMreplay
+
+
+
+### ---- MAIN ---- ###    
+replay_param = replay_cmdline_interpret(argv)
+HMreplay(input_mcfile   = replay_param["mcf"], 
+         grid_values    = replay_param["grid"])
@@ -7,17 +7,17 @@ import copy
 import os
 import re
 import shutil
-from itertools import repeat
-import multiprocessing as mp
 
 import numpy as np
 
-from helper_functions import BPP_run_capture
+from helper_functions import BPP_run_concurrent
 from helper_functions import dict_to_bppcfile
 from helper_functions import BPP_summary
-from helper_functions import BPP_resume_capture
+from helper_functions import newest_Checkpoint
 from helper_functions import path_filename
 
+from core_scheduler_module import plan_BPP_cores
+
 from data_dicts import clprnt
 
 from align_imap_module import autoPopParam
@@ -25,8 +25,8 @@ from align_imap_module import autoPrior
 
 
 # collect the values of the parameters produced by BPP
-def get_parameters_from_MCMC():
-    full_out = BPP_summary("bpp.ctl")
+def get_parameters_from_MCMC(folder_name):
+    full_out = BPP_summary("bpp.ctl", cwd = folder_name)
     lines = full_out.split("\n")
     
     def extract_list(keyword, sourcelines):
@@ -68,15 +68,15 @@ std_cfile = {'seed': '-1',
 
 iteration_size = 10000
 
-# perform the iterations from the burn in up to and including the first checkpoint
-def generate_param_burinin(guide_tree, imapfile, seqfile, smpl, burnin, priors, core_offset, index):
-    pop_param = autoPopParam(imapfile, seqfile)
+# set up the BPP job performing the iterations from the burn in up to and including the first checkpoint
+def generate_param_burinin(guide_tree, imapfile, seqfile, smpl, burnin, priors, threads, index, working_dir):
+    pop_param = autoPopParam(os.path.join(working_dir, imapfile), os.path.join(working_dir, seqfile))
     cdict = copy.deepcopy(std_cfile)
     cdict["nsample"] = smpl
     cdict["burnin"] = burnin
     cdict["seqfile"] = f"../{seqfile}"
     cdict["imapfile"] = f"../{imapfile}"
-    cdict["threads"] = f"2 {int(np.round(((index+0.5)*2), decimals = 2)+ core_offset )}"
+    cdict["threads"] = threads
     cdict['species&tree'] = pop_param["species&tree"]
     cdict['popsizes'] = pop_param["popsizes"]
     cdict["newick"] = guide_tree
@@ -85,34 +85,20 @@ def generate_param_burinin(guide_tree, imapfile, seqfile, smpl, burnin, priors,
     cdict["tauprior"] = priors['tauprior']
     cdict["checkpoint"] = f"{iteration_size+burnin} {iteration_size}"
     
-    folder_name = f"replicate_{index}"
+    folder_name = os.path.join(working_dir, f"replicate_{index}")
     os.mkdir(folder_name)
-    os.chdir(folder_name)
-    dict_to_bppcfile(cdict, "bpp.ctl")
-    BPP_run_capture("bpp.ctl", index)
-    parameters = get_parameters_from_MCMC()
-    
-    os.chdir("..")
+    dict_to_bppcfile(cdict, os.path.join(folder_name, "bpp.ctl"))
     
-    return parameters
+    return {"args":["--cfile", "bpp.ctl"], "cwd":folder_name, "stop_at_checkpoint":True}
 
-# iterate the parameter values by extending the BPP run by X samples
+# get the BPP job extending the run of a replicate by X samples from its last checkpoint
 def iterate_param_from_chk(input_folder):
-    os.chdir(input_folder)
-    
-    ls = os.listdir()
-    chk_filenames = [file for file in ls if ".chk" in str(file)]
-    chk_maxval = max([int(filename.split(".")[-2]) for filename in chk_filenames])
-    chk_filename = f"out.txt.{chk_maxval}.chk"
-    
-    BPP_resume_capture(chk_filename, input_folder.split("_")[-1])
-    parameters = get_parameters_from_MCMC()
-    os.chdir("..")
+    chk_filename = newest_Checkpoint("out.txt", input_folder)
     
-    return parameters
+    return {"args":["--resume", chk_filename], "cwd":input_folder, "stop_at_checkpoint":True}
 
 # main function implementing the Relative Error checking
-def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin, core_offset = 0):
+def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin, core_offset = 0, max_cores = None):
     # customized user feedback displayed in the terminal, and written to the output file
     def uncerteanty_feedback(parameter_array, diff_array, median_array, mean_array, samples):
         text = ""
@@ -128,22 +114,22 @@ def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin
         return text
 
     # set up working directory
-    parent_dir = os.getcwd()
     os.mkdir(working_dir)
     shutil.copy(src = seqfile,  dst = working_dir)
     shutil.copy(src = imapfile, dst = working_dir)
-    os.chdir(working_dir)
     imapfile = path_filename(imapfile)
     seqfile = path_filename(seqfile)
+    summary_file = os.path.join(working_dir, "summary_precision.csv")
+    detailed_file = os.path.join(working_dir, "detailed_precision.txt")
 
     # set up output files
-    with open("summary_precision.csv","w") as summ_file:
+    with open(summary_file,"w") as summ_file:
         summ_file.write("median RE, mean RE, samples\n")
-    with open("detailed_precision.txt","w") as summ_file:
+    with open(detailed_file,"w") as summ_file:
         summ_file.write("")
     
     # set up commonly used priors
-    priors = autoPrior(imapfile, seqfile)
+    priors = autoPrior(os.path.join(working_dir, imapfile), os.path.join(working_dir, seqfile))
 
     # set up array to hold parameter results
     param_array = []
@@ -151,19 +137,12 @@ def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin
     param_median = []
     param_mean = []
 
-    # run the first iteration to start
-    pool = mp.Pool(mp.cpu_count())
-    treeindex = list(range(repeats))
-    new_params = pool.starmap(  generate_param_burinin, 
-                                zip(repeat(guide_tree), 
-                                    repeat(imapfile), 
-                                    repeat(seqfile), 
-                                    repeat(smpl), 
-                                    repeat(burnin), 
-                                    repeat(priors),
-                                    repeat(core_offset), 
-                                    treeindex))
-    pool.close()
+    # run the first iteration to start, with all replicates running concurrently from one event loop
+    # each replicate uses 2 threads, pinned to its own cores of the budget beginning after "core_offset"
+    core_plan = plan_BPP_cores(repeats, f"2 {1 + core_offset}", max_cores)
+    jobs = [generate_param_burinin(guide_tree, imapfile, seqfile, smpl, burnin, priors, core_plan.threads[index], index, working_dir) for index in range(repeats)]
+    BPP_run_concurrent(jobs, n_slots = core_plan.n_slots)
+    new_params = [get_parameters_from_MCMC(job["cwd"]) for job in jobs]
     # collect the RE values
     param_array.append(new_params)
     param_diff.append(estimate_RE(param_array[-1]))
@@ -171,22 +150,20 @@ def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin
     param_mean.append(np.round(np.mean(param_diff[-1]), decimals = 2))
     fb = uncerteanty_feedback(param_array, param_diff, param_median, param_mean, iteration_size)
 
-    with open("summary_precision.csv","a") as summ_file:
+    with open(summary_file,"a") as summ_file:
         summ_file.write(f"{param_median[-1]}, {param_mean[-1]}, {iteration_size}\n")
-    with open("detailed_precision.txt","a") as summ_file:
+    with open(detailed_file,"a") as summ_file:
         summ_file.write(fb)
 
     # run the subsequent resume iterations
-    folder_names = [f"replicate_{index}" for index in range(repeats)]
+    folder_names = [job["cwd"] for job in jobs]
     iteration = 2
     thresholds_met = False
     
     while iteration*iteration_size <= smpl and thresholds_met == False:
-        # run the data generation in multithreaded mode
-        pool = mp.Pool(mp.cpu_count())
-        treeindex = list(range(repeats))
-        new_params = pool.starmap(iterate_param_from_chk, zip(folder_names))
-        pool.close()
+        # run the data generation with all replicates running concurrently
+        BPP_run_concurrent([iterate_param_from_chk(folder_name) for folder_name in folder_names], n_slots = core_plan.n_slots)
+        new_params = [get_parameters_from_MCMC(folder_name) for folder_name in folder_names]
         
         # collect the RE values  
         param_array.append(new_params)
@@ -196,9 +173,9 @@ def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin
         fb = uncerteanty_feedback(param_array, param_diff, param_median, param_mean, iteration_size*iteration)
         
         # write to files
-        with open("summary_precision.csv","a") as summ_file:
+        with open(summary_file,"a") as summ_file:
             summ_file.write(f"{param_median[-1]}, {param_mean[-1]}, {iteration_size*iteration}\n")
-        with open("detailed_precision.txt","a") as summ_file:
+        with open(detailed_file,"a") as summ_file:
             summ_file.write(fb)
 
         # check if sufficient precision is reached when median RE <= 0.01 mean RE <= 0.05
@@ -206,8 +183,6 @@ def test_param(imapfile, seqfile, guide_tree, working_dir, repeats, smpl, burnin
             thresholds_met = True
 
         iteration += 1
-   
-    os.chdir(parent_dir)    
 
 
 ## EXAMPLE CALCULATIONS
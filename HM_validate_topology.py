@@ -10,9 +10,7 @@ import copy
 import os
 import random
 import shutil
-import multiprocessing as mp
 from itertools import combinations
-from itertools import repeat
 from collections import Counter
 
 import warnings
@@ -21,13 +19,15 @@ with warnings.catch_warnings():
     from ete3 import Tree
 import numpy as np
 
-from helper_functions import BPP_run_capture
+from helper_functions import BPP_run_concurrent
 from helper_functions import dict_to_bppcfile
 from helper_functions import BPP_summary
+from helper_functions import newest_Checkpoint
 from helper_functions import Imap_to_PopInd_Dict
-from helper_functions import BPP_resume_capture
 from helper_functions import path_filename
 
+from core_scheduler_module import plan_BPP_cores
+
 from tree_helper_functions import name_Internal_nodes
 from tree_helper_functions import tree_To_Newick
 
@@ -78,15 +78,15 @@ std_cfile = {'seed': '-1',
              'sampfreq': '1', 
             }
 
-# perform the iterations from the burn in up to and including the first checkpoint
-def generate_tree_burinin(intree_list, imapfile, seqfile, smpl, burnin, priors, core_offset, index):
-    pop_param = autoPopParam(imapfile, seqfile)
+# set up the BPP job performing the iterations from the burn in up to and including the first checkpoint
+def generate_tree_burinin(intree_list, imapfile, seqfile, smpl, burnin, priors, threads, index, working_dir):
+    pop_param = autoPopParam(os.path.join(working_dir, imapfile), os.path.join(working_dir, seqfile))
     cdict = copy.deepcopy(std_cfile)
     cdict["nsample"] = smpl
     cdict["burnin"] = burnin
     cdict["seqfile"] = f"../{seqfile}"
     cdict["imapfile"] = f"../{imapfile}"
-    cdict["threads"] = f"2 {int(np.round(((index+0.5)*2), decimals = 2)+ core_offset )}"
+    cdict["threads"] = threads
     cdict['species&tree'] = pop_param["species&tree"]
     cdict['popsizes'] = pop_param["popsizes"]
     cdict["newick"] = intree_list[index]
@@ -95,43 +95,29 @@ def generate_tree_burinin(intree_list, imapfile, seqfile, smpl, burnin, priors,
     cdict["tauprior"] = priors['tauprior']
     cdict["checkpoint"] = f"{iteration_size+burnin} {iteration_size}"
     
-    folder_name = f"replicate_{index}"
+    folder_name = os.path.join(working_dir, f"replicate_{index}")
     os.mkdir(folder_name)
-    os.chdir(folder_name)
-    dict_to_bppcfile(cdict, "bpp.ctl")
-    BPP_run_capture("bpp.ctl", index)
-    tree = get_topology_from_MCMC()
-    
-    os.chdir("..")
+    dict_to_bppcfile(cdict, os.path.join(folder_name, "bpp.ctl"))
     
-    return tree
+    return {"args":["--cfile", "bpp.ctl"], "cwd":folder_name, "stop_at_checkpoint":True}
 
 # collect the tree output of a bpp summary run
-def get_topology_from_MCMC():
-    full_out = BPP_summary("bpp.ctl")
+def get_topology_from_MCMC(folder_name):
+    full_out = BPP_summary("bpp.ctl", cwd = folder_name)
     lines = full_out.split("\n")
     rowindex_tree = [i for i, s in enumerate(lines) if '(A)' in s][0]+1
     tree = re.search("\(.+\);" , lines[rowindex_tree].split("  ")[-1]).group()
 
     return tree
 
-# iterate onwards from a checkpoint file and collect the next tree output
+# get the BPP job iterating onwards from the last checkpoint file of a replicate
 def iterate_tree_from_chk(input_folder):
-    os.chdir(input_folder)
-    
-    ls = os.listdir()
-    chk_filenames = [file for file in ls if ".chk" in str(file)]
-    chk_maxval = max([int(filename.split(".")[-2]) for filename in chk_filenames])
-    chk_filename = f"out.txt.{chk_maxval}.chk"
+    chk_filename = newest_Checkpoint("out.txt", input_folder)
     
-    BPP_resume_capture(chk_filename, input_folder.split("_")[-1])
-    tree = get_topology_from_MCMC()
-    os.chdir("..")
-    
-    return tree
+    return {"args":["--resume", chk_filename], "cwd":input_folder, "stop_at_checkpoint":True}
 
 # main function implementing the RF convergence testing
-def test_topology(imapfile, seqfile, working_dir, repeats, smpl, burnin, core_offset = 0):
+def test_topology(imapfile, seqfile, working_dir, repeats, smpl, burnin, core_offset = 0, max_cores = None):
     # customized user feedback displayed in the terminal, and written to the output file
     def tree_feedback(tree_array, rf_array, samples):
         text = "\n"
@@ -148,23 +134,23 @@ def test_topology(imapfile, seqfile, working_dir, repeats, smpl, burnin, core_of
         return text
 
     # set up working directory
-    parent_dir = os.getcwd()
     os.mkdir(working_dir)
     shutil.copy(src = seqfile,  dst = working_dir)
     shutil.copy(src = imapfile, dst = working_dir)
-    os.chdir(working_dir)
     imapfile = path_filename(imapfile)
     seqfile = path_filename(seqfile)
+    summary_file = os.path.join(working_dir, "summary_tree_rf.csv")
+    detailed_file = os.path.join(working_dir, "detailed_tree_rf.txt")
 
     # set up output files
-    with open("summary_tree_rf.csv","w") as summ_file:
+    with open(summary_file,"w") as summ_file:
         summ_file.write("average rf, samples\n")
-    with open("detailed_tree_rf.txt","w") as summ_file:
+    with open(detailed_file,"w") as summ_file:
         summ_file.write("")
 
     # set up commonly used priors
-    node_names = list(Imap_to_PopInd_Dict(imapfile))
-    priors = autoPrior(imapfile, seqfile)
+    node_names = list(Imap_to_PopInd_Dict(os.path.join(working_dir, imapfile)))
+    priors = autoPrior(os.path.join(working_dir, imapfile), os.path.join(working_dir, seqfile))
 
     # generate the random starting trees that are the starting point, and initiate the RF array
     strf = 0
@@ -180,58 +166,49 @@ def test_topology(imapfile, seqfile, working_dir, repeats, smpl, burnin, core_of
     tree_array.append(starting_trees)
 
     fb = tree_feedback(tree_array, rf_array, -1*burnin)
-    with open("summary_tree_rf.csv","a") as summ_file:
+    with open(summary_file,"a") as summ_file:
         summ_file.write(f"{rf_array[-1]}, {-1*burnin}\n")
-    with open("detailed_tree_rf.txt","a") as summ_file:
+    with open(detailed_file,"a") as summ_file:
         summ_file.write(fb)
 
 
     tree_array
-    # run the first iteration to start
-    pool = mp.Pool(mp.cpu_count())
-    treeindex = list(range(repeats))
-    new_tree_list = pool.starmap(   generate_tree_burinin, 
-                                    zip(repeat(tree_array[-1]), 
-                                        repeat(imapfile), 
-                                        repeat(seqfile), 
-                                        repeat(smpl), 
-                                        repeat(burnin),
-                                        repeat(priors),
-                                        repeat(core_offset), 
-                                        treeindex))
-    pool.close()
+    # run the first iteration to start, with all replicates running concurrently from one event loop
+    # each replicate uses 2 threads, pinned to its own cores of the budget beginning after "core_offset"
+    core_plan = plan_BPP_cores(repeats, f"2 {1 + core_offset}", max_cores)
+    jobs = [generate_tree_burinin(tree_array[-1], imapfile, seqfile, smpl, burnin, priors, core_plan.threads[index], index, working_dir) for index in range(repeats)]
+    BPP_run_concurrent(jobs, n_slots = core_plan.n_slots)
+    new_tree_list = [get_topology_from_MCMC(job["cwd"]) for job in jobs]
 
     # collect the results
     tree_array.append(new_tree_list)
     rf_array.append(calculate_avg_rf(tree_array[-1]))
     
     fb = tree_feedback(tree_array, rf_array, iteration_size)
-    with open("summary_tree_rf.csv","a") as summ_file:
+    with open(summary_file,"a") as summ_file:
         summ_file.write(f"{rf_array[-1]}, {iteration_size}\n")
-    with open("detailed_tree_rf.txt","a") as summ_file:
+    with open(detailed_file,"a") as summ_file:
         summ_file.write(fb)
 
     
     # run the subsequent resume iterations
     iteration = 2
     converged = False
-    folder_names = [f"replicate_{index}" for index in range(repeats)]
+    folder_names = [job["cwd"] for job in jobs]
 
     while iteration*iteration_size <= smpl and converged == False:
-        # run the multithreaded mode
-        pool = mp.Pool(mp.cpu_count())
-        treeindex = list(range(repeats))
-        new_tree_list = pool.starmap(iterate_tree_from_chk, zip(folder_names))
-        pool.close()
+        # run all replicates concurrently
+        BPP_run_concurrent([iterate_tree_from_chk(folder_name) for folder_name in folder_names], n_slots = core_plan.n_slots)
+        new_tree_list = [get_topology_from_MCMC(folder_name) for folder_name in folder_names]
 
         # collect the results
         tree_array.append(new_tree_list)
         rf_array.append(calculate_avg_rf(tree_array[-1]))
         fb = tree_feedback(tree_array, rf_array, iteration_size*iteration)
 
-        with open("summary_tree_rf.csv","a") as summ_file:
+        with open(summary_file,"a") as summ_file:
             summ_file.write(f"{rf_array[-1]}, {iteration_size*iteration}\n")
-        with open("detailed_tree_rf.txt","a") as summ_file:
+        with open(detailed_file,"a") as summ_file:
             summ_file.write(fb)
 
         # check if all of the trees have converged
@@ -239,9 +216,6 @@ def test_topology(imapfile, seqfile, working_dir, repeats, smpl, burnin, core_of
            converged = True 
 
         iteration += 1
-   
-
-    os.chdir(parent_dir)    
 
 # ## EXAMPLE CALCULATIONS
 
@@ -0,0 +1,205 @@
+'''
+THIS MODULE CONTAINS THE FUNCTIONS FOR ADAPTIVE EARLY STOPPING OF THE A00 RUNS OF THE HIERARCHICAL METHOD.
+THE RUNS ARE EXECUTED IN SEGMENTS BETWEEN CHECKPOINTS, AND AFTER EACH SEGMENT THE DECISION CRITERIA ARE
+EVALUATED ON THE SAMPLES COLLECTED SO FAR. ONCE THE DECISION ABOUT EVERY PROPOSAL IS STABLE, THE RUNS
+ARE STOPPED, AND THE OUTFILES ARE WRITTEN FROM THE PARTIAL MCMC SAMPLES.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import BPP_run_concurrent
+from helper_functions import BPP_summary
+from helper_functions import BPP_start_args
+from helper_functions import newest_Checkpoint
+from helper_functions import bppcfile_to_dict
+from helper_functions import pretty_Table
+
+# BPP CACHE DEPENDENCIES
+from bpp_cache_module import cache_Lookup
+from bpp_cache_module import cache_Store
+
+# DECISION DEPENDENCIES
+from decision_module import get_MSC_param
+from decision_module import criteria_matcher
+from decision_module import make_decision
+from decision_module import decision_GDI
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import BPP_control_file
+from custom_types import BPP_mcmc_file
+from custom_types import HM_decision_parameters
+from custom_types import MSC_parameters
+from custom_types import Master_control_dict
+from custom_types import Species_name
+
+
+## SPECIALIZED FUNCTIONS
+
+# check if adaptive early stopping of the A00 runs is requested
+def adaptive_Enabled(
+        mc_dict:            Master_control_dict
+                    ) ->    bool:
+
+    return mc_dict["adaptive_segment"] != "?"
+
+# count the samples written to an mcmcfile
+def count_MCMC_samples  (
+        mcmcfile:           BPP_mcmc_file
+                        ) ->    int:
+
+    with open(mcmcfile, "r") as f:
+        return max(0, sum(1 for line in f if len(line.strip()) > 0) - 1)
+
+# evaluate the decision criteria on the samples collected so far by the chains of an iteration
+'''
+The outfiles of the chains that were stopped at a checkpoint are written from their partial mcmcfiles
+with "bpp --summary", so the criteria are evaluated exactly as in "decisionModule".
+'''
+def partial_Decision(
+        control_files:      list[BPP_control_file],
+        cwd:                str,
+        stopped:            list[bool],
+        proposed_changes:   list[list[Species_name]],
+        hm_param:           HM_decision_parameters
+                    ) ->    tuple[list[list[Species_name]], MSC_parameters]:
+
+    cdicts = [bppcfile_to_dict(os.path.join(cwd, control_file)) for control_file in control_files]
+    for control_file, is_stopped in zip(control_files, stopped):
+        if is_stopped == True:
+            BPP_summary(control_file, cwd = cwd)
+
+    outfiles = [os.path.join(cwd, cdict["outfile"]) for cdict in cdicts]
+    mcmcfiles = [os.path.join(cwd, cdict["mcmcfile"]) for cdict in cdicts]
+    if len(control_files) == 1:
+        outfiles, mcmcfiles = outfiles[0], mcmcfiles[0]
+
+    MSC_param = get_MSC_param(outfiles, proposed_changes, hm_param, mcmcfiles)
+    decision = make_decision(criteria_matcher(MSC_param, hm_param), hm_param)
+
+    return decision, MSC_param
+
+# check if the decision about every proposal is stable between two consecutive segments
+'''
+A proposal is stable if it is accepted or rejected in both segments, and the GDI values its decision is based
+on did not change by more than the tolerance. If the age of the split is also measured, its relative change
+must also be within the tolerance.
+'''
+def decision_Stable (
+        previous:           tuple[list[list[Species_name]], MSC_parameters],
+        current:            tuple[list[list[Species_name]], MSC_parameters],
+        proposed_changes:   list[list[Species_name]],
+        hm_param:           HM_decision_parameters
+                    ) ->    bool:
+
+    if previous == None:
+        return False
+
+    tolerance = hm_param["adaptive_tolerance"]
+    for pair in proposed_changes:
+        if (pair in previous[0]) != (pair in current[0]):
+            return False
+        previous_param = previous[1][str(pair)]
+        current_param = current[1][str(pair)]
+        for gdi in ["gdi_1", "gdi_2"]:
+            if current_param[gdi] != "?" and abs(decision_GDI(current_param, gdi, hm_param) - decision_GDI(previous_param, gdi, hm_param)) > tolerance:
+                return False
+        if current_param["age"] != "?" and abs(current_param["age"] - previous_param["age"]) > tolerance*max(1, previous_param["age"]):
+            return False
+
+    return True
+
+# print the decision evaluated after a segment of the chains
+def segmentFeedback (
+        segment:            int,
+        n_samples:          int,
+        proposed_changes:   list[list[Species_name]],
+        decision:           list[list[Species_name]],
+        MSC_param:          MSC_parameters,
+        hm_param:           HM_decision_parameters,
+        stable:             bool
+                    ):
+
+    mode = hm_param['mode'].upper()
+    print(f"\nDECISION AFTER SEGMENT {segment} ({n_samples} SAMPLES PER CHAIN):\n")
+    results_table = [[str(pair) for pair in proposed_changes]]
+    results_colnames = [f"POPULATIONS TO {mode}"]
+    for gdi, colname in [["gdi_1", "GDI 1"], ["gdi_2", "GDI 2"]]:
+        if MSC_param[str(proposed_changes[0])][gdi] != "?":
+            results_table.append([str(decision_GDI(MSC_param[str(pair)], gdi, hm_param)) for pair in proposed_changes])
+            results_colnames.append(colname)
+    if MSC_param[str(proposed_changes[0])]["age"] != "?":
+        results_table.append([str(MSC_param[str(pair)]["age"]) for pair in proposed_changes])
+        results_colnames.append("# OF GENERATIONS")
+    results_table.append([str(pair in decision) for pair in proposed_changes])
+    results_colnames.append(f"{mode} ACCEPTED")
+    pretty_Table(results_table, results_colnames)
+
+    if stable == True:
+        print(f"\n{clprnt.GREEN}THE DECISION IS STABLE WITHIN A TOLERANCE OF {hm_param['adaptive_tolerance']}, THE CHAINS ARE STOPPED{clprnt.end}")
+    else:
+        print(f"\nTHE DECISION IS NOT YET STABLE, THE CHAINS ARE CONTINUED")
+
+
+## MAIN FUNCTION
+
+# run the A00 chains of an iteration in segments between checkpoints, until the decision is stable or the chains finish
+'''
+The control files must write a checkpoint after every segment (see "checkpoint_BPP_param"). The chains are run
+concurrently until each writes its next checkpoint, then the decision criteria are evaluated on the pooled
+samples. Once the decision is stable between two consecutive segments, the chains are not continued, and their
+outfiles hold the summary of the partial samples. Chains found in the BPP result cache are not run, and only
+chains that ran for the full number of samples are stored in the cache. Returns True if the chains were stopped early.
+'''
+def BPP_run_adaptive(
+        control_files:      list[BPP_control_file],
+        cwd:                str,
+        n_slots:            int,
+        proposed_changes:   list[list[Species_name]],
+        hm_param:           HM_decision_parameters
+                    ) ->    bool:
+
+    lookups = [cache_Lookup(control_file, cwd) for control_file in control_files]
+    if all(lookup[2] != None for lookup in lookups):
+        return False
+
+    cdicts = [bppcfile_to_dict(os.path.join(cwd, control_file)) for control_file in control_files]
+    stopped = [False for control_file in control_files]
+    jobs = [{"args":BPP_start_args(control_file, cwd), "cwd":cwd, "stop_at_checkpoint":True} if lookup[2] == None else None for control_file, lookup in zip(control_files, lookups)]
+    previous = None
+    segment = 0
+
+    print(f"{clprnt.GREEN}\nSTARTING {len([job for job in jobs if job != None])} ADAPTIVE BPP JOBS, THE DECISION IS EVALUATED AFTER EVERY SEGMENT...{clprnt.end}\n")
+    while any(job != None for job in jobs):
+        segment += 1
+        results = BPP_run_concurrent(jobs, n_slots = n_slots)
+        for i, result in enumerate(results):
+            if result == None:
+                continue
+            if result.exit_code != 0 and result.stopped_at_checkpoint == False:
+                print(f"\n[X] ERROR: UNEXPECTED EXIT FROM BPP (CONTROL FILE '{control_files[i]}')")
+                exit()
+            stopped[i] = result.stopped_at_checkpoint
+            if stopped[i] == False:
+                cache_Store(lookups[i][0], lookups[i][1], result)
+
+        # the chains that finished all their samples are not continued
+        if not any(stopped):
+            return False
+
+        current = partial_Decision(control_files, cwd, stopped, proposed_changes, hm_param)
+        stable = decision_Stable(previous, current, proposed_changes, hm_param)
+        n_samples = min(count_MCMC_samples(os.path.join(cwd, cdict["mcmcfile"])) for cdict in cdicts)
+        segmentFeedback(segment, n_samples, proposed_changes, current[0], current[1], hm_param, stable)
+        if stable == True:
+            return True
+
+        previous = current
+        jobs = [{"args":["--resume", newest_Checkpoint(cdicts[i]["outfile"], cwd)], "cwd":cwd, "stop_at_checkpoint":True} if stopped[i] == True else None for i in range(len(control_files))]
+
+    return False
@@ -5,11 +5,10 @@ AND ANALYSING THE CONTENTS OF SEQUENCE ALIGNMENTS AND IMAP FILES.
 ## DEPENDENCDIES
 
 # STANDARD LIBRARY DEPENDENCIES
-import copy
 import random
 import warnings
+import multiprocessing as mp
 from io import StringIO
-from collections import Counter
 from itertools import combinations
 
 # EXTERNAL LIBRARY DEPENDENCIES
@@ -28,12 +27,18 @@ with warnings.catch_warnings():
 # HELPER FUNCTION DEPENDENCIES
 from helper_functions import Imap_to_PopInd_Dict
 from helper_functions import Imap_to_IndPop_Dict
-from helper_functions import alignfile_to_MSA
 from helper_functions import flatten
 
+# ALIGNMENT STORE DEPENDENCIES
+from alignment_store_module import EncodedAlignment
+from alignment_store_module import iterate_Alignment
+from alignment_store_module import load_Alignment
+from alignment_store_module import encode_Seqs
+
 ## DATA DEPENDENCIES
 from data_dicts import distance_dict
 from data_dicts import avail_chars
+from data_dicts import iupac_code_dict
 
 ## TYPING HINTS
 from custom_types import Tree_newick
@@ -78,16 +83,94 @@ def pairwise_dist   (
     else:
         return np.nan
 
+## VECTORIZED DISTANCE ENGINE
+
+# lookup table used by the vectorized distance engine
+'''
+"distance_table" is the 16x16 equivalent of "distance_dict", indexed by the uint8 codes 
+of the IUPAC characters (see "char_code_table" in the alignment store module). Any comparison 
+involving code 0 has a distance of 0, so that invalid sites add nothing to the summed distance.
+'''
+distance_table = np.zeros((16, 16), dtype = np.float64)
+for pair in distance_dict:
+    distance_table[iupac_code_dict[pair[0]], iupac_code_dict[pair[1]]] = distance_dict[pair]
+
+# encode the sequences of a BioPython MSA object as a uint8 code matrix
+def encode_MSA  (
+        input_MSA:      MultipleSeqAlignment
+                ) ->    np.ndarray:
+
+    return encode_Seqs([str(sequence.seq) for sequence in input_MSA])
+
+# calculate all pairwise distances between the rows of a code matrix
+'''
+This function is the vectorized equivalent of calling "pairwise_dist" on every pair
+of sequences. Each row of the code matrix is compared to all subsequent rows at once, 
+by gathering the per-site distances from "distance_table", and dividing the sum by the 
+number of sites where both sequences have comparable IUPAC codes. The output is a 
+symmetric n x n matrix, with np.nan where two sequences share no comparable sites.
+'''
+def get_Code_DistanceMatrix (
+        code_matrix:            np.ndarray
+                            ) ->    np.ndarray:
+
+    n_seq = code_matrix.shape[0]
+    valid = code_matrix != 0
+    dist = np.zeros((n_seq, n_seq), dtype = np.float64)
+
+    for i in range(n_seq - 1):
+        # per site distances and comparable site counts against every subsequent sequence
+        site_dist = distance_table[code_matrix[i], code_matrix[i+1:]]
+        n_overlap = np.count_nonzero(valid[i] & valid[i+1:], axis = 1)
+        
+        # handle edge case where '???' characters overlap throghout the alignment, leading to a zero length overlap of valid characters
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            row = np.round(site_dist.sum(axis = 1)/n_overlap, decimals = 4)
+        row[n_overlap == 0] = np.nan
+        
+        dist[i, i+1:] = row
+        dist[i+1:, i] = row
+
+    return dist
+
+# return the pairwise distances of a code matrix as a list, in the order used by "get_Distance_list"
+def get_Code_Distance_list  (
+        code_matrix:                np.ndarray
+                            ) ->    list[float]:
+
+    dist = lower_Triangle(get_Code_DistanceMatrix(code_matrix))
+    
+    # missing distances are returned as the np.nan object, so "np.nan in dist_list" checks behave as with "pairwise_dist"
+    dist_list = [np.nan if np.isnan(value) else float(value) for value in dist]
+
+    return dist_list
+
+# return the values below the diagonal of a square distance matrix, in the order used by "get_Distance_list"
+def lower_Triangle  (
+        dist:               np.ndarray
+                    ) ->    np.ndarray:
+
+    lower_row, lower_col = np.tril_indices(dist.shape[0], k = -1)
+
+    return dist[lower_row, lower_col]
+
+
 # return a list of all paiwise distances in an alignment
 '''
 This function finds all the unique sequence pairs in an MSA which should have
-their distances measured. It then iterates through these pairs, using 
-"pairwise_dist" to get a pairwise distance for each.
+their distances measured. By default, the MSA is encoded once, and the distances
+are calculated by the vectorized distance engine. The original implementation, 
+which iterates through the pairs using "pairwise_dist", is kept as a reference
+and can be selected with "vectorized = False".
 '''
 def get_Distance_list(
-        input_MSA:      MultipleSeqAlignment
+        input_MSA:      MultipleSeqAlignment,
+        vectorized:     bool = True
                 ) ->    list[float]:
 
+    if vectorized == True:
+        return get_Code_Distance_list(encode_MSA(input_MSA))
+
     # isolate only the sequence strings
     seqlist = [str(sequence.seq) for sequence in input_MSA]
     
@@ -101,59 +184,307 @@ def get_Distance_list(
     return dist_list
 
 
-# produce a BioPython compatible "DistanceMatrix" by wrapping the "get_Distance_list" function
+# produce a BioPython compatible "DistanceMatrix" from a code matrix
 '''
-This function takes an MSA object, uses "get_Distance_list" to get the pairwise distances,
-and formats the output to comply with the "DistanceMatrix" class of BioPython.
-This way, the custom "pairwise_dist" function can be integrated into the established
-"DistanceTreeContstructor" pipeline.
+This function takes a code matrix and the names of its rows, uses "get_Code_DistanceMatrix" 
+to get the pairwise distances, and formats the output to comply with the "DistanceMatrix" 
+class of BioPython. This way, the custom distance calculation can be integrated into the 
+established "DistanceTreeContstructor" pipeline.
 '''
+def code_To_DistanceMatrix  (
+        code_matrix:                np.ndarray,
+        name_list:                  list[str]
+                            ) ->    DistanceMatrix:
+
+    dist = get_Code_DistanceMatrix(code_matrix)
+
+    # format matrix to comply with BioPython by adding 0s, and getting values in the correct lower triangular order
+        # missing distances are kept as the np.nan object, so that "np.nan in" checks work on the output
+    matrix = []
+    for x in range(len(name_list)):
+        inrow = [np.nan if np.isnan(value) else float(value) for value in dist[x, :x]]
+        inrow.append(0)
+        matrix.append(inrow)
+    
+    return DistanceMatrix(names=name_list, matrix=matrix)
+
+# produce a BioPython compatible "DistanceMatrix" from an MSA object
 def get_DistanceMatrix  (
         input_MSA:              MultipleSeqAlignment
                         ) ->    DistanceMatrix:
 
-    dist_list = get_Distance_list(input_MSA)
     name_list = [str(seq.id) for seq in input_MSA]
+    
+    return code_To_DistanceMatrix(encode_MSA(input_MSA), name_list)
 
-    # format matrix to comply with BioPython by adding 0s, and getting values in the correct order
-    matrix = []
-    for x in range(len(input_MSA)):
-        inrow = [0]
-        for _ in range(x):
-            inrow.insert(-1, dist_list.pop(0))
-        matrix.append(inrow)
+
+# summarize the distances at a single locus, as required for the tau and theta prior calculation
+'''
+This function computes the pairwise distance matrix of a locus once, and derives all values
+needed by "autoPrior" from it. The sequences are grouped by population in a single pass over 
+the individual IDs. For each population with at least 2 sequences, the average pairwise distance 
+within the population is read from the corresponding block of the locus distance matrix. The 
+maximum distance at the locus is read from the full matrix. Populations or loci where some pair of 
+sequences has no comparable sites (due to overlapping '???' characters) are left out, as they were 
+when each population was compared separately. The results are identical to computing the distance 
+lists of every population separately, as each pairwise distance only depends on the two sequences.
+'''
+def get_Locus_Distances (
+        locus_ids:              list[str],
+        code_matrix:            np.ndarray,
+        indpop_dict
+                        ) ->    tuple[dict[str, float], float]:
+
+    dist = get_Code_DistanceMatrix(code_matrix)
+
+    # group the rows of the locus by population in one pass
+    pop_rows = {}
+    for row, id in enumerate(locus_ids):
+        pop_rows.setdefault(indpop_dict[id], []).append(row)
+
+    # get average distance within each population with at least 2 sequences
+    pop_avg_dist = {}
+    for population in pop_rows:
+        rows = pop_rows[population]
+        if len(rows) >= 2:
+            pop_dist = lower_Triangle(dist[np.ix_(rows, rows)])
+            if not np.isnan(pop_dist).any():
+                pop_avg_dist[population] = np.average(pop_dist)
     
-    return DistanceMatrix(names=name_list, matrix=matrix)
+    # get the maximum distance at the locus
+    locus_dist = lower_Triangle(dist)
+    if np.isnan(locus_dist).any():
+        locus_max_dist = None
+    else:
+        locus_max_dist = np.max(locus_dist)
+
+    return pop_avg_dist, locus_max_dist
+
+
+# per population sequence count matrices, keyed by the alignment and the populations
+pop_count_matrices = {}
+
+# return the inverted index of an Imap, mapping each individual ID to the index of its population
+def get_IndPop_index(
+        popind_dict
+                    ) ->    dict:
+
+    return {indiv_id:index for index, indivs in enumerate(popind_dict.values()) for indiv_id in indivs}
 
+# return the matrix of the number of sequences of each population (rows) at each locus (columns)
+'''
+For an "EncodedAlignment", the population of every sequence is looked up through the inverted index
+in a single vectorized pass, and the matrix is stored, so that later calls with the same alignment and
+populations return it directly. Any other iterable of (individual IDs, code matrix) loci, such as the 
+streaming reader, is counted locus by locus. A KeyError is raised if a sequence belongs to an individual
+that is not in any population.
+'''
+def get_Pop_Count_matrix(
+        popind_dict,
+        input_alignment
+                        ) ->    np.ndarray:
+
+    pop_index = get_IndPop_index(popind_dict)
+    n_pops = len(popind_dict)
+
+    if isinstance(input_alignment, EncodedAlignment):
+        key = (id(input_alignment), tuple((pop, tuple(indivs)) for pop, indivs in popind_dict.items()))
+        if key in pop_count_matrices and pop_count_matrices[key][0] is input_alignment:
+            return pop_count_matrices[key][1]
+
+        n_loci = len(input_alignment)
+        indiv_pop = np.array([pop_index.get(indiv_id, -1) for indiv_id in input_alignment.indiv_ids], dtype = np.int64)
+        seq_pop = indiv_pop[input_alignment.seq_indiv]
+        if np.any(seq_pop < 0):
+            raise KeyError(input_alignment.indiv_ids[input_alignment.seq_indiv[np.argmax(seq_pop < 0)]])
+        seq_locus = np.repeat(np.arange(n_loci), input_alignment.locus_nseq)
+        counts = np.bincount(seq_pop*n_loci + seq_locus, minlength = n_pops*n_loci).reshape(n_pops, n_loci)
+        
+        pop_count_matrices[key] = (input_alignment, counts)
+    
+    else:
+        columns = [np.bincount([pop_index[indiv_id] for indiv_id in locus_ids], minlength = n_pops) for locus_ids, _ in input_alignment]
+        counts = np.array(columns, dtype = np.int64).reshape(-1, n_pops).T
+
+    return counts
+
+# return a dict containing the maximum of each row of a population count matrix
+def max_Per_Pop (
+        popind_dict,
+        pop_counts:         np.ndarray
+                ) ->        dict:
+
+    if pop_counts.shape[1] == 0:
+        return dict.fromkeys(popind_dict, 0)
+    
+    return dict(zip(popind_dict, [int(count) for count in pop_counts.max(axis = 1)]))
 
 # return a dict containing the maximum number of sequences at any loci for each population
 '''
 This function counts the maximum number of sequences at a single loci that are associated with a 
-population in the sequence alignment. This output is used in "autoPopParam" to automatically 
-generate the "species&tree" lines for the BPP control file. The function is also used in 
-"check_GuideTree_Imap_compat" to ensure that each population has at least two sequences associated with it.
+population in the sequence alignment. The counts are read from the population count matrix, which
+is shared with "autoPopParam" (generating the "popsizes" line of the BPP control file). The function is
+used in "check_GuideTree_Imap_compat" to ensure that each population has at least two sequences associated with it.
+
+The alignment can be supplied as an "EncodedAlignment" from the alignment store, or as any 
+iterable of (individual IDs, code matrix) loci, such as the streaming reader "iterate_Phylip_loci".
 '''
 def count_Seq_Per_Pop   (
         input_popind_dict, 
-        input_MSA_list:         list[MultipleSeqAlignment]
+        input_alignment
                         ) ->    dict:
 
-    # create empty dict to hold results
-    maxcounts = dict.fromkeys(input_popind_dict, 0)
+    pop_counts = get_Pop_Count_matrix(input_popind_dict, input_alignment)
+    
+    return max_Per_Pop(input_popind_dict, pop_counts)
+
+
+# infer the UPGMA tree of the populations at a single locus, using one randomly sampled sequence per population
+'''
+This function implements steps 1-3 of "autoStartingTree" for a single locus. As the random
+sampling is re-seeded at every locus, the tree only depends on the locus itself, so loci
+can be processed in any order, or in separate processes. None is returned if the locus
+does not contain all populations, or if the sampled sequences have no comparable sites.
+'''
+def get_Locus_Tree  (
+        seq_ids_at_locus:       list[str],
+        locus_matrix:           np.ndarray,
+        indpop_dict,
+        popind_dict
+                    ):
+
+    # check if all the population are present at the locus, and ignore the locus if not
+    all_pops_at_locus = [str(indpop_dict[indiv_id]) for indiv_id in seq_ids_at_locus]
+    pops_at_locus = []
+    for pop in all_pops_at_locus:
+        if pop not in pops_at_locus:
+            pops_at_locus.append(pop)
+    if len(pops_at_locus) < len(popind_dict):
+        return None
+
+    # recreate the two-way assocations specific to this locus
+    popmap_at_locus = {pop:[seq_id for seq_id in popind_dict[pop] if seq_id in seq_ids_at_locus] for pop in pops_at_locus}
+    pop_dict_at_locus = {seq_id: indpop_dict[seq_id] for seq_id in seq_ids_at_locus }
+
+    # select one random individual from each population
+    random.seed(123)  # this is set up to always produce consistent results from the starting tree inference
+    selected_ids = [random.choice(popmap_at_locus[key]) for key in popmap_at_locus]
+
+    # find the rows of the locus containing a sequence from the random individuals
+    selected_rows = []
+    for row, indiv_id in enumerate(seq_ids_at_locus):
+        if indiv_id in selected_ids: 
+            selected_ids.remove(indiv_id)
+            selected_rows.append(row)
+
+    # infer tree using the vectorized distance engine, with the rows named after their populations
+    code_matrix = locus_matrix[selected_rows]
+    dm = code_To_DistanceMatrix(code_matrix, [pop_dict_at_locus[seq_ids_at_locus[row]] for row in selected_rows])
     
-    for curr_locus in input_MSA_list:
-        # filter out a list of individual ids at a given locus
-        curr_id_list = [seq.id for seq in curr_locus]
-        curr_id_list = [id.split("^")[1] for id in curr_id_list]
-        # replace individual ids with their population code
-        curr_pop_list = [[k for k, v in input_popind_dict.items() if id in v][0] for id in curr_id_list]
-        # count the number of sequences associated with each population, and keep track of the highest value
-        counts = dict(Counter(curr_pop_list))
-        for key in counts:
-            if counts[key] > maxcounts[key]:
-                maxcounts[key] = counts[key]
+    # handle edge case with overlapping ???? nucleotides
+    if np.nan in flatten(dm): 
+        return None
     
-    return maxcounts
+    constructor = DistanceTreeConstructor()
+    
+    return constructor.upgma(dm)
+
+
+## PARALLEL PER-LOCUS COMPUTATION
+
+# split the loci of an alignment into contiguous, non-empty chunks, one for each worker
+def split_Loci  (
+        nloci:          int,
+        n_workers:      int
+                ) ->    list[range]:
+
+    bounds = np.linspace(0, nloci, min(n_workers, nloci) + 1).astype(int)
+
+    return [range(bounds[i], bounds[i+1]) for i in range(len(bounds)-1)]
+
+# calculate the distance summaries of a chunk of loci, in locus order (executed in a worker process)
+def prior_Worker(
+        alignmentfile:      Phylip_MSA_file,
+        indpop_dict,
+        locus_range:        range
+                ) ->        list[tuple]:
+
+    alignment = load_Alignment(alignmentfile)
+    results = []
+    for locus in locus_range:
+        pop_avg_dist, locus_max_dist = get_Locus_Distances(alignment.locus_indiv_ids(locus), alignment.locus_matrix(locus), indpop_dict)
+        results.append((int(alignment.locus_len[locus]), pop_avg_dist, locus_max_dist))
+    
+    return results
+
+# infer the per locus trees of a chunk of loci, in locus order (executed in a worker process)
+def tree_Worker (
+        alignmentfile:      Phylip_MSA_file,
+        indpop_dict,
+        popind_dict,
+        locus_range:        range
+                ) ->        list:
+
+    alignment = load_Alignment(alignmentfile)
+    
+    return [get_Locus_Tree(alignment.locus_indiv_ids(locus), alignment.locus_matrix(locus), indpop_dict, popind_dict) for locus in locus_range]
+
+# run a per-locus worker function on all loci of an alignment using a process pool, and merge the results in locus order
+'''
+The alignment is loaded in the parent process before the pool is started, so that the workers
+find it in the alignment store (when forked), or in the binary cache (when spawned), instead
+of parsing it again. As each worker processes a contiguous chunk of loci, and the chunks are 
+concatenated in order, the merged results are identical to those of a serial loop over the loci.
+'''
+def map_Loci(
+        worker,
+        alignmentfile:      Phylip_MSA_file,
+        n_workers:          int,
+        *worker_args
+            ) ->            list:
+
+    alignment = load_Alignment(alignmentfile)
+    chunks = split_Loci(len(alignment), n_workers)
+    if len(chunks) == 0:
+        return []
+    
+    with mp.Pool(len(chunks)) as pool:
+        chunk_results = pool.starmap(worker, [(alignmentfile, *worker_args, chunk) for chunk in chunks])
+    
+    return flatten(chunk_results)
+
+
+## INCREMENTAL POPULATION PARAMETERS
+
+# return the matrix describing which base populations (rows) make up each proposed population (columns)
+'''
+None is returned if the proposed populations can not be expressed as unions of base populations,
+which is the case if a base population is divided between proposed populations, or if an individual
+in the proposal is not in any base population. 
+'''
+def get_Pop_Membership_matrix   (
+        base_popind_dict,
+        prop_popind_dict
+                                ):
+
+    base_index = get_IndPop_index(base_popind_dict)
+
+    membership = np.zeros((len(base_popind_dict), len(prop_popind_dict)), dtype = np.int64)
+    for prop_index, indivs in enumerate(prop_popind_dict.values()):
+        if any(indiv_id not in base_index for indiv_id in indivs):
+            return None
+        for base_pop_index in set(base_index[indiv_id] for indiv_id in indivs):
+            membership[base_pop_index, prop_index] = 1
+
+    # each base population must belong to exactly one proposed population, with all of its individuals
+    if np.any(membership.sum(axis = 1) != 1):
+        return None
+    prop_sizes = [len(set(indivs)) for indivs in prop_popind_dict.values()]
+    base_sizes = np.array([len(set(indivs)) for indivs in base_popind_dict.values()])
+    if list(base_sizes @ membership) != prop_sizes:
+        return None
+
+    return membership
 
 
 ## MAIN FUNCTIONS
@@ -168,10 +499,16 @@ the BPP control file.
 def autoPopParam(
         imap, 
         alignmentfile:  Phylip_MSA_file, 
+        streaming:      bool = False
                 ) ->    BPP_control_dict_component:
 
     popind_dict = Imap_to_PopInd_Dict(imap)   
-    alignment = alignfile_to_MSA(alignmentfile)
+    
+    if streaming == True:
+        alignment = iterate_Alignment(alignmentfile, streaming = True)
+    else:
+        alignment = load_Alignment(alignmentfile)
+    pop_counts = get_Pop_Count_matrix(popind_dict, alignment)
     
     # row describing the number and name of populations
     n_pops = str(len(popind_dict))
@@ -179,11 +516,11 @@ def autoPopParam(
     pop_names = pop_names.replace(",",""); pop_names = pop_names.replace("'","")
     
     # row describing the ,maximum number of of sequences/loci for each population 
-    maxcounts = count_Seq_Per_Pop(popind_dict, alignment)
+    maxcounts = max_Per_Pop(popind_dict, pop_counts)
     n_in_pop = str([maxcounts[key] for key in maxcounts])[1:-1].replace(","," ")
 
     # row describing the number of loci
-    nloci = str(len(alignment))
+    nloci = str(pop_counts.shape[1])
 
     # final output, formatted to comply with BPP control dict standards
     rows = {"species&tree": f"{n_pops} {pop_names}", 
@@ -192,6 +529,42 @@ def autoPopParam(
 
     return rows
 
+# generate the lines of the control file corresponding to population numbers and sizes for a proposed Imap
+'''
+This function produces the same output as "autoPopParam", but is intended for the proposals of the
+Hierarchical Method, where the proposed populations are merges or splits of a fixed set of base populations.
+The per-locus sequence counts of the base populations are computed once, and the counts of each proposed 
+population are derived by summing the columns of its base populations at each locus, and taking the maximum.
+If the proposal can not be expressed in terms of the base populations, "autoPopParam" is used instead.
+'''
+def proposalPopParam(
+        prop_imap,
+        base_imap,
+        alignmentfile:  Phylip_MSA_file
+                    ) ->    BPP_control_dict_component:
+
+    base_popind_dict = Imap_to_PopInd_Dict(base_imap)
+    prop_popind_dict = Imap_to_PopInd_Dict(prop_imap)
+
+    membership = get_Pop_Membership_matrix(base_popind_dict, prop_popind_dict)
+    if membership is None:
+        return autoPopParam(imap = prop_imap, alignmentfile = alignmentfile)
+
+    base_counts = get_Pop_Count_matrix(base_popind_dict, load_Alignment(alignmentfile))
+    prop_counts = membership.T @ base_counts
+    maxcounts = list(max_Per_Pop(prop_popind_dict, prop_counts).values())
+    
+    # rows formatted identically to "autoPopParam"
+    pop_names = str(prop_popind_dict.keys())[11:-2]
+    pop_names = pop_names.replace(",",""); pop_names = pop_names.replace("'","")
+    n_in_pop = str(maxcounts)[1:-1].replace(","," ")
+
+    rows = {"species&tree": f"{len(prop_popind_dict)} {pop_names}", 
+            "popsizes"    : n_in_pop, 
+            "nloci"       : str(base_counts.shape[1])}
+
+    return rows
+
 # automatically generates the tau and theta prior lines of the BPP control file
 """
 This function generates tau and theta priors using the method implemented in Minimalist BPP by Prof. Bruce Rannala. 
@@ -205,52 +578,47 @@ Tau is calculated to give a mean that is the largest pairwise distance seen in t
 this value is expected to be quite similar to the distance observed at the deepest node of the tree. 
 
 The final values are formatted to comply with the "tauprior" and "thetaprior" lines of the BPP control file
+
+The per locus calculations can be split between "n_workers" processes, which produces identical results.
 """
 def autoPrior   (
         imapfile:       Imap_file, 
-        alignmentfile:  Phylip_MSA_file
+        alignmentfile:  Phylip_MSA_file,
+        streaming:      bool = False,
+        n_workers:      int = 1
                 ) ->    BPP_control_dict_component:
 
-    alignment = alignfile_to_MSA(alignmentfile)
-    
     indpop_dict = Imap_to_IndPop_Dict(imapfile)
     populations = list(set(indpop_dict.values()))
 
+    # the alignment is passed through once, with a single distance matrix per locus used for both the theta and the tau calculation
+        # if multiple workers are requested, the loci are split between processes (streaming is not possible in this case)
+    if n_workers > 1:
+        locus_results = map_Loci(prior_Worker, alignmentfile, n_workers, indpop_dict)
+    else:
+        locus_results = ((code_matrix.shape[1], *get_Locus_Distances(locus_ids, code_matrix, indpop_dict)) for locus_ids, code_matrix in iterate_Alignment(alignmentfile, streaming))
+    
+    per_locus_dist = {population:[] for population in populations}
+    per_locus_len = {population:[] for population in populations}
+    max_dist = []
+    for length, pop_avg_dist, locus_max_dist in locus_results:
+        # the within population averages are weighted by the length of the locus
+        for population in pop_avg_dist:
+            per_locus_len[population].append(length)
+            per_locus_dist[population].append(pop_avg_dist[population])
+
+        if locus_max_dist != None:
+            max_dist.append(locus_max_dist)
+
     ## THETA CALCULATION
     # calculation of average-average pairwise distances
     dist_pop = []
         # iterate through all populations
     for population in populations:
-        per_locus_dist = []
-        per_locus_len = []
-
-        for locus in alignment:
-            # add the sequences belonging to the current population to a temp aligment
-            temp_aligment = MultipleSeqAlignment([])
-            for sequence in locus:
-                id = sequence.id
-                id = id.split("^")[1]
-                if indpop_dict[id] == population:
-                    temp_aligment.append(sequence)
-                # append the length of sequences in the temp alignment
-            length = temp_aligment.get_alignment_length()
-            
-            # the distance can only be calculated for more than 2 sequences
-            if len(temp_aligment) >= 2:
-                
-                # get avergage distance within the temp alignment
-                dist_list = get_Distance_list(temp_aligment)
-                
-                # handle edge case with overlapping ???? nucleotides
-                if np.nan not in dist_list:
-                    avg_dist = np.average(dist_list)
-                    # append to final list
-                    per_locus_len.append(length)
-                    per_locus_dist.append(avg_dist)
-        
         # calculate the locus length weigthed within population average
-        if len(per_locus_dist) > 0:
-            pop_avg = np.average(per_locus_dist, weights = per_locus_len)
+        per_locus_dist_pop = per_locus_dist[population]
+        if len(per_locus_dist_pop) > 0:
+            pop_avg = np.average(per_locus_dist_pop, weights = per_locus_len[population])
             dist_pop.append(pop_avg)
         
     # final theta calculation    
@@ -259,14 +627,7 @@ def autoPrior   (
     theta_beta = np.round(2*D, decimals = 4)
     
     ## TAU CALCULATION
-    # calculation of the maximum pairwise distance at each locus
-    max_dist = []
-    for locus in alignment:
-        dist_list = get_Distance_list(locus)
-        if np.nan not in dist_list:
-            maxval = np.max(dist_list)
-            max_dist.append(maxval)
-
+    # the maximum of the per locus maximum pairwise distances
     M = np.max(max_dist)
     tau_alpha = 3
     tau_beta = np.round(2*M, decimals = 4)
@@ -292,10 +653,14 @@ This function is only called if the program has found no guide trees in the MCF,
 individual BPP control files. In this case, the program needs to run BPP A01 to generate a starting tree.
 The tree output from this function is not very correct, but offers a better starting point than a random tree.
 This way, less computational resources are wasted during A01.
+
+The per locus trees can be inferred by "n_workers" processes, which produces an identical tree.
 '''
 def autoStartingTree(
         imapfile:           Imap_file, 
-        alignmentfile:      Phylip_MSA_file
+        alignmentfile:      Phylip_MSA_file,
+        streaming:          bool = False,
+        n_workers:          int = 1
                     ) ->    Tree_newick:
 
     # associate all individuals with populations
@@ -303,56 +668,16 @@ def autoStartingTree(
 
     # associate all populations with individuals
     popind_dict = Imap_to_PopInd_Dict(imapfile)
-    n_pop = len(popind_dict)
-    
-    # read in the MSA to a list containing the alignment at each locus
-    alignment_list = alignfile_to_MSA(alignmentfile)
 
     ## GENERATE A LIST OF TREES FOR EACH LOCI BY RANDOMLY SAMPLING ONE SEQUENCE FROM EACH POPULATION
-    tree_list = []
-    # begin to iterate through the loci
-    for locus in alignment_list:
-        # get the ids of all the sequences at the locus
-        seq_ids_at_locus = [str(record.id).split("^")[1] for record in locus]
-        
-        # check if all the population are present at the locus, and ignore the locus if not
-        all_pops_at_locus = [str(indpop_dict[indiv_id]) for indiv_id in seq_ids_at_locus]
-        pops_at_locus = []
-        for pop in all_pops_at_locus:
-            if pop not in pops_at_locus:
-                pops_at_locus.append(pop)
-        if len(pops_at_locus) < n_pop:
-            continue
-
-        # recreate the two-way assocations specific to this locus
-        popmap_at_locus = {pop:[seq_id for seq_id in popind_dict[pop] if seq_id in seq_ids_at_locus] for pop in pops_at_locus}
-        pop_dict_at_locus = {seq_id: indpop_dict[seq_id] for seq_id in seq_ids_at_locus }
-
-        # select one random individual from each population
-        random.seed(123)  # this is set up to always produce consistent results from the starting tree inference
-        selected_ids = [random.choice(popmap_at_locus[key]) for key in popmap_at_locus]
-
-        # create the alignment containing a sequence from the random individual
-        temp_align = MultipleSeqAlignment([])
-        for seqObj in locus:
-            indiv_id = str(seqObj.id).split("^")[1]
-            
-            if indiv_id in selected_ids: 
-                selected_ids.remove(indiv_id)
-                row_obj = copy.deepcopy(seqObj)
-                row_obj.id = pop_dict_at_locus[indiv_id]
-                temp_align.extend([row_obj])
-
-        # infer tree using custom distance methods
-        dm = get_DistanceMatrix(temp_align)
-        
-        # handle edge case with overlapping ???? nucleotides
-        if np.nan in flatten(dm): 
-            continue
-        
-        constructor = DistanceTreeConstructor()
-        tree = constructor.upgma(dm)
-        tree_list.append(tree)
+        # if multiple workers are requested, the loci are split between processes (streaming is not possible in this case)
+    if n_workers > 1:
+        locus_trees = map_Loci(tree_Worker, alignmentfile, n_workers, indpop_dict, popind_dict)
+    else:
+        locus_trees = (get_Locus_Tree(seq_ids_at_locus, locus_matrix, indpop_dict, popind_dict) for seq_ids_at_locus, locus_matrix in iterate_Alignment(alignmentfile, streaming))
+    
+    # loci without all populations, or with overlapping ???? nucleotides do not produce a tree
+    tree_list = [tree for tree in locus_trees if tree != None]
 
     ## USE A CONSESUS APPROACH WITH THE GENERATED TREES TO GENERATE OUTPUT
     majority_tree = majority_consensus(tree_list)
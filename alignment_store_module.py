@@ -0,0 +1,459 @@
+'''
+THIS MODULE CONTAINS THE PROCESS-WIDE STORE OF PARSED SEQUENCE ALIGNMENTS.
+EACH ALIGNMENT FILE IS PARSED ONCE, AND KEPT AS A COMPACT ENCODED REPRESENTATION
+THAT IS SHARED BY ALL OTHER MODULES WHICH NEED TO READ THE ALIGNMENT.
+'''
+## DEPENDENCDIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+import hashlib
+
+# EXTERNAL LIBRARY DEPENDENCIES
+import numpy as np
+
+## DATA DEPENDENCIES
+from data_dicts import iupac_code_dict
+
+## TYPING HINTS
+from custom_types import Phylip_MSA_file
+
+
+## ENCODING OF SEQUENCES
+
+# lookup table translating every byte value to the uint8 code of the IUPAC character, with 0 marking characters that can not be compared
+char_code_table = np.zeros(256, dtype = np.uint8)
+for char in iupac_code_dict:
+    char_code_table[ord(char)] = iupac_code_dict[char]
+
+# encode a list of aligned sequence strings as a uint8 code matrix
+def encode_Seqs (
+        seqlist:        list[str]
+                ) ->    np.ndarray:
+
+    if len(seqlist) == 0:
+        return np.zeros((0, 0), dtype = np.uint8)
+
+    raw = np.frombuffer("".join(seqlist).encode("ascii", errors = "replace"), dtype = np.uint8)
+
+    return char_code_table[raw].reshape(len(seqlist), -1)
+
+
+## COMPACT ALIGNMENT REPRESENTATION
+
+# container for an encoded multi-locus alignment
+'''
+All loci are held in a single contiguous uint8 array of IUPAC codes, where the
+rows of each locus are stored one after the other. The start of each locus in
+this array is recorded in "locus_offsets", and the shape of each locus in
+"locus_nseq" and "locus_len". Individual IDs (the part of the sequence name after "^")
+are stored once in "indiv_ids", and every sequence only holds the index of its
+individual in "seq_indiv". The sequences of locus i are the entries
+seq_offsets[i]:seq_offsets[i+1] of "seq_indiv".
+'''
+class EncodedAlignment:
+
+    def __init__(
+            self,
+            codes:          np.ndarray,
+            locus_offsets:  np.ndarray,
+            locus_nseq:     np.ndarray,
+            locus_len:      np.ndarray,
+            seq_indiv:      np.ndarray,
+            indiv_ids:      list[str],
+                ):
+
+        self.codes          = codes
+        self.locus_offsets  = locus_offsets
+        self.locus_nseq     = locus_nseq
+        self.locus_len      = locus_len
+        self.seq_indiv      = seq_indiv
+        self.indiv_ids      = indiv_ids
+        self.seq_offsets    = np.concatenate([[0], np.cumsum(locus_nseq)]).astype(np.int64)
+
+    # the number of loci in the alignment
+    def __len__(self) -> int:
+
+        return len(self.locus_len)
+
+    # the n x L code matrix of a locus
+    def locus_matrix(
+            self,
+            locus:      int
+                    ) -> np.ndarray:
+
+        start = self.locus_offsets[locus]
+        end = start + self.locus_nseq[locus]*self.locus_len[locus]
+
+        return self.codes[start:end].reshape(self.locus_nseq[locus], self.locus_len[locus])
+
+    # the indexes into "indiv_ids" of the sequences at a locus
+    def locus_indiv_index(
+            self,
+            locus:      int
+                        ) -> np.ndarray:
+
+        return self.seq_indiv[self.seq_offsets[locus]:self.seq_offsets[locus+1]]
+
+    # the individual IDs of the sequences at a locus
+    def locus_indiv_ids(
+            self,
+            locus:      int
+                        ) -> list[str]:
+
+        return [self.indiv_ids[index] for index in self.locus_indiv_index(locus)]
+
+    # the set of all individual IDs found in the alignment
+    def all_indiv_ids(self) -> set[str]:
+
+        return set(self.indiv_ids[index] for index in np.unique(self.seq_indiv))
+
+    # iterate through the loci as tuples of individual IDs and code matrices, in the same form as "iterate_Phylip_loci"
+    def iter_loci(self):
+
+        for locus in range(len(self)):
+            yield self.locus_indiv_ids(locus), self.locus_matrix(locus)
+
+# build the encoded representation from an iterable of loci, as produced by "iterate_Phylip_loci"
+def loci_to_Encoded (
+        loci
+                    ) ->    EncodedAlignment:
+
+    indiv_index = {}
+    code_blocks = []
+    seq_indiv = []
+    locus_nseq = []
+    locus_len = []
+    for indiv_ids, code_matrix in loci:
+        code_blocks.append(code_matrix.ravel())
+        locus_nseq.append(code_matrix.shape[0])
+        locus_len.append(code_matrix.shape[1])
+        for indiv_id in indiv_ids:
+            if indiv_id not in indiv_index:
+                indiv_index[indiv_id] = len(indiv_index)
+            seq_indiv.append(indiv_index[indiv_id])
+
+    block_sizes = [len(block) for block in code_blocks]
+
+    return EncodedAlignment(codes           = np.concatenate(code_blocks) if len(code_blocks) > 0 else np.zeros(0, dtype = np.uint8),
+                            locus_offsets   = np.concatenate([[0], np.cumsum(block_sizes)[:-1]]).astype(np.int64) if len(block_sizes) > 0 else np.zeros(0, dtype = np.int64),
+                            locus_nseq      = np.array(locus_nseq, dtype = np.int64),
+                            locus_len       = np.array(locus_len, dtype = np.int64),
+                            seq_indiv       = np.array(seq_indiv, dtype = np.int32),
+                            indiv_ids       = list(indiv_index))
+
+
+## STREAMING PHYLIP READER
+
+# yield the loci of a multi-locus phylip alignment one at a time, as tuples of sequence names and raw sequence rows
+'''
+This function reads the alignment file line by line, so only the locus currently being read
+is held in memory. Empty rows are skipped, and the numeric header of each locus is read by 
+splitting on whitespace, which makes superfluous whitespaces irrelevant (these had to be 
+removed from the file before it could be read by BioPython). Sequence names are split at the 
+first whitespace, and any whitespace within the sequence is ignored. Sequences split across 
+several rows (interleaved format) are appended to in order until they reach the declared length.
+
+A ValueError is raised if the file does not follow the format, so that malformed files are
+rejected in the same way as they were by the BioPython "phylip-relaxed" parser.
+'''
+def iterate_Phylip_rows (
+        align_file:             Phylip_MSA_file
+                        ):
+
+    with open(align_file, "r") as f:
+        n_seq = None
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+
+            # the numeric header describing the number of sequences and sites of the next locus
+            if n_seq == None:
+                header = line.split()
+                if len(header) != 2 or not all(value.isdigit() for value in header):
+                    raise ValueError(f"Invalid phylip header line: '{line}'")
+                n_seq, n_sites = int(header[0]), int(header[1])
+                seq_names = []
+                rows = []
+                n_complete = 0
+                next_row = 0
+            
+            else:
+                # rows containing a sequence name and (the start of) the sequence
+                if len(seq_names) < n_seq:
+                    name_seq = line.split(None, 1)
+                    if len(name_seq) < 2:
+                        raise ValueError(f"Sequence name without sequence: '{line}'")
+                    seq_names.append(name_seq[0])
+                    rows.append(bytearray("".join(name_seq[1].split()).encode("ascii", errors = "replace")))
+                    row = len(rows) - 1
+                # rows continuing a sequence in interleaved format
+                else:
+                    row = next_row
+                    rows[row] += "".join(line.split()).encode("ascii", errors = "replace")
+                    next_row = (next_row + 1) % n_seq
+
+                # keep track of the number of sequences that reached the declared length
+                if len(rows[row]) > n_sites:
+                    raise ValueError(f"Sequence longer than the {n_sites} sites declared in the header")
+                elif len(rows[row]) == n_sites:
+                    n_complete += 1
+
+            # yield the locus when all of its sequences are complete
+            if n_seq != None and len(seq_names) == n_seq and n_complete == n_seq:
+                yield seq_names, rows
+                n_seq = None
+
+    if n_seq != None:
+        raise ValueError("Alignment file ended in the middle of a locus")
+
+
+# yield the loci of a multi-locus phylip alignment one at a time, as tuples of individual IDs and uint8 code matrices
+'''
+The individual ID of a sequence is the part of its name after "^".
+'''
+def iterate_Phylip_loci (
+        align_file:             Phylip_MSA_file
+                        ):
+
+    for seq_names, rows in iterate_Phylip_rows(align_file):
+        raw = np.frombuffer(b"".join(rows), dtype = np.uint8)
+        yield [name.split("^")[-1] for name in seq_names], char_code_table[raw].reshape(len(rows), -1)
+
+# write the sequences of a subset of individuals into a new phylip alignment file
+'''
+The sequences are copied as they are, without encoding. Loci where none of the individuals
+have a sequence are left out. Returns the number of loci written to the new file.
+'''
+def write_Subset_alignment  (
+        align_file:             Phylip_MSA_file,
+        indiv_ids:              list[str],
+        output_file:            Phylip_MSA_file
+                            ) ->    int:
+
+    indiv_set = set(indiv_ids)
+    n_loci = 0
+    with open(output_file, "w") as f:
+        for seq_names, rows in iterate_Phylip_rows(align_file):
+            kept = [(name, row) for name, row in zip(seq_names, rows) if name.split("^")[-1] in indiv_set]
+            if len(kept) == 0:
+                continue
+            f.write(f"{len(kept)} {len(kept[0][1])}\n\n")
+            for name, row in kept:
+                f.write(f"{name}  {row.decode('ascii', errors = 'replace')}\n")
+            f.write("\n")
+            n_loci += 1
+
+    return n_loci
+
+
+## MEMORY-MAPPED BINARY ALIGNMENT CACHE
+
+# layout of the binary sidecar file written next to the alignment file
+'''
+The sidecar file "<seqfile>.hmcache" holds an "EncodedAlignment" in a form that can be 
+opened with numpy.memmap, so repeated runs, and the worker processes of the validator 
+modules, share the pages of the file instead of each holding a privately parsed copy.
+
+The file starts with a fixed size header:
+    magic bytes (8) | sha256 of the alignment file (32) | n_loci, n_seqs, n_codes, n_id_bytes (4 x int64)
+which is followed by the tables and the codes, each starting at a multiple of 8 bytes:
+    locus_offsets, locus_nseq, locus_len (int64 x n_loci) | seq_indiv (int32 x n_seqs) | 
+    individual IDs (utf-8, separated by newlines) | codes (uint8 x n_codes)
+
+If the sha256 in the header does not match the current contents of the alignment file,
+the cache is considered stale, and is rewritten after the alignment is parsed again.
+'''
+cache_magic = b"HMDALN01"
+cache_header_size = 128
+cache_suffix = ".hmcache"
+
+# caching can be switched off, in which case alignments are always parsed from text
+use_binary_cache = True
+
+# round a byte position up to the next multiple of 8
+def align8  (
+        position:       int
+            ) ->    int:
+
+    return (position + 7)//8*8
+
+# calculate the sha256 hash of a file, reading it in chunks
+def file_Hash   (
+        input_file:         str
+                ) ->        bytes:
+
+    hasher = hashlib.sha256()
+    with open(input_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+
+    return hasher.digest()
+
+# calculate the byte offsets of the sections of the cache file
+def cache_Layout(
+        n_loci:         int,
+        n_seqs:         int,
+        n_id_bytes:     int
+                ) ->    dict[str, int]:
+
+    layout = {"locus_offsets": cache_header_size}
+    layout["locus_nseq"]    = layout["locus_offsets"] + 8*n_loci
+    layout["locus_len"]     = layout["locus_nseq"] + 8*n_loci
+    layout["seq_indiv"]     = layout["locus_len"] + 8*n_loci
+    layout["indiv_ids"]     = align8(layout["seq_indiv"] + 4*n_seqs)
+    layout["codes"]         = align8(layout["indiv_ids"] + n_id_bytes)
+
+    return layout
+
+# write the header and sections of the binary cache to a file
+def write_Cache_sections(
+        output_file:        str,
+        header:             bytes,
+        alignment:          EncodedAlignment,
+        id_bytes:           bytes,
+        layout:             dict[str, int]
+                        ):
+
+    with open(output_file, "wb") as f:
+        f.write(header.ljust(cache_header_size, b"\0"))
+        f.write(np.asarray(alignment.locus_offsets, dtype = "<i8").tobytes())
+        f.write(np.asarray(alignment.locus_nseq, dtype = "<i8").tobytes())
+        f.write(np.asarray(alignment.locus_len, dtype = "<i8").tobytes())
+        f.write(np.asarray(alignment.seq_indiv, dtype = "<i4").tobytes())
+        f.write(b"\0"*(layout["indiv_ids"] - f.tell()))
+        f.write(id_bytes)
+        f.write(b"\0"*(layout["codes"] - f.tell()))
+        f.write(np.asarray(alignment.codes, dtype = np.uint8).tobytes())
+
+
+# write an encoded alignment to a binary cache file
+'''
+The file is first written under a temporary name, and then moved into place, so that
+concurrent readers never see a partially written cache.
+'''
+def write_Alignment_cache   (
+        alignment:                  EncodedAlignment,
+        cache_file:                 str,
+        source_hash:                bytes
+                            ):
+
+    id_bytes = "\n".join(alignment.indiv_ids).encode("utf-8")
+    n_loci, n_seqs, n_codes = len(alignment), len(alignment.seq_indiv), len(alignment.codes)
+    layout = cache_Layout(n_loci, n_seqs, len(id_bytes))
+
+    header = cache_magic + source_hash + np.array([n_loci, n_seqs, n_codes, len(id_bytes)], dtype = "<i8").tobytes()
+    
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        write_Cache_sections(temp_file, header, alignment, id_bytes, layout)
+        os.replace(temp_file, cache_file)
+    except OSError:
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
+        raise
+
+# open a binary cache file as a memory-mapped encoded alignment, or return None if the cache is missing or stale
+def open_Alignment_cache(
+        cache_file:             str,
+        source_hash:            bytes
+                        ) ->    EncodedAlignment:
+
+    if not os.path.isfile(cache_file):
+        return None
+
+    with open(cache_file, "rb") as f:
+        header = f.read(cache_header_size)
+    if len(header) < cache_header_size or header[:8] != cache_magic or header[8:40] != source_hash:
+        return None
+    
+    n_loci, n_seqs, n_codes, n_id_bytes = [int(value) for value in np.frombuffer(header[40:72], dtype = "<i8")]
+    layout = cache_Layout(n_loci, n_seqs, n_id_bytes)
+    
+    # the file must be long enough to hold all of the sections declared in the header
+    if os.path.getsize(cache_file) != layout["codes"] + n_codes:
+        return None
+
+    def section(name, dtype, count):
+        if count == 0:
+            return np.zeros(0, dtype = dtype)
+        return np.memmap(cache_file, dtype = dtype, mode = "r", offset = layout[name], shape = (count,))
+
+    indiv_ids = bytes(section("indiv_ids", np.uint8, n_id_bytes)).decode("utf-8")
+
+    return EncodedAlignment(codes           = section("codes", np.uint8, n_codes),
+                            locus_offsets   = section("locus_offsets", "<i8", n_loci),
+                            locus_nseq      = section("locus_nseq", "<i8", n_loci),
+                            locus_len       = section("locus_len", "<i8", n_loci),
+                            seq_indiv       = section("seq_indiv", "<i4", n_seqs),
+                            indiv_ids       = indiv_ids.split("\n") if n_id_bytes > 0 else [])
+
+# parse an alignment file, using the binary cache next to the file if it is up to date, and creating it if not
+def parse_Alignment (
+        align_file:         Phylip_MSA_file
+                    ) ->    EncodedAlignment:
+
+    if use_binary_cache == False:
+        return loci_to_Encoded(iterate_Phylip_loci(align_file))
+
+    cache_file = f"{align_file}{cache_suffix}"
+    source_hash = file_Hash(align_file)
+    
+    alignment = open_Alignment_cache(cache_file, source_hash)
+    if alignment == None:
+        alignment = loci_to_Encoded(iterate_Phylip_loci(align_file))
+        # failing to write the cache (eg. in a read-only folder) is not an error, the alignment is just not cached
+        try:
+            write_Alignment_cache(alignment, cache_file, source_hash)
+        except OSError:
+            pass
+    
+    return alignment
+
+
+## PROCESS-WIDE ALIGNMENT STORE
+
+# parsed alignments, keyed by absolute path, and stored together with the modification time and size of the file when it was parsed
+alignment_store = {}
+
+# return the encoded version of an alignment file, parsing the file only if it was not seen before, or has changed since
+'''
+This function is the single point through which the pipeline reads sequence alignments.
+The first request for a given file parses it, and all later requests for the same
+unchanged file return the stored result. A file is considered changed if its modification
+time or size differ from when it was parsed. Across processes, parsing is avoided by the 
+memory-mapped binary cache written next to the alignment file. Parsing errors are propagated to the caller,
+so the function can also be used to verify that a file is a valid phylip MSA.
+'''
+def load_Alignment  (
+        align_file:         Phylip_MSA_file
+                    ) ->    EncodedAlignment:
+
+    key = os.path.abspath(align_file)
+    stat = os.stat(key)
+    file_signature = (stat.st_mtime_ns, stat.st_size)
+
+    if key in alignment_store and alignment_store[key][0] == file_signature:
+        return alignment_store[key][1]
+
+    alignment = parse_Alignment(align_file)
+    alignment_store[key] = (file_signature, alignment)
+
+    return alignment
+
+# iterate through the loci of an alignment file, either from the alignment store, or by streaming the file
+'''
+When "streaming" is True, the loci are read one at a time directly from the file, and the
+alignment is never held in memory as a whole. This is useful for genome-scale alignments
+which only need to be passed through once. Otherwise, the loci are served from the store.
+'''
+def iterate_Alignment   (
+        align_file:             Phylip_MSA_file,
+        streaming:              bool = False
+                        ):
+
+    if streaming == True:
+        return iterate_Phylip_loci(align_file)
+    else:
+        return load_Alignment(align_file).iter_loci()
@@ -0,0 +1,247 @@
+'''
+THIS MODULE CONTAINS THE FUNCTIONS FOR RUNNING THE PIPELINE ON A BATCH OF MASTER CONTROL FILES.
+EACH PIPELINE RUNS IN ITS OWN PROCESS, STARTED IN THE FOLDER OF ITS MASTER CONTROL FILE, SO THE
+WORKING DIRECTORY OF THE BATCH RUNNER IS NEVER CHANGED. THE CORES OF THE BATCH ARE DIVIDED INTO
+BLOCKS, AND EACH RUNNING PIPELINE SCHEDULES ITS BPP JOBS ON ITS OWN BLOCK OF CORES.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+import sys
+import time
+import asyncio
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import Imap_to_List
+from helper_functions import Imap_to_PopInd_Dict
+from helper_functions import string_limit
+
+# CORE ALLOCATION DEPENDENCIES
+from core_scheduler_module import available_Cores
+from core_scheduler_module import core_block_variable
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import Master_control_file
+from custom_types import file_path
+
+
+## BATCH DEFINITION
+
+# the outcome of running the pipeline on one master control file of the batch
+class batch_Project:
+
+    def __init__(
+            self,
+            mc_file:        Master_control_file,
+                ):
+
+        self.mc_file        = mc_file
+        self.status         = "waiting"
+        self.exit_code      = None
+        self.wall_time      = None
+        self.core_block     = None
+        self.species        = None
+
+# read the master control files of a batch from a text file
+'''
+The batch file lists one master control file per line. Empty lines, and lines starting with "#" are ignored.
+Relative paths are read relative to the folder of the batch file. Exits the pipeline if any file is missing.
+'''
+def read_Batch_file (
+        batch_file:         file_path
+                    ) ->    list[Master_control_file]:
+
+    try:
+        with open(batch_file, "r") as f:
+            lines = [line.strip() for line in f]
+    except OSError:
+        print(f"[X] ERROR: THE BATCH FILE '{batch_file}' CAN NOT BE READ")
+        exit()
+
+    batch_dir = os.path.dirname(os.path.abspath(batch_file))
+    mc_files = [os.path.normpath(os.path.join(batch_dir, line)) for line in lines if len(line) > 0 and not line.startswith("#")]
+
+    missing = [mc_file for mc_file in mc_files if not os.path.isfile(mc_file)]
+    if len(missing) > 0:
+        print("[X] ERROR: THE FOLLOWING MASTER CONTROL FILES OF THE BATCH DO NOT EXIST:")
+        for mc_file in missing:
+            print(f"\t{mc_file}")
+        exit()
+    if len(mc_files) == 0:
+        print(f"[X] ERROR: THE BATCH FILE '{batch_file}' DOES NOT LIST ANY MASTER CONTROL FILES")
+        exit()
+    if len(set(mc_files)) < len(mc_files):
+        print("[X] ERROR: THE SAME MASTER CONTROL FILE IS LISTED MULTIPLE TIMES IN THE BATCH")
+        exit()
+
+    return mc_files
+
+# divide the cores of the batch into the blocks of the pipelines that run at the same time
+'''
+Each block holds "project_cores" cores, and is passed to its pipeline as "n_cores first_core". The number
+of pipelines running at the same time is the number of blocks that fit into the cores of the batch.
+'''
+def plan_Project_blocks (
+        n_projects:         int,
+        batch_cores:        int,
+        project_cores:      int
+                        ) ->    list[str]:
+
+    batch_cores = available_Cores(batch_cores)
+    project_cores = max(1, min(project_cores, batch_cores))
+    n_blocks = max(1, min(n_projects, batch_cores // project_cores))
+
+    return [f"{project_cores} {1 + block*project_cores}" for block in range(n_blocks)]
+
+
+## EXECUTION
+
+# run the pipeline on one master control file in its own process, pinned to a block of cores
+'''
+The process is started in the folder of the master control file, and its output is written to the
+file "<mcf>_batch_log.txt" beside it. The pipeline exits without an error code when it halts on faulty
+inputs, so the run only counts as finished if the final results were written by this run.
+'''
+async def run_Project_async (
+        project:            batch_Project,
+        core_block:         str,
+        extra_args:         list[str]
+                            ):
+
+    project_dir, mc_name = os.path.split(project.mc_file)
+    pipeline_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "HMDelimit.py")
+    environment = {**os.environ, core_block_variable: core_block}
+
+    project.status = "running"
+    project.core_block = core_block
+    print(f"{clprnt.GREEN}STARTING THE PIPELINE OF '{project.mc_file}' ON CORES {core_block.split()[1]}-{sum(int(x) for x in core_block.split()) - 1}{clprnt.end}")
+
+    start_time = time.monotonic()
+    start_date = time.time()
+    with open(os.path.join(project_dir, f"{mc_name[0:-4]}_batch_log.txt"), "w") as log_file:
+        process = await asyncio.create_subprocess_exec(sys.executable, pipeline_script, f"mcf={mc_name},", *extra_args,
+                                                       cwd = project_dir, env = environment,
+                                                       stdout = log_file, stderr = asyncio.subprocess.STDOUT)
+        try:
+            project.exit_code = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+    project.wall_time = time.monotonic() - start_time
+
+    project.species = final_Species(project.mc_file, start_date)
+    project.status = "finished" if project.exit_code == 0 and project.species != None else "failed"
+    print(f"{clprnt.GREEN if project.status == 'finished' else clprnt.RED}THE PIPELINE OF '{project.mc_file}' {project.status.upper()} AFTER {project.wall_time:.0f} SECONDS{clprnt.end}")
+
+# run the pipelines of a batch, with at most one pipeline running on each block of cores
+async def run_Batch_async   (
+        projects:           list[batch_Project],
+        core_blocks:        list[str],
+        extra_args:         list[str]
+                            ):
+
+    queue = asyncio.Queue()
+    for project in projects:
+        queue.put_nowait(project)
+
+    async def run_block(core_block):
+        while not queue.empty():
+            await run_Project_async(queue.get_nowait(), core_block, extra_args)
+
+    await asyncio.gather(*[run_block(core_block) for core_block in core_blocks])
+
+
+## SUMMARY
+
+# read the final delimitation of a finished pipeline, returning None if the pipeline did not finish
+'''
+Returns the delimited species, and the number of individuals assigned to each of them. Final results
+written before "since" (in seconds since the epoch) belong to an earlier run, and are ignored.
+'''
+def final_Species   (
+        mc_file:            Master_control_file,
+        since:              float = 0
+                    ) ->    dict[str, int]:
+
+    result_dir = f"{mc_file[0:-4]}_Final_Result"
+    if not os.path.isdir(result_dir):
+        return None
+    imap_files = [file for file in os.listdir(result_dir) if file.startswith("OUTPUT_IMAP_step_") and file.endswith(".txt")]
+    imap_files.sort(key = lambda file: int(file[len("OUTPUT_IMAP_step_"):-4]))
+    if len(imap_files) == 0 or os.path.getmtime(os.path.join(result_dir, imap_files[-1])) < since:
+        return None
+
+    popind_dict = Imap_to_PopInd_Dict(Imap_to_List(os.path.join(result_dir, imap_files[-1])))
+
+    return {species:len(popind_dict[species]) for species in popind_dict}
+
+# write the summary table of the batch, and print it to the user
+'''
+The table holds one row per master control file, with the status of its pipeline, the runtime, the
+number of delimited species, and the species themselves (with the number of individuals in brackets).
+'''
+def write_Batch_summary (
+        projects:           list[batch_Project],
+        summary_file:       file_path
+                        ):
+
+    header = ["master control file", "status", "runtime (s)", "cores", "n species", "delimitation"]
+    rows = []
+    for project in projects:
+        delimitation = "" if project.species == None else " ".join(f"{species}({n_indiv})" for species, n_indiv in project.species.items())
+        rows.append([project.mc_file,
+                     project.status,
+                     "" if project.wall_time == None else f"{project.wall_time:.1f}",
+                     "" if project.core_block == None else project.core_block.split()[0],
+                     "" if project.species == None else str(len(project.species)),
+                     delimitation])
+
+    with open(summary_file, "w") as f:
+        f.write("\t".join(header) + "\n")
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+
+    # print the table, with long file names and delimitations shortened to fit the terminal
+    widths = [max(len(header[i]), *[len(string_limit(row[i], 48)) for row in rows]) + 2 for i in range(len(header))]
+    print(f"\n{clprnt.BLUE}BATCH SUMMARY:{clprnt.end}\n")
+    print("".join(header[i].upper().ljust(widths[i]) for i in range(len(header))))
+    for row in rows:
+        print("".join(string_limit(row[i], 48).ljust(widths[i]) for i in range(len(header))))
+    print(f"\nThe summary table was written to '{summary_file}'\n")
+
+
+## MAIN FUNCTION
+
+# run the pipeline on each master control file of a batch, sharing the cores of the batch
+def HMbatch (
+        batch_file:         file_path,
+        batch_cores:        int = None,
+        project_cores:      int = None,
+        extra_args:         list[str] = None
+            ):
+
+    if extra_args == None:
+        extra_args = []
+
+    print(f"{clprnt.BLUE}<< STARTING HMDELIMIT BATCH >>{clprnt.end}\n")
+
+    projects = [batch_Project(mc_file) for mc_file in read_Batch_file(batch_file)]
+    if project_cores == None:
+        project_cores = max(1, available_Cores(batch_cores) // len(projects))
+    core_blocks = plan_Project_blocks(len(projects), batch_cores, project_cores)
+    print(f"{len(projects)} MASTER CONTROL FILES, AT MOST {len(core_blocks)} PIPELINES WILL RUN AT THE SAME TIME, EACH ON {core_blocks[0].split()[0]} CORES\n")
+
+    start_time = time.monotonic()
+    try:
+        asyncio.run(run_Batch_async(projects, core_blocks, extra_args))
+    finally:
+        for project in projects:
+            if project.status == "running":
+                project.status = "interrupted"
+        write_Batch_summary(projects, f"{batch_file[0:-4]}_summary.tsv")
+        print(f"total runtime: {time.monotonic() - start_time:.0f} seconds")
@@ -0,0 +1,217 @@
+'''
+THIS MODULE CONTAINS THE CONTENT-ADDRESSED CACHE OF BPP RESULTS,
+WHICH ALLOWS IDENTICAL BPP JOBS TO BE REUSED INSTEAD OF RE-EXECUTED.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+import json
+import shutil
+import hashlib
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import BPP_run
+from helper_functions import BPP_run_concurrent
+from helper_functions import BPP_start_args
+from helper_functions import BPP_result
+from helper_functions import BPP_progress
+from helper_functions import bppcfile_to_dict
+
+# ALIGNMENT STORE DEPENDENCIES
+from alignment_store_module import file_Hash
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import BPP_control_file
+from custom_types import BPP_control_dict
+
+
+## CACHE STATE
+
+# the directory holding the cached results, the cache is disabled until "init_BPP_cache" is called
+BPP_cache_settings = {"directory": None}
+
+# counters of the cache usage during the run
+BPP_cache_stats = {"hits": 0, "misses": 0, "uncacheable": 0, "bytes saved": 0}
+
+# control file parameters that do not influence the results of a BPP job
+'''
+The names of the output files, and the checkpointing and threading setup only influence where and how
+the results are produced. The seqfile and Imapfile parameters are replaced by the hashes of the file contents.
+'''
+cosmetic_BPP_param = ["outfile", "mcmcfile", "checkpoint", "threads", "seqfile", "Imapfile"]
+
+# the output files of a BPP job that are stored in the cache
+cached_BPP_outputs = ["outfile", "mcmcfile"]
+
+# set the directory of the cache, and enable caching
+def init_BPP_cache  (
+        directory:      str
+                    ):
+
+    BPP_cache_settings["directory"] = os.path.abspath(directory)
+
+
+## SPECIALIZED FUNCTIONS
+
+# get the key of a BPP job, or None if the job can not be cached
+'''
+The key is the hash of the normalized control dict, with the cosmetic parameters removed,
+and the contents of the seqfile and the Imap file added. Jobs without a fixed seed are
+not reproducible, so they are never cached.
+'''
+def BPP_job_Key (
+        BPP_cdict:          BPP_control_dict,
+        job_dir:            str
+                ):
+
+    if "seed" not in BPP_cdict or str(BPP_cdict["seed"]).strip() in ["-1", "?"]:
+        return None
+
+    normalized = {str(param):" ".join(str(value).split()) for param, value in BPP_cdict.items() if param not in cosmetic_BPP_param}
+    for param in ["seqfile", "Imapfile"]:
+        if param in BPP_cdict:
+            normalized[param] = file_Hash(os.path.join(job_dir, BPP_cdict[param])).hex()
+
+    return hashlib.sha256(json.dumps(normalized, sort_keys = True).encode("utf-8")).hexdigest()
+
+
+# find the cached outputs of a BPP job, and copy them to the names requested by its control file
+'''
+Returns the key of the job (None if it can not be cached), the paths of its outputs, and the result 
+of the job if it was found in the cache (None otherwise).
+'''
+def cache_Lookup(
+        control_file:   BPP_control_file,
+        cwd:            str = None
+                ):
+
+    job_dir = cwd if cwd != None else ""
+    BPP_cdict = bppcfile_to_dict(os.path.join(job_dir, control_file))
+    output_paths = {param:os.path.join(job_dir, BPP_cdict[param]) for param in cached_BPP_outputs if param in BPP_cdict}
+
+    key = None
+    if BPP_cache_settings["directory"] != None:
+        key = BPP_job_Key(BPP_cdict, job_dir)
+    if key == None:
+        BPP_cache_stats["uncacheable"] += 1
+        return None, output_paths, None
+
+    # reuse the cached outputs of an identical job
+    entry_dir = os.path.join(BPP_cache_settings["directory"], key)
+    if all(os.path.isfile(os.path.join(entry_dir, param)) for param in output_paths):
+        for param in output_paths:
+            shutil.copyfile(os.path.join(entry_dir, param), output_paths[param])
+            BPP_cache_stats["bytes saved"] += os.path.getsize(output_paths[param])
+        BPP_cache_stats["hits"] += 1
+        print(f"{clprnt.GREEN}\nREUSING THE RESULTS OF AN IDENTICAL BPP JOB FROM THE CACHE{clprnt.end}\n")
+
+        return key, output_paths, BPP_result(args                  = ["--cfile", control_file],
+                                             cwd                   = cwd,
+                                             exit_code             = 0,
+                                             wall_time             = 0.0,
+                                             output_paths          = output_paths,
+                                             timed_out             = False,
+                                             stopped_at_checkpoint = False,
+                                             progress              = BPP_progress())
+    
+    BPP_cache_stats["misses"] += 1
+    
+    return key, output_paths, None
+
+# store the outputs of a successful BPP job in the cache
+def cache_Store (
+        key:            str,
+        output_paths:   dict[str, str],
+        result:         BPP_result
+                ):
+
+    if key == None or result.exit_code != 0 or not all(os.path.isfile(output_paths[param]) for param in output_paths):
+        return
+    
+    # the entry is assembled in a temporary folder, so incomplete entries are never found by later jobs
+    entry_dir = os.path.join(BPP_cache_settings["directory"], key)
+    temp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(temp_dir, exist_ok = True)
+        for param in output_paths:
+            shutil.copyfile(output_paths[param], os.path.join(temp_dir, param))
+        os.replace(temp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors = True)
+
+
+## MAIN FUNCTIONS
+
+# run BPP with a given control file, reusing the results of an identical job if one has already completed
+'''
+If the cache is enabled, and an identical job is found in it, the cached outfile and mcmcfile are
+copied to the names requested by the control file, and BPP is not executed. Otherwise, BPP is
+executed by "BPP_run", and the outputs of a successful job are stored in the cache. If BPP exits
+with an error, the pipeline is stopped.
+'''
+def BPP_run_cached  (
+        control_file:   BPP_control_file,
+        cwd:            str = None
+                    ) ->    BPP_result:
+
+    key, output_paths, result = cache_Lookup(control_file, cwd)
+    if result != None:
+        return result
+
+    result = BPP_run(control_file, cwd = cwd)
+    if result.exit_code != 0:
+        print(f"\n[X] ERROR: UNEXPECTED EXIT FROM BPP (CONTROL FILE '{control_file}')")
+        exit()
+    cache_Store(key, output_paths, result)
+
+    return result
+
+# run BPP with several control files concurrently, reusing the results of identical jobs that have already completed
+'''
+The jobs that are not found in the cache are executed concurrently by "BPP_run_concurrent", so the 
+control files must already divide the available cores between the jobs, as planned by "plan_BPP_cores".
+At most "n_slots" jobs run at the same time. The results are returned in the order of the control files.
+The jobs can be run in separate directories by giving a list with one "cwd" per control file.
+'''
+def BPP_run_cached_concurrent   (
+        control_files:      list[BPP_control_file],
+        cwd:                str | list[str] = None,
+        n_slots:            int = None
+                                ) ->    list[BPP_result]:
+
+    job_dirs = cwd if isinstance(cwd, list) else [cwd for control_file in control_files]
+    lookups = [cache_Lookup(control_file, job_dir) for control_file, job_dir in zip(control_files, job_dirs)]
+    to_run = [i for i, lookup in enumerate(lookups) if lookup[2] == None]
+    
+    results = [lookup[2] for lookup in lookups]
+    if len(to_run) > 0:
+        # the cached jobs are left as None, so that every job keeps the slot its cores were planned for
+        jobs = [{"args":BPP_start_args(control_files[i], job_dirs[i]), "cwd":job_dirs[i]} if i in to_run else None for i in range(len(control_files))]
+        print(f"{clprnt.GREEN}\nSTARTING {len(to_run)} CONCURRENT BPP JOBS...{clprnt.end}\n")
+        run_results = BPP_run_concurrent(jobs, n_slots = n_slots)
+        for i in to_run:
+            result = run_results[i]
+            result.output_paths = lookups[i][1]
+            if result.exit_code != 0:
+                print(f"\n[X] ERROR: UNEXPECTED EXIT FROM BPP (CONTROL FILE '{control_files[i]}')")
+                exit()
+            cache_Store(lookups[i][0], lookups[i][1], result)
+            results[i] = result
+
+    return results
+
+# print the usage of the cache during the run
+def BPP_cache_report():
+
+    if BPP_cache_settings["directory"] == None:
+        return
+
+    print(f"\nBPP RESULT CACHE:")
+    print(f"\thits:        {BPP_cache_stats['hits']}")
+    print(f"\tmisses:      {BPP_cache_stats['misses']}")
+    print(f"\tuncacheable: {BPP_cache_stats['uncacheable']} (no fixed seed)")
+    print(f"\tbytes saved: {BPP_cache_stats['bytes saved']}\n")
@@ -8,14 +8,23 @@ DEFAULT VALUES, AND AUTOMATICALLY GENERATED VALUES
 # STANDARD LIBRARY DEPENDENCIES
 import copy
 import random
+import os
+import json
 
 # HELPER FUNCTION DEPENDENCIES
 from helper_functions import overwrite_dict
 from helper_functions import bppcfile_to_dict
 
+# ALIGNMENT STORE DEPENDENCIES
+from alignment_store_module import file_Hash
+
+# CORE ALLOCATION DEPENDENCIES
+from core_scheduler_module import available_Cores
+
 # IMAP, MSA AND TREE SPECIFIC DEPENDENCIES
 from align_imap_module import autoPopParam
 from align_imap_module import autoPrior
+from align_imap_module import proposalPopParam
 from align_imap_module import autoStartingTree
 
 # DATA DEPENDENCIES
@@ -31,8 +40,168 @@ from custom_types import Tree_newick
 from custom_types import Master_control_dict
 
 
+## CACHE OF AUTOMATICALLY GENERATED PARAMETERS
+
+# cache of the values computed by "autoPopParam" and "autoPrior", in memory for the run, and on disk in the working directory
+'''
+The "species&tree", "popsizes", "nloci", "thetaprior" and "tauprior" values generated from the data 
+only depend on the contents of the seqfile and the Imap file. They are therefore stored under a key 
+made from the hashes of the two files, so that later stages of the same run (A01, A11 and every A00 
+iteration), and later runs in the same working directory, can skip the recomputation entirely.
+'''
+auto_param_cache = {}
+auto_param_cache_file = "HMDelimit_autoparam_cache.json"
+
+# the hashes of files, keyed by their absolute path, modification time and size, so that unchanged files are only hashed once
+input_hashes = {}
+
+# get the key of the cache entry corresponding to a seqfile and an Imap file
+def autoparam_Key   (
+        seqfile:            str,
+        imapfile:           str
+                    ) ->    str:
+
+    hashes = []
+    for input_file in [seqfile, imapfile]:
+        stat = os.stat(input_file)
+        file_signature = (os.path.abspath(input_file), stat.st_mtime_ns, stat.st_size)
+        if file_signature not in input_hashes:
+            input_hashes[file_signature] = file_Hash(input_file).hex()
+        hashes.append(input_hashes[file_signature])
+
+    return "_".join(hashes)
+
+# read the values stored for a key, first from memory, then from the cache file on disk
+def read_autoparam_Cache(
+        key:                    str
+                        ) ->    dict:
+
+    if key not in auto_param_cache:
+        try:
+            with open(auto_param_cache_file, "r") as f:
+                disk_cache = json.load(f)
+            if key in disk_cache:
+                auto_param_cache[key] = disk_cache[key]
+        except (OSError, ValueError):
+            pass
+
+    return auto_param_cache.get(key, {})
+
+# add values to the entry of a key, both in memory and in the cache file on disk
+def write_autoparam_Cache   (
+        key:                    str,
+        values:                 dict
+                            ):
+
+    auto_param_cache.setdefault(key, {}).update(values)
+    
+    # failing to write the cache file is not an error, the values are just not stored for later runs
+    try:
+        try:
+            with open(auto_param_cache_file, "r") as f:
+                disk_cache = json.load(f)
+        except (OSError, ValueError):
+            disk_cache = {}
+        disk_cache[key] = auto_param_cache[key]
+        
+        temp_file = f"{auto_param_cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as f:
+            json.dump(disk_cache, f, indent = 1)
+        os.replace(temp_file, auto_param_cache_file)
+    except OSError:
+        pass
+
+# get the values that "autoPopParam" and "autoPrior" would produce, using the cache if possible
+'''
+"param_names" lists the parameters that are required. If any of them is not cached, the function
+that produces it is executed, and its results are added to the cache.
+'''
+def cached_Auto_param   (
+        seqfile:                str,
+        imapfile:               str,
+        param_names:            list[str],
+        n_workers:              int = 1
+                        ) ->    dict:
+
+    key = autoparam_Key(seqfile, imapfile)
+    cached = read_autoparam_Cache(key)
+
+    if any(param not in cached for param in param_names if param in ["species&tree", "popsizes", "nloci"]):
+        write_autoparam_Cache(key, autoPopParam(alignmentfile = seqfile, imap = imapfile))
+    
+    if any(param not in cached for param in param_names if param in ["thetaprior", "tauprior"]):
+        write_autoparam_Cache(key, autoPrior(alignmentfile = seqfile, imapfile = imapfile, n_workers = n_workers))
+    
+    cached = read_autoparam_Cache(key)
+
+    return {param:cached[param] for param in param_names}
+
+
 ## SPECIALIZED FUNCTIONS
 
+# set the BPP "checkpoint" parameter, so that a checkpoint file is written every "interval" samples after the burnin
+'''
+BPP counts the burnin towards the position of the first checkpoint, so the first checkpoint is written 
+after "burnin" + "interval" iterations, and then after every "interval" iterations. If the run is
+interrupted, it can be continued from the newest checkpoint file, losing at most "interval" iterations.
+'''
+def checkpoint_BPP_param(
+        input_control_dict:     BPP_control_dict,
+        interval
+                        ) ->    BPP_control_dict:
+
+    BPP_cdict = copy.deepcopy(input_control_dict)
+    BPP_cdict["checkpoint"] = f"{int(BPP_cdict['burnin']) + int(interval)} {int(interval)}"
+
+    return BPP_cdict
+
+# generate the parameters of one of several independent replicate chains of the same BPP job
+'''
+Each replicate chain receives its own seed, and its own outfile and mcmcfile, named by inserting 
+"_rep_<number>" before the file extension. The chains are run concurrently, so each chain is pinned
+to its own cores by the "threads" value planned for it by "plan_BPP_cores".
+'''
+def replicate_BPP_param (
+        input_control_dict:     BPP_control_dict,
+        replicate:              int,
+        threads:                str
+                        ) ->    BPP_control_dict:
+
+    BPP_cdict = copy.deepcopy(input_control_dict)
+
+    # shift the seed, so that the chains are independent (a seed of -1 is already different for each chain)
+    if int(BPP_cdict["seed"]) != -1:
+        BPP_cdict["seed"] = int(BPP_cdict["seed"]) + replicate
+    
+    # give each chain its own output files
+    for param in ["outfile", "mcmcfile"]:
+        name, extension = os.path.splitext(BPP_cdict[param])
+        BPP_cdict[param] = f"{name}_rep_{replicate+1}{extension}"
+    
+    # pin each chain to its own cores
+    BPP_cdict["threads"] = threads
+
+    return BPP_cdict
+
+
+# get the number of worker processes that automatic parameter generation may use, based on the BPP "threads" parameter
+'''
+The first value of the "threads" parameter is the number of cores the user has budgeted for BPP.
+The same number of processes is used when calculating the priors and the starting tree, but never
+more than the number of cores available to the run. If the parameter is missing or not interpretable, 
+the calculation is performed in a single process.
+'''
+def threads_To_Workers  (
+        threads:                str
+                        ) ->    int:
+
+    try:
+        n_workers = int(str(threads).split()[0])
+    except:
+        n_workers = 1
+
+    return max(1, min(n_workers, available_Cores()))
+
 # extract BPP control file parameters from available data
 '''
 This function is extremely important for the functionality of the pipeline.
@@ -95,7 +264,9 @@ def get_known_BPP_param (
         user_BPP_cfile = bppcfile_to_dict(input_mc_dict[stage_code[BPP_mode]])
         BPP_cdict = overwrite_dict(BPP_cdict, user_BPP_cfile)
     
-    
+    # 4) if the master control dict requests periodic checkpoints, inject the checkpoint parameter
+    if input_mc_dict["checkpoint_interval"] != "?":
+        BPP_cdict = checkpoint_BPP_param(BPP_cdict, input_mc_dict["checkpoint_interval"])
 
     return BPP_cdict
 
@@ -186,8 +357,9 @@ def generate_unkown_BPP_param   (
         
     # fill in population identity, size and loci numbers 
     if any(parameter == '?' for parameter in [BPP_cdict['species&tree'], BPP_cdict['popsizes'], BPP_cdict['nloci']]):
-        popparam = autoPopParam(alignmentfile = BPP_cdict['seqfile'], 
-                                imap          = BPP_cdict['Imapfile'])
+        popparam = cached_Auto_param(seqfile     = BPP_cdict['seqfile'], 
+                                     imapfile    = BPP_cdict['Imapfile'],
+                                     param_names = ["species&tree", "popsizes", "nloci"])
         
         # overwrite s&t and popsizes together, as these always need to match the assumptions of eachother
         if BPP_cdict['species&tree'] == "?" or BPP_cdict['popsizes'] == "?": 
@@ -201,8 +373,10 @@ def generate_unkown_BPP_param   (
     # generate priors if any are missing
     if any(parameter == '?' for parameter in [BPP_cdict['thetaprior'], BPP_cdict['tauprior']]):
         
-        prior = autoPrior(alignmentfile = BPP_cdict['seqfile'], 
-                          imapfile      = BPP_cdict['Imapfile'])
+        prior = cached_Auto_param(seqfile     = BPP_cdict['seqfile'], 
+                                  imapfile    = BPP_cdict['Imapfile'],
+                                  param_names = ["thetaprior", "tauprior"],
+                                  n_workers   = threads_To_Workers(BPP_cdict['threads']))
         
         # only overwrite priors one-by-one
         if BPP_cdict['thetaprior'] == '?':
@@ -227,7 +401,8 @@ def generate_unknown_BPP_tree   (
 
     if BPP_cdict['newick'] == '?':
         BPP_cdict['newick'] = autoStartingTree(alignmentfile = BPP_cdict['seqfile'], 
-                                               imapfile      = BPP_cdict['Imapfile'])
+                                               imapfile      = BPP_cdict['Imapfile'],
+                                               n_workers     = threads_To_Workers(BPP_cdict['threads']))
 
     return BPP_cdict
 
@@ -237,21 +412,29 @@ def generate_unknown_BPP_tree   (
 '''
 This function aims to update the BPP control file to be compliant with the proposed 
 changes in population structure (which are reperesented by the new tree and the new imap).
-The population parameters are calculated using "autoPopParam".
+The population parameters are calculated using "autoPopParam", or if the base populations
+that the proposal merges or splits are supplied in "base_imap", using "proposalPopParam".
 '''
 
 def proposal_compliant_BPP_param(
         input_control_dict:             BPP_control_dict, 
         prop_imap:                      Imap_list, 
         prop_imap_name:                 str, 
-        prop_tree:                      Tree_newick
+        prop_tree:                      Tree_newick,
+        base_imap:                      Imap_list = None
                                 ) ->    BPP_control_dict:
 
     BPP_cdict = copy.deepcopy(input_control_dict)
    
     # generate the s&t and popsizes parameters corresponding to the proposed imap
-    prop_pop_param = autoPopParam(imap          = prop_imap,
-                                  alignmentfile = BPP_cdict["seqfile"])
+    if base_imap is None:
+        prop_pop_param = autoPopParam(imap          = prop_imap,
+                                      alignmentfile = BPP_cdict["seqfile"])
+    # if the base populations of the proposal are known, the popsizes are derived from their per-locus counts
+    else:
+        prop_pop_param = proposalPopParam(prop_imap     = prop_imap,
+                                          base_imap     = base_imap,
+                                          alignmentfile = BPP_cdict["seqfile"])
     
     # create a dict which specifies the keys that will be overwritten
     BPP_proposed_param = {'species&tree': prop_pop_param["species&tree"], # species&tree values corresponding to the proposal
@@ -262,4 +445,4 @@ def proposal_compliant_BPP_param(
     # overwrite with parameters specific to the proposal
     BPP_cdict = overwrite_dict(BPP_cdict, BPP_proposed_param)
 
-    return BPP_cdict
\ No newline at end of file
+    return BPP_cdict
@@ -14,10 +14,12 @@ with warnings.catch_warnings():
 
 # HELPER FUNCTION DEPENDENCIES
 from helper_functions import string_limit
-from helper_functions import alignfile_to_MSA 
 from helper_functions import Imap_to_List
 from helper_functions import Imap_to_PopInd_Dict
 
+# ALIGNMENT STORE DEPENDENCIES
+from alignment_store_module import load_Alignment
+
 # ALIGNMENT AND IMAP SPECIFIC DEPENDENCIES
 from align_imap_module import autoPopParam
 from align_imap_module import count_Seq_Per_Pop
@@ -34,14 +36,7 @@ def assert_Imap_Seq_compat(imapfile, alignmentfile):
     names_imap = set(Imap_to_List(imapfile)[0])
     
     # get the list of individual IDs in the alignment
-    alignment = alignfile_to_MSA(alignmentfile)
-    names_align = []
-    for locus in alignment:
-        for seq in locus:
-            name = seq.id
-            name = name.split("^")[-1]
-            names_align.append(name)
-    names_align = set(names_align)
+    names_align = load_Alignment(alignmentfile).all_indiv_ids()
     
     # check if the two sets of names are identical
     if names_imap == names_align:
@@ -243,7 +238,7 @@ def check_GuideTree_Imap_MSA_compat(input_newick, imap, alignmentfile):
     print(f"\t3) Guide Tree  = {string_limit(input_newick, 72)}\n")
 
     popind_dict = Imap_to_PopInd_Dict(imap) 
-    alignment = alignfile_to_MSA(alignmentfile)
+    alignment = load_Alignment(alignmentfile)
 
     # count the max numer of sequences per population
     maxcounts = count_Seq_Per_Pop(popind_dict, alignment)
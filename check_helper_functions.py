@@ -18,7 +18,6 @@ with warnings.catch_warnings():
     from ete3 import Tree
 
 # HELPER FUNCTION DEPENDENCIES
-from helper_functions import alignfile_to_MSA
 from helper_functions import readLines
 from helper_functions import remove_empty_rows
 from helper_functions import bppcfile_to_dict
@@ -26,6 +25,9 @@ from helper_functions import Imap_to_IndPop_Dict
 from helper_functions import Imap_to_List
 from helper_functions import Imap_to_PopInd_Dict
 
+# ALIGNMENT STORE DEPENDENCIES
+from alignment_store_module import load_Alignment
+
 # TREE HELPER DEPENDENCIES
 from tree_helper_functions import name_Internal_nodes
 
@@ -238,10 +240,28 @@ def check_Threads(threads):
 
     return threads_state
 
+# check that the limit on the number of cores used by the run is a positive integer, and fits the CPU
+def check_Core_limit(core_limit):
+    if core_limit == "?":
+        limit_state = 0
+    else:
+        try:
+            limit = int(core_limit)
+            if   limit < 1:
+                limit_state = -1
+            elif limit > int(os.cpu_count()):
+                limit_state = -2
+            else:
+                limit_state = 1
+        except:
+            limit_state = -1
+
+    return limit_state
+
 # check that the number of threads requested <= the number of loci in the MSA
 def check_Threads_MSA_compat(input_threads, alignmentfile):
     n_threads = int(input_threads.split()[0])
-    true_nloci = len(alignfile_to_MSA(alignmentfile))
+    true_nloci = len(load_Alignment(alignmentfile))
 
     if n_threads <= true_nloci:
         threads_state = 1
@@ -263,7 +283,7 @@ def check_Threads_nloci_compat(input_threads, input_nloci):
 
 # check that the number of loci to check is less than or equal to the loci in the MSA
 def check_nloci_MSA_compat(input_nloci, alignmentfile):
-    true_nloci = len(alignfile_to_MSA(alignmentfile))
+    true_nloci = len(load_Alignment(alignmentfile))
     user_nloci = int(input_nloci)
 
     if user_nloci <= true_nloci:
@@ -589,7 +609,7 @@ def check_MSA_filetype(alignmentfile):
     if align_state == 1:
         try:
             # try to load the alignment file to the internal MSA object
-            align = alignfile_to_MSA(alignmentfile)
+            align = load_Alignment(alignmentfile)
             align_state = 1
         except:
             align_state = -2 # the file could not be interpreted as a phylip MSA
@@ -626,6 +646,7 @@ def check_folders_do_not_exist(input_mcfile):
     outfolder.append(f'{input_mcfile[0:-4]}_1_StartDelim')
     outfolder.append(f'{input_mcfile[0:-4]}_0_StartPhylo')
     outfolder.append(f'{input_mcfile[0:-4]}_Final_Result')
+    outfolder.append(f'{input_mcfile[0:-4]}_2_HM_0_Clades')
     for i in range(1, 51):
         outfolder.append(f'{input_mcfile[0:-4]}_2_HM_{i}')
 
@@ -30,6 +30,7 @@ from check_helper_functions import check_BPP_ctl_filetype
 from check_helper_functions import check_nloci_MSA_compat
 from check_helper_functions import check_Threads_MSA_compat
 from check_helper_functions import check_Threads_nloci_compat
+from check_helper_functions import check_Core_limit
 from check_helper_functions import check_locusrate
 
 # CONFLICT CHECKING DEPENDENCIES
@@ -61,7 +62,8 @@ The function:
 Execution of the pipeline is halted immediately if errors are detected at any stage.
 '''
 def check_Master_Control(
-        input_control_file: Master_control_file
+        input_control_file: Master_control_file,
+        resume:             bool = False
                         ):
 
     print(f"\n{clprnt.BLUE}INITAL CHECK OF MASTER CONTROL FILE (MCF) PARAMETERS{clprnt.end}\n")
@@ -70,8 +72,9 @@ def check_Master_Control(
     check_Master_control_filetype(input_control_file)
     param = read_MasterControl(input_control_file)
 
-    # check that the target folders that the output will be written to do not exist
-    check_folders_do_not_exist(input_control_file)
+    # check that the target folders that the output will be written to do not exist, unless an interrupted run is resumed
+    if resume == False:
+        check_folders_do_not_exist(input_control_file)
 
     par_check = {key:0 for key in param}
 
@@ -85,6 +88,12 @@ def check_Master_Control(
     par_check["ctl_file_phylo"] = check_BPP_ctl_filetype(param["ctl_file_phylo"])
     par_check["ctl_file_delim"] = check_BPP_ctl_filetype(param["ctl_file_delim"])
     par_check["ctl_file_HM"]    = check_BPP_ctl_filetype(param["ctl_file_HM"])
+    par_check["checkpoint_interval"] = check_Numeric(param["checkpoint_interval"], "0<x", "i")
+    par_check["replicates"]     = check_Numeric(param["replicates"], "0<x", "i")
+    par_check["max_cores"]      = check_Core_limit(param["max_cores"])
+    par_check["speculative"]    = check_ValueIsFrom(param["speculative"], ["True"])
+    par_check["clade_size"]     = check_Numeric(param["clade_size"], "1<x", "i")
+    par_check["adaptive_segment"] = check_Numeric(param["adaptive_segment"], "0<x", "i")
 
     # parameters for the merge decisions
     par_check["mode"]           = check_ValueIsFrom(param["mode"], ["merge", "split"])
@@ -92,6 +101,8 @@ def check_Master_Control(
     par_check["generations"]    = check_Numeric(param["generations"], "100<=x<=1000000","i")
     par_check["mutationrate"]   = check_Numeric(param["mutationrate"], "0<x<1")
     par_check["HM_decision"]    = check_GDI_params(param["HM_decision"], par_check)
+    par_check["GDI_estimate"]   = check_ValueIsFrom(param["GDI_estimate"], ["mean", "median", "hpd"])
+    par_check["adaptive_tolerance"] = check_Numeric(param["adaptive_tolerance"], "0<x<1")
     
     # parameters passed to BPP instances
     par_check["seed"]           = check_Numeric(param["seed"], "-1<=x","i")
@@ -15,6 +15,7 @@ import difflib
 from check_helper_functions import check_File_exists
 from check_helper_functions import check_Imap_filetype
 from check_helper_functions import check_MSA_filetype
+from check_helper_functions import check_Numeric
 
 # HELPER FUNCTIONS
 from helper_functions import pretty
@@ -30,6 +31,7 @@ from custom_types import file_path
 from data_dicts import clprnt
 from data_dicts import MCF_param_dict
 from data_dicts import command_line_params
+from data_dicts import HM_decision_criteria
 
 
 ## SPECIALIZED HELPER FUNCTIONS
@@ -83,6 +85,12 @@ def interpret_cmdline_args  (
         output_dict["checkonly"] = True
         argument_list.remove("--check")
 
+    # see if the "--resume" argument is passed, which continues an interrupted run from its journal
+    output_dict["resume"] = False
+    if "--resume" in argument_list:
+        output_dict["resume"] = True
+        argument_list.remove("--resume")
+
     # if the master control file argument is present, check that it is the only one
     
     # if it is the mcf argument
@@ -185,10 +193,16 @@ def move_to_mc_folder   (
 # create a master control file with the arguments provided in the command line
 def create_auto_MC  (
         mc_dict:            Master_control_dict,
+        resume:             bool = False
                     ) ->    Master_control_file:
 
     filename = "AutoMC.txt"
 
+    # when resuming an interrupted run, the master control file generated for that run is reused
+    if resume == True and check_File_exists(filename) == 1:
+        print(f"\nREUSING THE MASTER CONTROL FILE '{filename}' OF THE INTERRUPTED RUN")
+        return filename
+
     print(f"\nAUTOMATICALLY GENERATING MASTER CONTROL FILE '{filename}' BASED ON USER INPUT")
 
     # check that such a file exists already, and fail the pipeline if so
@@ -210,6 +224,7 @@ def create_auto_MC  (
 # automatically set up the master control file if called from the command line
 def initialize_with_autoMC  (
         mc_dict:                    Master_control_dict,
+        resume:                     bool = False
                             )  ->   Master_control_file:
 
     # print feedback to the user
@@ -287,10 +302,94 @@ def initialize_with_autoMC  (
     os.chdir(target_dir_name)
 
     # create a small master control file: 
-    filename = create_auto_MC(mc_dict)
+    filename = create_auto_MC(mc_dict, resume)
 
     return filename
 
+## GETTING BATCH ARGUMENTS FROM THE COMMAND LINE
+# interpret the command line arguments of the batch runner
+'''
+The batch runner is called with the file listing the master control files ("batch"), and optionally
+the number of cores shared by the batch ("cores") and the number of cores of each pipeline ("project_cores").
+The "--resume" argument is passed on to every pipeline of the batch.
+'''
+def batch_cmdline_interpret (
+        argument_list:              list[str]
+                            ) ->    dict:
+
+    argument_list = collect_cmdline_args(argument_list)
+
+    output_dict = {"batch": None, "cores": None, "project_cores": None, "extra_args": []}
+    if "--resume" in argument_list:
+        output_dict["extra_args"].append("--resume")
+        argument_list.remove("--resume")
+
+    for argument in argument_list:
+        name_value = [stripall(part) for part in argument.split("=")]
+        if len(name_value) != 2 or name_value[0] not in ["batch", "cores", "project_cores"] or len(name_value[1]) == 0:
+            print(f"[X] ERROR: THE ARGUMENT '{argument}' IS NOT RECOGNIZED")
+            print("Please provide the arguments as: 'batch = example_batch.txt, cores = 16, project_cores = 4'")
+            exit()
+        output_dict[name_value[0]] = name_value[1]
+
+    if output_dict["batch"] == None:
+        print("[X] ERROR: THE BATCH FILE ARGUMENT IS MISSING")
+        print("set the batch file argument as: batch=example_batch.txt")
+        exit()
+    for param in ["cores", "project_cores"]:
+        if output_dict[param] != None:
+            if not output_dict[param].isdigit() or int(output_dict[param]) < 1:
+                print(f"[X] ERROR: '{param}' MUST BE A POSITIVE INTEGER")
+                exit()
+            output_dict[param] = int(output_dict[param])
+
+    return output_dict
+
+
+## GETTING REPLAY ARGUMENTS FROM THE COMMAND LINE
+# interpret the command line arguments of the decision replay
+'''
+The replay is called with the master control file of a finished run ("mcf"), and the values of the decision
+parameters to replay, each given as a list separated by spaces, e.g. "GDI_thresh = 0.1 0.2 0.3". The values
+are checked with the same rules as the parameters of the master control file.
+'''
+def replay_cmdline_interpret(
+        argument_list:              list[str]
+                            ) ->    dict:
+
+    argument_list = collect_cmdline_args(argument_list)
+
+    value_checks = {"GDI_thresh":   lambda value: check_Numeric(value, "0<x<1") == 1,
+                    "generations":  lambda value: check_Numeric(value, "100<=x<=1000000", "i") == 1,
+                    "mutationrate": lambda value: value == "?" or check_Numeric(value, "0<x<1") == 1,
+                    "HM_decision":  lambda value: value in HM_decision_criteria}
+
+    output_dict = {"mcf": None, "grid": {}}
+    for argument in argument_list:
+        name_value = [stripall(part) for part in argument.split("=")]
+        if len(name_value) != 2 or name_value[0] not in ["mcf", *value_checks] or len(name_value[1]) == 0:
+            print(f"[X] ERROR: THE ARGUMENT '{argument}' IS NOT RECOGNIZED")
+            print("Please provide the arguments as: 'mcf = example_mcf.txt, GDI_thresh = 0.1 0.2 0.3, HM_decision = all any'")
+            exit()
+        if name_value[0] == "mcf":
+            output_dict["mcf"] = name_value[1]
+            continue
+        values = name_value[1].split()
+        invalid = [value for value in values if not value_checks[name_value[0]](value)]
+        if len(invalid) > 0:
+            print(f"[X] ERROR: THE VALUES {invalid} OF '{name_value[0]}' ARE NOT VALID")
+            print("Please consult the manual for the possible values of the parameter")
+            exit()
+        output_dict["grid"][name_value[0]] = values
+
+    if output_dict["mcf"] == None or check_File_exists(output_dict["mcf"]) != 1:
+        print("[X] ERROR: THE MASTER CONTROL FILE ARGUMENT IS MISSING, OR THE FILE DOES NOT EXIST")
+        print("set the master control file argument as: mcf=example_mastercontrol_file.txt")
+        exit()
+
+    return output_dict
+
+
 ## FINAL WRAPPER FUNCTION
 def cmdline_interpret   (
     argument_list
@@ -304,6 +403,12 @@ def cmdline_interpret   (
     param.pop("checkonly")
     if checkonly == True:
         print("\tCHECK ONLY MODE ACTIVATED!\n")
+    
+    # separate out the resume parameter
+    resume = param["resume"]
+    param.pop("resume")
+    if resume == True:
+        print("\tRESUME MODE ACTIVATED!\n")
 
     # this is the case where the pipeline was initalized and pointed to a master control file
     if "mcf" in param:
@@ -311,6 +416,6 @@ def cmdline_interpret   (
     
     # this is the case where the pipeline was initalized with command line specified master control file parameters
     else:
-        mc_file = initialize_with_autoMC(param)
+        mc_file = initialize_with_autoMC(param, resume)
 
-    return mc_file, checkonly
\ No newline at end of file
+    return mc_file, checkonly, resume
\ No newline at end of file
@@ -0,0 +1,122 @@
+'''
+THIS MODULE CONTAINS THE CORE ALLOCATION PLANNER OF THE PIPELINE. IT DIVIDES THE
+CPU CORES AVAILABLE TO THE RUN BETWEEN CONCURRENT BPP JOBS, SO THAT EACH JOB IS
+PINNED TO ITS OWN CORES, AND THE TOTAL NUMBER OF BPP THREADS NEVER EXCEEDS THE BUDGET.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+
+## CORE BUDGET
+
+# the maximum number of cores the run may use, the run may use all cores until "set_Core_limit" is called
+'''
+"first" is the first core of the budget. It is only moved away from the first core of the computer when 
+the run is one of several pipelines started by the batch runner, which gives each pipeline its own block of cores.
+'''
+core_budget = {"limit": None, "first": 1}
+
+# the environment variable through which the batch runner passes the block of cores of a pipeline ("n_cores first_core")
+core_block_variable = "HMDELIMIT_CORE_BLOCK"
+
+# set the maximum number of cores the run may use ("?" or None removes the limit)
+def set_Core_limit  (
+        limit
+                    ):
+
+    core_budget["limit"] = None if limit in [None, "?"] else int(limit)
+
+# restrict the run to the block of cores assigned by the batch runner, if the run was started by it
+def inherit_Core_block():
+
+    block = os.environ.get(core_block_variable)
+    if block == None:
+        return
+    
+    n_cores, first_core = [int(x) for x in block.split()]
+    core_budget["first"] = first_core
+    if core_budget["limit"] == None or core_budget["limit"] > n_cores:
+        core_budget["limit"] = n_cores
+
+# get the number of cores the run may use
+def available_Cores(
+        core_limit = None
+                    ) ->    int:
+
+    n_cores = int(os.cpu_count()) - (core_budget["first"] - 1)
+    if core_limit == None:
+        core_limit = core_budget["limit"]
+    if core_limit != None:
+        n_cores = min(n_cores, int(core_limit))
+
+    return max(1, n_cores)
+
+
+## PLANNING
+
+# the allocation of cores to a group of concurrent BPP jobs
+'''
+"threads" holds the value of the BPP "threads" parameter for each job. The jobs are divided into
+"n_slots" slots, each of which is pinned to its own block of cores. Job i runs in slot i % n_slots,
+and the jobs of a slot run one after the other, so the jobs running at the same time never share cores.
+'''
+class BPP_core_plan:
+
+    def __init__(
+            self,
+            threads:        list[str],
+            n_slots:        int,
+            n_threads:      int
+                ):
+
+        self.threads    = threads
+        self.n_slots    = n_slots
+        self.n_threads  = n_threads
+
+# plan the threads and core pinning of a group of BPP jobs
+'''
+"requested_threads" is the BPP "threads" parameter requested by the user ("n", "n offset" or "n offset stride").
+"n" is the number of threads of each job, and the cores of the budget begin at "offset" (the first core by default),
+which is counted from the first core of the budget.
+The number of threads per job is lowered if a single job would not fit the budget, and the number of jobs
+running at the same time is lowered until the threads of all running jobs fit the budget.
+'''
+def plan_BPP_cores  (
+        n_jobs:                 int,
+        requested_threads:      str,
+        core_limit = None
+                    ) ->        BPP_core_plan:
+
+    th = [1, 1, 1]
+    try:
+        th[0:len(str(requested_threads).split())] = [int(x) for x in str(requested_threads).split()]
+    except ValueError:
+        th = [1, 1, 1]
+    n_threads, first_core, stride = th
+
+    # find the span of cores in the budget, beginning at the requested offset
+    first_core = core_budget["first"] + first_core - 1
+    if first_core > int(os.cpu_count()):
+        first_core = core_budget["first"]
+    span = min(int(os.cpu_count()) - (first_core - 1), available_Cores(core_limit))
+    if stride > span:
+        stride = 1
+
+    # fit a single job, and then as many concurrent jobs as possible into the budget
+    n_threads = max(1, min(n_threads, span // stride))
+    n_slots = max(1, min(n_jobs, span // (n_threads*stride)))
+
+    # print feedback to the user if the request could not be fulfilled
+    if n_threads < th[0]:
+        print(f"{clprnt.YELLOW}[!] {th[0]} BPP THREADS WERE REQUESTED, BUT ONLY {span} CORES ARE AVAILABLE, EACH BPP JOB WILL USE {n_threads} THREADS{clprnt.end}")
+    if n_slots < n_jobs:
+        print(f"{clprnt.YELLOW}[!] THE {n_jobs} BPP JOBS DO NOT FIT THE {span} AVAILABLE CORES, AT MOST {n_slots} JOBS WILL RUN AT THE SAME TIME{clprnt.end}")
+
+    threads = [f"{n_threads} {first_core + (job % n_slots)*n_threads*stride} {stride}" for job in range(n_jobs)]
+
+    return BPP_core_plan(threads, n_slots, n_threads)
@@ -15,6 +15,7 @@ BPP_control_file = NewType("BPP_control_file", file_path)
 BPP_control_dict = NewType("BPP_control_dict", dict)
 BPP_control_dict_component = NewType("BPP_control_dict_component", dict)
 BPP_out_file = NewType("BPP_out_file", file_path)
+BPP_mcmc_file = NewType("BPP_mcmc_file", file_path)
 
 # custom types for Master control files, and associated control dicts.
 Master_control_file = NewType("Master_control_file", file_path)
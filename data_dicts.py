@@ -21,12 +21,20 @@ MCF_param_dict =    {
 "ctl_file_phylo":"BPP A01 starting phylogeny inference",
 "ctl_file_delim":"BPP A11 starting delimitation",           
 "ctl_file_HM"   :"BPP A00 HM parameter inference",  
+"checkpoint_interval":"checkpoint interval",
+"replicates"    :"HM replicate chains",
+"max_cores"     :"core limit",
+"speculative"   :"HM speculative execution",
+"clade_size"    :"HM clade size",
+"adaptive_segment":"HM adaptive segment size",
 # parameters for the merge decisions
 "mode"          :"HM mode",
 "GDI_thresh"    :"GDI threshold",
 "generations"   :"HM generation threshold",
 "mutationrate"  :"HM mutation rate",
 "HM_decision"   :"HM decision criteria",
+"GDI_estimate"  :"HM GDI estimate",
+"adaptive_tolerance":"HM adaptive tolerance",
 # parameters passed to BPP instances
 "seed"          :"seed",
 "thetaprior"    :"thetaprior", 
@@ -91,6 +99,31 @@ master_Control_feedback =   {
                     0 :" ~  BPP A00 HM Parameter Inference control file not specified",
                     1 :"[*] BPP A00 HM Parameter Inference control file successfully found",
                     }, 
+"checkpoint_interval":{-1:"[X] ERROR: CHECKPOINT INTERVAL NOT A POSITIVE INTEGER\n\n\t Please set to the number of MCMC samples between BPP checkpoints, or leave empty\n",
+                    0 :" ~  BPP runs will not be checkpointed",
+                    1 :"[*] BPP runs will be periodically checkpointed",
+                    },
+"replicates":      {-1:"[X] ERROR: NUMBER OF HM REPLICATE CHAINS NOT A POSITIVE INTEGER\n\n\t Please set to the number of independent A00 chains run in each HM iteration, or leave empty\n",
+                    0 :" ~  HM replicate chains not specified, a single A00 chain will be run in each HM iteration",
+                    1 :"[*] HM replicate chains correctly specified",
+                    },
+"max_cores":       {-2:"[X] ERROR: THE CORE LIMIT IS LARGER THAN THE NUMBER OF CORES ON THE COMPUTER\n\n\t Please set to at most the number of CPU cores available, or leave empty\n",
+                    -1:"[X] ERROR: CORE LIMIT NOT A POSITIVE INTEGER\n\n\t Please set to the maximum number of CPU cores the BPP jobs may use, or leave empty\n",
+                    0 :" ~  core limit not specified, BPP jobs may use all CPU cores",
+                    1 :"[*] core limit correctly specified",
+                    },
+"speculative":     {-1:"[X] ERROR: HM SPECULATIVE EXECUTION INCORRECTLY SPECIFIED\n\n\t Please set to 'True' to speculatively start the next HM iteration on idle cores, or leave empty\n",
+                    0 :" ~  HM iterations will not be speculatively executed",
+                    1 :"[*] HM iterations will be speculatively executed on idle cores",
+                    },
+"clade_size":      {-1:"[X] ERROR: HM CLADE SIZE NOT AN INTEGER LARGER THAN 1\n\n\t Please set to the number of populations above which clades of the guide tree are merged independently, or leave empty\n",
+                    0 :" ~  HM clade size not specified, the whole guide tree will be iterated",
+                    1 :"[*] HM clade size correctly specified, large clades will be merged independently",
+                    },
+"adaptive_segment":{-1:"[X] ERROR: HM ADAPTIVE SEGMENT SIZE NOT A POSITIVE INTEGER\n\n\t Please set to the number of MCMC samples after which the HM decision is re-evaluated, or leave empty\n",
+                    0 :" ~  HM adaptive segment size not specified, the A00 runs of the HM will run for the full number of samples",
+                    1 :"[*] HM adaptive segment size correctly specified, A00 runs will stop once the decision is stable",
+                    },
 # parameters for the merge decisions
 "mode":            {-1:"[X] ERROR: HM MODE INCORRECTLY SPECIFIED\n\n\t Please specify as 'merge' or 'split', or leave empty\n",
                     0 :" ~  HM mode not specified, will default to 'merge'",
@@ -113,6 +146,14 @@ master_Control_feedback =   {
                     0 :" ~  HM decision criteria not specified, will default to 'all'",
                     1 :"[*] HM decision criteria correctly specified",
                     },
+"GDI_estimate":    {-1:"[X] ERROR: HM GDI ESTIMATE INCORRECTLY SPECIFIED\n\n\t Please use 'mean', 'median' or 'hpd' to decide on the posterior GDI distribution of the MCMC samples, or leave empty\n",
+                    0 :" ~  HM GDI estimate not specified, GDI values will be calculated from the posterior means of tau and theta",
+                    1 :"[*] HM GDI estimate correctly specified, GDI values will be calculated from the MCMC samples",
+                    },
+"adaptive_tolerance":{-1:"[X] ERROR: HM ADAPTIVE TOLERANCE INCORRECTLY SPECIFIED\n\n\t Please use a numeric value between 0 and 1, or leave empty\n",
+                    0 :" ~  HM adaptive tolerance not specified, will default to 0.01",
+                    1 :"[*] HM adaptive tolerance correctly specified",
+                    },
 # parameters passed to BPP instances
 "seed":            {-1:"[X] ERROR: BPP SEED INCORRECTLY SPECIFIED\n\n\t Please use -1 or a positive integer value, or leave empty\n",
                     0 :" ~  seed not specified",
@@ -169,6 +210,8 @@ empty_HM_parameters   = {
 "generations":     "?",
 "mutationrate":    "?",
 "HM_decision":     "?",
+"GDI_estimate":    "?",
+"adaptive_tolerance":"?",
                         }
 
 # the default values for HM decision parameters
@@ -180,6 +223,8 @@ default_HM_parameters = {
 "min_gen":         "10000",  # populations are considered two species if they separated more than this many generations ago
 "mutationrate":    "?",      # default mutation rate is unkown, and if none is provided, the program will not compute the age of the split
 "HM_decision":     "all",    # by default, all measured parameters should be withinn their respective thresholds to accept a proposal
+"GDI_estimate":    "?",      # by default, the GDI values are calculated from the posterior means of tau and theta in the outfile
+"adaptive_tolerance":"0.01", # adaptive A00 runs stop once no decided GDI value changes by more than this between two segments
                         }
 
 # all the possible decision criteria during the HM process
@@ -633,4 +678,7 @@ distance_dict = {
 'HD':0.222,
 'VD':0.222,
 'VH':0.222,
-                }
\ No newline at end of file
+                }
+# integer codes of the available characters, used when alignments are encoded as uint8 arrays. 
+# code 0 is reserved for characters that can not be compared (gaps, "N", "?", etc.), code 15 is unused padding
+iupac_code_dict = {char:code+1 for code, char in enumerate(["A", "C", "G", "T", "R", "Y", "S", "W", "K", "M", "B", "D", "H", "V"])}
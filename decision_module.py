@@ -5,6 +5,7 @@ WATCHES THE STOPPING CONDITIONS OF THE PIPELINE
 '''
 ## DEPENDENCIES
 # STADARD LIBRARY DEPENDENCDIES
+import os
 import ast
 import contextlib
 
@@ -13,17 +14,26 @@ import numpy as np
 
 # HELPER FUNCTION DEPENDENCIES
 from helper_functions import flatten
-from helper_functions import extract_Name_TauTheta_dict
 from helper_functions import pretty_Table
 
+# NODE TABLE DEPENDENCIES
+from node_table_module import node_Table
+from node_table_module import BPP_node_table
+
+# POSTERIOR GDI DEPENDENCIES
+from posterior_gdi_module import posterior_GDI_Of_Pairs
+from posterior_gdi_module import hpd_mass
+
 # TREE FUNCTION DEPENDENCIES
 from tree_helper_functions import visualize_decision, visualize_imap
 
 ## DATA DEPENDENCIES
+from data_dicts import HM_decision_criteria
 from data_dicts import HM_decision_criteria_description
 
 ## TYPE HINTING DEPENDENCIES
 from custom_types import BPP_out_file
+from custom_types import BPP_mcmc_file
 from custom_types import HM_decision_parameters
 from custom_types import MSC_parameters
 from custom_types import Species_name
@@ -41,26 +51,14 @@ sequence is assigned to that species) the gdi calculation recycles the existing
 theta value for the other species, and both gdi values will be identical.
 '''
 def calculate_GDI   (
-    Name_TauTheta_dict:     tuple[dict[str, float], dict[str, float]], 
+    node_table:             BPP_node_table, 
     species_1:              Species_name, 
     species_2:              Species_name
                     ) ->    float:    
 
-    # try to find the tau value with one or the other order of species names
-    try:
-        tau_key_1 = f"{species_1}{species_2}"
-        tau = Name_TauTheta_dict[0][tau_key_1]
-    except:
-        tau_key_2 = f"{species_2}{species_1}"
-        tau = Name_TauTheta_dict[0][tau_key_2]
-
-    # try to find a theta value first for species1, but if that fails, then species 2
-    try:
-        theta_key_1 = f"{species_1}"
-        theta = Name_TauTheta_dict[1][theta_key_1]
-    except:
-        theta_key_2 = f"{species_2}"
-        theta = Name_TauTheta_dict[1][theta_key_2]
+    # the tau value of the ancestor of the pair, and the theta value of species 1 (or species 2 if it is not available)
+    tau = node_table.pair_Tau(species_1, species_2)
+    theta = node_table.pair_Theta(species_1, species_2)
     
     # calculation of the gdi value
     gdi = float(np.round(1-(np.exp(-2*tau/theta)), decimals = 4))
@@ -69,73 +67,193 @@ def calculate_GDI   (
 
 # calculate GDI values for all elements in a list of possible mergeable/splittable pairs
 def GDI_Of_Pairs(
-        Name_TauTheta_dict: tuple[dict[str, float], dict[str, float]], 
+        node_table:         BPP_node_table, 
         pairlist:           list[list]
                 ) ->        list[list[float]]:
 
     output_gdis = []
     for pair in pairlist:
-        output_gdis.append([calculate_GDI(Name_TauTheta_dict, pair[0], pair[1]), 
-                            calculate_GDI(Name_TauTheta_dict, pair[1], pair[0])])
+        output_gdis.append([calculate_GDI(node_table, pair[0], pair[1]), 
+                            calculate_GDI(node_table, pair[1], pair[0])])
     
     return output_gdis
 
 # get the most probable tau value for a given species pair
 def calculate_tau   (
-    Name_TauTheta_dict:     tuple[dict[str, float], dict[str, float]], 
+    node_table:             BPP_node_table, 
     species_1:              Species_name, 
     species_2:              Species_name
                     ) ->    float:
     
-    # try to find the tau value with one or the other order of species names
-    try:
-        tau_key_1 = f"{species_1}{species_2}"
-        tau = Name_TauTheta_dict[0][tau_key_1]
-    except:
-        tau_key_2 = f"{species_2}{species_1}"
-        tau = Name_TauTheta_dict[0][tau_key_2]
+    tau = node_table.pair_Tau(species_1, species_2)
     
     return float(np.round(tau, decimals = 6)) 
 
 # calculate the # of generations since the s1 and s2 split from their common ancestor using TAU & subsitutions/site/generation
 def age_Of_Pairs(
-        Name_TauTheta_dict: tuple[dict[str, float], dict[str, float]], 
+        node_table:         BPP_node_table, 
         pairlist:           list[list[Species_name]], 
         mutation_rate:      float
                 ) ->        int:
 
     output_ages = []
     for pair in pairlist:
-        tau = calculate_tau(Name_TauTheta_dict, pair[0], pair[1])
+        tau = calculate_tau(node_table, pair[0], pair[1])
         age = tau/mutation_rate
         age = int(np.rint(age)) # this produces an age in whole generations
         output_ages.append(age)
 
     return output_ages
 
+# get the GDI value that a decision is made on, either the point estimate, or a summary of its posterior distribution
+'''
+If the posterior distribution of the GDI values was calculated from the MCMC samples, the "GDI_estimate" parameter
+selects the summary used. With "hpd", the bound of the HPD interval nearest to rejecting the proposal is used,
+so a proposal is only accepted if the whole interval is within the threshold.
+'''
+def decision_GDI    (
+        pair_param:         dict,
+        gdi:                str,
+        hm_param:           HM_decision_parameters
+                    ) ->    float:
+
+    if f"{gdi}_posterior" not in pair_param:
+        return pair_param[gdi]
+
+    posterior = pair_param[f"{gdi}_posterior"]
+    if hm_param["GDI_estimate"] == "hpd":
+        if hm_param["mode"] == "merge":
+            return posterior["hpd"][1]
+        elif hm_param["mode"] == "split":
+            return posterior["hpd"][0]
+
+    return posterior[hm_param["GDI_estimate"]]
+
+
+## COLUMNAR EVALUATION OF THE DECISION CRITERIA
+
+# collect the decision parameters of all proposals into columns, with one element per proposal
+'''
+The GDI values are the values the decision is made on (see "decision_GDI"), and parameters that were not
+calculated are NaN, and the GDI values of a pair are only used if both of its GDIs are available.
+Returns the proposals as lists of species names, and the gdi_1, gdi_2 and age columns.
+'''
+def MSC_param_Columns   (
+        MSC_param:          MSC_parameters, 
+        hm_param:           HM_decision_parameters
+                        ) ->    tuple[list[list[Species_name]], np.ndarray, np.ndarray, np.ndarray]:
+
+    pairs = [ast.literal_eval(pair) for pair in MSC_param]
+    columns = {param:np.full(len(pairs), np.nan) for param in ["gdi_1", "gdi_2", "age"]}
+    for i, pair in enumerate(MSC_param):
+        if MSC_param[pair]["gdi_1"] != "?" and MSC_param[pair]["gdi_2"] != "?":
+            columns["gdi_1"][i] = decision_GDI(MSC_param[pair], "gdi_1", hm_param)
+            columns["gdi_2"][i] = decision_GDI(MSC_param[pair], "gdi_2", hm_param)
+        if MSC_param[pair]["age"] != "?":
+            columns["age"][i] = MSC_param[pair]["age"]
+
+    return pairs, columns["gdi_1"], columns["gdi_2"], columns["age"]
+
+# decide which parameters of each proposal are within their thresholds, for whole vectors of thresholds at once
+'''
+The thresholds are either single values, or vectors with one element per set of decision parameters. Returns a
+boolean mask for each of gdi_1, gdi_2 and age, with one row per set of thresholds and one column per proposal,
+along with the masks of the parameters that were calculated. Missing (NaN) parameters never match a threshold.
+'''
+def criteria_Masks  (
+        gdi_1:              np.ndarray,
+        gdi_2:              np.ndarray,
+        age:                np.ndarray,
+        mode:               str,
+        GDI_thresh:         float | np.ndarray,
+        generations:        float | np.ndarray
+                    ) ->    tuple[dict[str, np.ndarray], dict[str, np.ndarray]]:
+
+    thresholds = {"gdi_1": np.atleast_1d(np.asarray(GDI_thresh, dtype = np.float64))[:, None],
+                  "gdi_2": np.atleast_1d(np.asarray(GDI_thresh, dtype = np.float64))[:, None],
+                  "age":   np.atleast_1d(np.asarray(generations, dtype = np.float64))[:, None]}
+    values = {"gdi_1": gdi_1, "gdi_2": gdi_2, "age": age}
+    n_rows = max(len(threshold) for threshold in thresholds.values())
+    
+    matched = {}
+    known = {}
+    for param in values:
+        known[param] = np.broadcast_to(~np.isnan(values[param]), (n_rows, len(values[param])))
+        if mode == "merge":
+            matched[param] = known[param] & (values[param] <= thresholds[param])
+        elif mode == "split":
+            matched[param] = known[param] & (values[param] >= thresholds[param])
+
+    return matched, known
+
+# decide which proposals are accepted by the decision criteria, for whole vectors of decision criteria at once
+'''
+Every decision criteria is evaluated as a boolean expression over the masks of "criteria_Masks". The decision
+criteria is either a single name, or a list with one name per row of the masks. Returns a boolean mask with
+one row per set of decision parameters, and one column per proposal.
+'''
+def decision_Masks  (
+        matched:            dict[str, np.ndarray],
+        known:              dict[str, np.ndarray],
+        HM_decision:        str | list[str]
+                    ) ->    np.ndarray:
+
+    n_matched = matched["gdi_1"].astype(int) + matched["gdi_2"] + matched["age"]
+    n_known = known["gdi_1"].astype(int) + known["gdi_2"] + known["age"]
+    rule_masks = {"none":           np.ones_like(matched["age"]),
+                  "any":            n_matched > 0,
+                  "any_two":        n_matched > 1,
+                  "one_gdi":        matched["gdi_1"] | matched["gdi_2"],
+                  "both_gdis":      matched["gdi_1"] & matched["gdi_2"],
+                  "age":            matched["age"],
+                  "one_gdi_&_age":  (matched["gdi_1"] | matched["gdi_2"]) & matched["age"],
+                  "all":            n_matched == n_known}
+
+    if isinstance(HM_decision, str):
+        return rule_masks[HM_decision]
+
+    # select the row of each set of decision parameters from the masks of its own criteria
+    rule_index = np.array([HM_decision_criteria.index(rule) for rule in HM_decision])
+    stacked_masks = np.stack([np.broadcast_to(rule_masks[rule], matched["age"].shape) for rule in HM_decision_criteria])
+
+    return stacked_masks[rule_index, np.arange(len(HM_decision))]
+
 
 ## FUNCTIONS IMPLEMENTING THE STEPS OF THE DECISION PROCESS
 
 # extract the parameters inferrable form the MultispeciesCoalescent model (GDI, split age in generations) relevant to the merge decision.
+'''
+If a GDI estimate is requested and the mcmcfile is given, the GDI values are the posterior means of the per-sample
+GDI values, and the summaries of their posterior distributions are stored as "gdi_1_posterior" and "gdi_2_posterior".
+'''
 def get_MSC_param   (
-        BPP_outfile:        BPP_out_file, 
+        BPP_outfile:        BPP_out_file | list[BPP_out_file], 
         proposed_changes:   list[list[Species_name]], 
         hm_param:           HM_decision_parameters,
+        BPP_mcmcfile:       BPP_mcmc_file | list[BPP_mcmc_file] = None
                     ) ->    MSC_parameters:
 
-    name_tautheta_dict = extract_Name_TauTheta_dict(BPP_outfile)
+    node_table = node_Table(BPP_outfile)
     # create empty dict to hold results
     param_dict = {str(pair):{"gdi_1": "?", "gdi_2": "?", "age": "?"} for pair in proposed_changes}
     
     # collect gdi values except if the only parameter required is "age"
     if hm_param["HM_decision"] != "age":
-        gdi_values = GDI_Of_Pairs(name_tautheta_dict, proposed_changes)
+        gdi_values = GDI_Of_Pairs(node_table, proposed_changes)
         for i, pair in enumerate(proposed_changes):    
             param_dict[str(pair)]["gdi_1"] = gdi_values[i][0]
             param_dict[str(pair)]["gdi_2"] = gdi_values[i][1]
+        # replace the point estimates with the posterior distributions calculated from the MCMC samples
+        if hm_param["GDI_estimate"] != "?" and BPP_mcmcfile != None:
+            posterior_gdis = posterior_GDI_Of_Pairs(BPP_mcmcfile, proposed_changes, node_table)
+            if posterior_gdis != None:
+                for i, pair in enumerate(proposed_changes):
+                    for j, gdi in enumerate(["gdi_1", "gdi_2"]):
+                        param_dict[str(pair)][gdi] = posterior_gdis[i][j]["mean"]
+                        param_dict[str(pair)][f"{gdi}_posterior"] = posterior_gdis[i][j]
     # collect age values if the mutation rate parameter is available
     if hm_param["mutationrate"] != "?": 
-        age_values = age_Of_Pairs(name_tautheta_dict, proposed_changes, hm_param["mutationrate"])
+        age_values = age_Of_Pairs(node_table, proposed_changes, hm_param["mutationrate"])
         for i, pair in enumerate(proposed_changes):    
             param_dict[str(pair)]["age"] = age_values[i]
     
@@ -147,52 +265,14 @@ def criteria_matcher(
         hm_param:           HM_decision_parameters
                     ) ->    HM_criteria_matched:
 
-    # create empty result dict
-    match_dict = {str(pair):{"gdi_1": "?", "gdi_2": "?", "age": "?"} for pair in MSC_param}
+    # evaluate the thresholds on the columns of all pairs at once
+    gdi_1, gdi_2, age = MSC_param_Columns(MSC_param, hm_param)[1:]
+    matched, known = criteria_Masks(gdi_1, gdi_2, age, hm_param["mode"], hm_param["GDI_thresh"], hm_param["generations"])
 
-    age_thresh = hm_param["generations"]
-    GDI_thresh = hm_param["GDI_thresh"]
-
-    # iterate through all the possible pairs and decide which criteria they match
-    for pair in MSC_param.keys():
-        # seperate the variables out for shorter conditional checks
-        gdi_1 = MSC_param[pair]["gdi_1"]
-        gdi_2 = MSC_param[pair]["gdi_2"]
-        age   = MSC_param[pair]["age"]
-    
-        # if gdi values are available, decide if the gdi value is above or below the threshold 
-        if gdi_1 != "?" and gdi_2 != "?":
-            if hm_param["mode"] == "merge":
-                if gdi_1 <= GDI_thresh:
-                    match_dict[str(pair)]["gdi_1"] = True
-                else:
-                    match_dict[str(pair)]["gdi_1"] = False
-                if gdi_2 <= GDI_thresh:
-                    match_dict[str(pair)]["gdi_2"] = True
-                else:
-                    match_dict[str(pair)]["gdi_2"] = False
-            elif hm_param["mode"] == "split":
-                if gdi_1 >= GDI_thresh:
-                    match_dict[str(pair)]["gdi_1"] = True
-                else:
-                    match_dict[str(pair)]["gdi_1"] = False
-                if gdi_2 >= GDI_thresh:
-                    match_dict[str(pair)]["gdi_2"] = True
-                else:
-                    match_dict[str(pair)]["gdi_2"] = False
-        
-        # if an age value is available, decide if the age of the splits is above or below the threshold
-        if age != "?":
-            if hm_param["mode"] == "merge":
-                if age <= age_thresh:
-                    match_dict[str(pair)]["age"] = True
-                else:
-                    match_dict[str(pair)]["age"] = False
-            elif hm_param["mode"] == "split":
-                if age >= age_thresh:
-                    match_dict[str(pair)]["age"] = True
-                else:
-                    match_dict[str(pair)]["age"] = False
+    # parameters that were not calculated are marked with "?"
+    match_dict = {}
+    for i, pair in enumerate(MSC_param):
+        match_dict[pair] = {param:(bool(matched[param][0, i]) if known[param][0, i] else "?") for param in ["gdi_1", "gdi_2", "age"]}
 
     return match_dict
 
@@ -202,49 +282,13 @@ def make_decision   (
         hm_param:           HM_decision_parameters
                     ) ->    list[list[Species_name]]:
 
-    # set up empty container to store results
-    accepted = []
-    # evaulate incoming statements depending on the decision criteria
-    for pair in input_match_dict:
-        pair_as_list = ast.literal_eval(pair)
-
-        # seperate the variables out for shorter conditional checks
-        gdi_1 = input_match_dict[pair]["gdi_1"]
-        gdi_2 = input_match_dict[pair]["gdi_2"]
-        age   = input_match_dict[pair]["age"]
-        results = [gdi_1, gdi_2, age]
-
-        # all proposals are accepted regardless of results, this is useful for exploring the GDI values 
-        if hm_param["HM_decision"]   == "none":         
-            accepted.append(pair_as_list)
-        # a minimum of one of the parameters within the threshold to accept a proposal
-        elif hm_param["HM_decision"] == "any":          
-            if results.count(True) > 0:
-                accepted.append(pair_as_list)
-        # two of the parameters must be within their threshold to accept a proposal
-        elif hm_param["HM_decision"] == "any_two":        
-            if results.count(True) > 1:
-                accepted.append(pair_as_list)
-        # only one gdi is enough to accept a proposal
-        elif hm_param["HM_decision"] == "one_gdi":      
-            if gdi_1 == True or gdi_2 == True:
-                accepted.append(pair_as_list)
-        # both gdis need to be within their threshold to accept a proposal
-        elif hm_param["HM_decision"] == "both_gdis":    
-            if gdi_1 == True and gdi_2 == True:
-                accepted.append(pair_as_list)
-        # only age is enough to accept a proposal
-        elif hm_param["HM_decision"] == "age":                 
-            if age == True:
-                accepted.append(pair_as_list)
-        # age and one gdi needs to be within the threshold to accept a proposal
-        elif hm_param["HM_decision"] == "one_gdi_&_age":
-            if (gdi_1 == True or gdi_2 == True) and age == True:
-                accepted.append(pair_as_list)
-        # all calculated parameters must be within their threshold to accept a proposal
-        elif hm_param["HM_decision"] == "all": 
-            if results.count(True) == (len(results) - results.count("?")):
-                accepted.append(pair_as_list)           
+    pairs = [ast.literal_eval(pair) for pair in input_match_dict]
+    matched = {param:np.array([[input_match_dict[pair][param] == True for pair in input_match_dict]], dtype = bool) for param in ["gdi_1", "gdi_2", "age"]}
+    known = {param:np.array([[input_match_dict[pair][param] != "?" for pair in input_match_dict]], dtype = bool) for param in ["gdi_1", "gdi_2", "age"]}
+
+    # evaulate the decision criteria on the matched parameters of all pairs at once
+    accepted_mask = decision_Masks(matched, known, hm_param["HM_decision"])[0]
+    accepted = [pair for pair, is_accepted in zip(pairs, accepted_mask) if is_accepted]
 
     return accepted
 
@@ -267,6 +311,10 @@ def decisionUserFeedback(
     print(f"\n1) The {mode} decision thresholds are:")
     if hm_param['HM_decision'] != "age":
         print(f"\n  GDI values must be: {gdi_verb} {hm_param['GDI_thresh']} to be considered sufficient")
+        posterior = MSC_param[str(proposed_changes[0])].get("gdi_1_posterior")
+        if posterior != None:
+            estimate = {"mean": "posterior mean", "median": "posterior median", "hpd": f"{hpd_mass:.0%} HPD interval bound"}[hm_param["GDI_estimate"]]
+            print(f"\n  GDI values are the {estimate} of the GDI values of {posterior['n']} MCMC samples")
     if hm_param['mutationrate'] != "?":
         print(f"\n  The populations should share a common ancestor: {gdi_verb} {hm_param['generations']} generations ago")
 
@@ -291,14 +339,20 @@ def decisionUserFeedback(
         gdi_2_acc_list = []
 
         for proposal in proposed_changes:
-            gdi_1_list.append(str(MSC_param[str(proposal)]["gdi_1"]))
+            gdi_1_list.append(str(decision_GDI(MSC_param[str(proposal)], "gdi_1", hm_param)))
             gdi_1_acc_list.append(str(matched_dict[str(proposal)]["gdi_1"]))
-            gdi_2_list.append(str(MSC_param[str(proposal)]["gdi_2"]))
+            gdi_2_list.append(str(decision_GDI(MSC_param[str(proposal)], "gdi_2", hm_param)))
             gdi_2_acc_list.append(str(matched_dict[str(proposal)]["gdi_2"]))
 
         results_table.extend([gdi_1_list, gdi_1_acc_list , gdi_2_list, gdi_2_acc_list])
         results_colnames.extend(["GDI 1", "SUFFICIENT", "GDI 2", "SUFFICIENT"])
 
+        # if the GDIs are calculated from the MCMC samples, also collect the HPD intervals of their posterior distributions
+        if "gdi_1_posterior" in MSC_param[str(proposed_changes[0])]:
+            for gdi, colname in [["gdi_1", "GDI 1 HPD"], ["gdi_2", "GDI 2 HPD"]]:
+                results_table.append([f"{MSC_param[str(proposal)][f'{gdi}_posterior']['hpd'][0]}-{MSC_param[str(proposal)][f'{gdi}_posterior']['hpd'][1]}" for proposal in proposed_changes])
+                results_colnames.append(colname)
+
         # if age is calculated, collect age values and age acceptances
     if hm_param['mutationrate'] != "?":
         age_list = []
@@ -342,6 +396,51 @@ def decisionUserFeedback(
 
     
 
+# prints feedback to the user about the agreement between independent replicate chains
+'''
+The decision is made using the pooled parameters of the chains, but each chain is also evaluated on
+its own. The GDI values of each chain are listed, along with the largest difference between chains,
+and whether all chains would have made the same decision about the proposal.
+'''
+def replicateAgreementFeedback  (
+        BPP_outfiles:           list[BPP_out_file],
+        proposed_changes:       list[list[Species_name]],
+        hm_param:               HM_decision_parameters,
+        BPP_mcmcfiles:          list[BPP_mcmc_file] = None
+                                ) ->    bool:
+
+    mode = hm_param['mode'].upper()
+    
+    # evaluate the decision criteria on each chain separately
+    if BPP_mcmcfiles == None:
+        BPP_mcmcfiles = [None for outfile in BPP_outfiles]
+    chain_param = [get_MSC_param(outfile, proposed_changes, hm_param, mcmcfile) for outfile, mcmcfile in zip(BPP_outfiles, BPP_mcmcfiles)]
+    chain_decision = [make_decision(criteria_matcher(MSC_param, hm_param), hm_param) for MSC_param in chain_param]
+
+    print(f"\n0) The parameters were pooled from {len(BPP_outfiles)} independent replicate chains:\n")
+    
+    results_table = [[str(proposal) for proposal in proposed_changes]]
+    results_colnames = [f"POPULATIONS TO {mode}"]
+    for param, colname in [["gdi_1", "GDI 1 OF CHAINS"], ["gdi_2", "GDI 2 OF CHAINS"], ["age", "AGE OF CHAINS"]]:
+        if chain_param[0][str(proposed_changes[0])][param] == "?":
+            continue
+        results_table.append([" ".join([str(MSC_param[str(proposal)][param]) for MSC_param in chain_param]) for proposal in proposed_changes])
+        results_colnames.append(colname)
+        results_table.append([str(np.round(max([MSC_param[str(proposal)][param] for MSC_param in chain_param]) - min([MSC_param[str(proposal)][param] for MSC_param in chain_param]), decimals = 4)) for proposal in proposed_changes])
+        results_colnames.append("MAX DIFFERENCE")
+    
+    agreement_list = [all((proposal in decision) == (proposal in chain_decision[0]) for decision in chain_decision) for proposal in proposed_changes]
+    results_table.append([str(agrees) for agrees in agreement_list])
+    results_colnames.append("CHAINS AGREE")
+    
+    pretty_Table(results_table, results_colnames)
+    if all(agreement_list):
+        print("\nALL REPLICATE CHAINS AGREE ABOUT THE PROPOSALS")
+    else:
+        print("\n[!] WARNING: THE REPLICATE CHAINS DISAGREE ABOUT SOME PROPOSALS, CONSIDER RUNNING LONGER CHAINS")
+
+    return all(agreement_list)
+
 # implements the decisions made by previous modules by changing the list of accepted populations
 def implement_decision  (
         previous_pops:          Population_list, 
@@ -400,18 +499,26 @@ def stop_check  (
 ## FINAL WRAPPER FUNCTION IMPLEMENTING THE COMPLETE DECISION PROCESS
 
 # wrapper function that implements the complete decision procedure
+'''
+If a list of outfiles produced by independent replicate chains is given, the decision is made using 
+the pooled parameters of the chains, and the agreement between the chains is reported. The text of the 
+decision is written to "DECISION.txt" in "output_dir". If the mcmcfile (or the list of mcmcfiles) is
+given, the GDI values can be decided on from the posterior distribution of the MCMC samples.
+'''
 def decisionModule  (
         hm_param:           HM_decision_parameters,
-        BPP_outfile:        BPP_out_file, 
+        BPP_outfile:        BPP_out_file | list[BPP_out_file], 
         proposed_changes:   list[list[Species_name]], 
         accepted_pops:      Population_list, 
-        halt_pop_number:    int
+        halt_pop_number:    int,
+        output_dir:         str = "",
+        BPP_mcmcfile:       BPP_mcmc_file | list[BPP_mcmc_file] = None
                     ) ->    tuple[Population_list, bool]:
 
     print("MAKING DECISIONS BASED ON BPP MODEL RESULTS")
 
     # extract the parameter values relevant to the decision
-    MSC_param = get_MSC_param(BPP_outfile, proposed_changes, hm_param)
+    MSC_param = get_MSC_param(BPP_outfile, proposed_changes, hm_param, BPP_mcmcfile)
     
     # check if the parameter values are within the thresholds required to accept a decision
     match_dict = criteria_matcher(MSC_param, hm_param)
@@ -420,9 +527,13 @@ def decisionModule  (
     decision = make_decision(match_dict, hm_param)
 
     # capture the text output as a file
-    with open("DECISION.txt", "w") as o:
+    with open(os.path.join(output_dir, "DECISION.txt"), "w") as o:
         with contextlib.redirect_stdout(o):
 
+            # print feedback to the user about the agreement of the replicate chains
+            if isinstance(BPP_outfile, list):
+                replicateAgreementFeedback(BPP_outfile, proposed_changes, hm_param, BPP_mcmcfile)
+
             # print feedback to the user about the decision process
             decisionUserFeedback(proposed_changes, MSC_param, hm_param, match_dict, decision)
 
@@ -433,7 +544,7 @@ def decisionModule  (
             to_iterate = stop_check(hm_param, decision, new_accepted_pops, halt_pop_number)
 
     # also print the text output
-    with open('DECISION.txt', 'r') as f2:
+    with open(os.path.join(output_dir, "DECISION.txt"), "r") as f2:
         data = f2.read()
         print(data)
 
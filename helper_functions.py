@@ -7,7 +7,10 @@ MANY OF THE FUNCTIONS RELATE TO I-O OPERATIONS.
 # STANDARD LIBRARY DEPENDENCIES
 from cgitb import text
 import subprocess
+import asyncio
+import time
 import re
+import json
 import os
 import copy
 import io
@@ -50,7 +53,6 @@ from custom_types import Master_control_file
 from custom_types import Phylip_MSA_file
 from custom_types import Population_list
 from custom_types import HM_decision_parameters
-from custom_types import BPP_out_file
 
 ## CORE HELPER FUNCTIONS
 
@@ -172,9 +174,15 @@ def path_filename   (
 # create a directory if it does not exist, and halt execution of the directory exists
 def create_TargetDir(
         target_dir_name:    file_path,
-        user_message:       str = None
+        user_message:       str = None,
+        exist_ok:           bool = False
                     ):
     
+    # when resuming an interrupted run, the folders of unfinished stages are reused
+    if exist_ok == True and os.path.isdir(target_dir_name):
+        print(f"Existing directory '{target_dir_name}' is reused.")
+        return
+
     try:
         os.mkdir(target_dir_name)
         if user_message == None:
@@ -301,6 +309,7 @@ def get_HM_parameters   (
     # convert parameters to numbers to make comparisons viable
     hm_par["GDI_thresh"] = float(hm_par["GDI_thresh"])
     hm_par["generations"] = int(hm_par["generations"])
+    hm_par["adaptive_tolerance"] = float(hm_par["adaptive_tolerance"])
     if hm_par["mutationrate"] != "?":
         hm_par["mutationrate"] = float(hm_par["mutationrate"])
 
@@ -471,81 +480,495 @@ def dict_to_bppcfile(
         f.write(text)
 
 
+## ASYNCHRONOUS BPP EXECUTION
+
+# convert a BPP clock value ("m:ss" or "h:mm:ss") to seconds, returning None if it is not a clock value
+def clock_Seconds   (
+        clock:              str
+                    ) ->    float:
+
+    try:
+        seconds = 0.0
+        for part in clock.split(":"):
+            seconds = seconds*60 + float(part)
+    except ValueError:
+        return None
+    
+    return seconds
+
+# progress of a BPP job, parsed from the lines of its stdout as they are produced
+'''
+BPP prints a progress line at regular intervals of the MCMC. The line starts with the percentage of the
+run that is done (negative during the burnin), followed by the acceptance proportions of the moves
+(printed with two decimals), the posterior means of some of the parameters, the log-likelihood, and
+the elapsed time. Each parsed progress line updates the fields below, and is passed as an event dict
+to each function subscribed with "subscribe". 
+
+The rate of the MCMC is measured from the progress lines of the sampling phase. If "n_samples" (the
+"nsample" parameter of the job) is known, it is also given as the number of samples per second.
+'''
+class BPP_progress:
+
+    def __init__(
+            self,
+            n_samples:  int = None
+                ):
+
+        self.percent            = None
+        self.elapsed            = None
+        self.n_lines            = 0
+        self.last_line          = ""
+        self.checkpoint_written = False
+        
+        self.n_samples          = n_samples
+        self.phase              = None
+        self.elapsed_seconds    = None
+        self.eta_seconds        = None
+        self.acceptance         = []
+        self.lnL                = None
+        self.percent_per_second = None
+        self.samples_per_second = None
+        self.last_update        = None
+        self.finished           = False
+        self.listeners          = []
+        self.sampling_start     = None
+
+    # call a function with the event dict of each progress line
+    def subscribe   (
+            self,
+            listener
+                    ):
+        
+        self.listeners.append(listener)
+
+    # update the progress according to a single line of BPP output
+    def update  (
+            self,
+            line:       str
+                ):
+
+        self.n_lines += 1
+        self.last_line = line.rstrip()
+        fields = line.split()
+        
+        if "Writing checkpoint file" in line:
+            self.checkpoint_written = True
+
+        # progress lines start with the percentage of the MCMC that is done
+        if len(fields) == 0 or not fields[0].endswith("%"):
+            return
+        try:
+            self.percent = float(fields[0][:-1])
+        except ValueError:
+            return
+        self.phase = "burnin" if self.percent < 0 else "sampling"
+        self.last_update = time.time()
+        
+        # the elapsed time is the last clock value of the line, and the log-likelihood is printed just before it
+        clock_fields = [i for i, field in enumerate(fields) if ":" in field and clock_Seconds(field) != None]
+        if len(clock_fields) > 0:
+            self.elapsed = fields[clock_fields[-1]]
+            self.elapsed_seconds = clock_Seconds(self.elapsed)
+            try:
+                self.lnL = float(fields[clock_fields[-1]-1])
+            except ValueError:
+                self.lnL = None
+        
+        # the acceptance proportions follow the percentage
+        self.acceptance = []
+        for field in fields[1:]:
+            if re.fullmatch("[01]\\.[0-9]{2}", field) == None:
+                break
+            self.acceptance.append(float(field))
+        
+        # measure the rate of the MCMC from the start of the sampling phase
+        if self.phase == "sampling" and self.elapsed_seconds != None:
+            if self.sampling_start == None:
+                self.sampling_start = (self.percent, self.elapsed_seconds)
+            elif self.elapsed_seconds > self.sampling_start[1]:
+                self.percent_per_second = (self.percent - self.sampling_start[0])/(self.elapsed_seconds - self.sampling_start[1])
+                if self.percent_per_second > 0:
+                    self.eta_seconds = (100 - self.percent)/self.percent_per_second
+                if self.n_samples != None:
+                    self.samples_per_second = self.percent_per_second*self.n_samples/100
+        
+        event = self.as_Dict()
+        for listener in self.listeners:
+            listener(event)
+
+    # mark the job as finished, and notify the listeners
+    def finish(self):
+
+        self.finished = True
+        self.eta_seconds = 0.0 if self.percent != None and self.percent >= 100 else self.eta_seconds
+        event = self.as_Dict()
+        for listener in self.listeners:
+            listener(event)
+
+    # the current state of the progress as a dict of plain values
+    def as_Dict(self) -> dict:
+
+        return {"percent":            self.percent,
+                "phase":              self.phase,
+                "elapsed_seconds":    self.elapsed_seconds,
+                "eta_seconds":        self.eta_seconds,
+                "acceptance":         self.acceptance,
+                "lnL":                self.lnL,
+                "samples_per_second": self.samples_per_second,
+                "percent_per_second": self.percent_per_second,
+                "last_update":        self.last_update,
+                "finished":           self.finished}
+
+# a JSON file holding the live progress metrics of the BPP jobs of a stage
+'''
+The file is rewritten at most once every "interval" seconds while the jobs are running, and once more
+when a job finishes. It holds the time it was written, and the progress of each job under its name,
+so stalled chains can be recognized by an old "last_update" time.
+'''
+class BPP_metrics_file:
+
+    def __init__(
+            self,
+            path:       str,
+            interval:   float = 5.0
+                ):
+
+        self.path       = path
+        self.interval   = interval
+        self.jobs       = {}
+        self.last_flush = None
+
+    # add the progress of a job to the file
+    def track   (
+            self,
+            name:       str,
+            progress:   BPP_progress
+                ):
+
+        self.jobs[name] = progress
+        progress.subscribe(lambda event: self.flush(force = event["finished"]))
+
+    # write the metrics of all jobs to the file, unless the file was written less than "interval" seconds ago
+    def flush   (
+            self,
+            force:      bool = False
+                ):
+
+        if force == False and self.last_flush != None and time.monotonic() - self.last_flush < self.interval:
+            return
+        self.last_flush = time.monotonic()
+
+        metrics = {"updated": time.time(), "jobs": {name:self.jobs[name].as_Dict() for name in self.jobs}}
+        try:
+            with open(f"{self.path}.tmp", "w") as f:
+                json.dump(metrics, f, indent = 1)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError:
+            pass
+
+# the metrics files of the stages, stored under the directory of the stage
+BPP_metrics_files = {}
+
+# get the metrics file of the stage running in a directory
+def stage_Metrics_file  (
+        cwd:                str = None
+                        ) ->    BPP_metrics_file:
+
+    job_dir = os.path.abspath(cwd if cwd != None else "")
+    if job_dir not in BPP_metrics_files:
+        BPP_metrics_files[job_dir] = BPP_metrics_file(os.path.join(job_dir, "BPP_metrics.json"))
+    
+    return BPP_metrics_files[job_dir]
+
+# the outcome of a finished BPP job
+'''
+"exit_code" is the return code of the process, which is negative if the process was killed.
+"output_paths" holds the paths of the "outfile" and "mcmcfile" of the job, if it was started from a control file.
+'''
+class BPP_result:
+
+    def __init__(
+            self,
+            args:                   list[str],
+            cwd:                    str,
+            exit_code:              int,
+            wall_time:              float,
+            output_paths:           dict[str, str],
+            timed_out:              bool,
+            stopped_at_checkpoint:  bool,
+            progress:               BPP_progress
+                ):
+        
+        self.args                   = args
+        self.cwd                    = cwd
+        self.exit_code              = exit_code
+        self.wall_time              = wall_time
+        self.output_paths           = output_paths
+        self.timed_out              = timed_out
+        self.stopped_at_checkpoint  = stopped_at_checkpoint
+        self.progress               = progress
+
+# find the output files named in the control file of a BPP command line, relative to the current directory
+def BPP_output_paths(
+        args:                   list[str],
+        cwd:                    str = None
+                    ) ->        dict[str, str]:
+
+    output_paths = {}
+    for flag in ["--cfile", "--summary"]:
+        if flag in args and args.index(flag)+1 < len(args):
+            job_dir = cwd if cwd != None else ""
+            try:
+                cdict = bppcfile_to_dict(os.path.join(job_dir, args[args.index(flag)+1]))
+            except Exception:
+                break
+            for param in ["outfile", "mcmcfile"]:
+                if param in cdict:
+                    output_paths[param] = os.path.join(job_dir, cdict[param])
+    
+    return output_paths
+
+# kill a BPP process and all its children, if it is still running
+def stop_BPP_process(process):
+    
+    if process.returncode == None:
+        try:
+            kill(process.pid)
+        except psutil.NoSuchProcess:
+            pass
+
+# run BPP with a list of command line arguments, streaming its output into a progress object
+'''
+The process is executed in the directory "cwd" (the current directory if None), without a shell. 
+Each line of the output is passed to "progress" as it arrives, and is also printed if "echo" is True.
+If "stop_at_checkpoint" is True, the process is killed once it reports writing a checkpoint file.
+If the job runs for longer than "timeout" seconds, it is killed, and the result is marked as timed out.
+If the task running the job is cancelled, the process is killed before the cancellation propagates.
+A FileNotFoundError is raised if the "bpp" executable can not be found.
+If "metrics" is True, the progress of the job is tracked in the metrics file of the directory "cwd".
+'''
+async def BPP_run_async (
+        args:                   list[str],
+        cwd:                    str = None,
+        timeout:                float = None,
+        progress:               BPP_progress = None,
+        stop_at_checkpoint:     bool = False,
+        echo:                   bool = False,
+        metrics:                bool = True
+                        ) ->    BPP_result:
+
+    if progress == None:
+        progress = BPP_progress()
+    if progress.n_samples == None and "--cfile" in args:
+        try:
+            progress.n_samples = int(bppcfile_to_dict(os.path.join(cwd if cwd != None else "", args[args.index("--cfile")+1]))["nsample"])
+        except Exception:
+            pass
+    if metrics == True:
+        stage_Metrics_file(cwd).track(" ".join(args), progress)
+    
+    start_time = time.monotonic()
+    process = await asyncio.create_subprocess_exec("bpp", *args, cwd = cwd, 
+                                                   stdout = asyncio.subprocess.PIPE, 
+                                                   stderr = asyncio.subprocess.STDOUT)
+    
+    stopped_at_checkpoint = False
+    async def read_output():
+        nonlocal stopped_at_checkpoint
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            text_line = line.decode("utf-8", errors = "replace")
+            progress.update(text_line)
+            if echo == True:
+                print(text_line, end = "")
+            if stop_at_checkpoint == True and progress.checkpoint_written == True:
+                stopped_at_checkpoint = True
+                stop_BPP_process(process)
+                break
+        await process.wait()
+
+    timed_out = False
+    try:
+        await asyncio.wait_for(read_output(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        stop_BPP_process(process)
+        await process.wait()
+    except asyncio.CancelledError:
+        stop_BPP_process(process)
+        raise
+    progress.finish()
+
+    return BPP_result(args                  = args,
+                      cwd                   = cwd,
+                      exit_code             = process.returncode,
+                      wall_time             = time.monotonic() - start_time,
+                      output_paths          = BPP_output_paths(args, cwd),
+                      timed_out             = timed_out,
+                      stopped_at_checkpoint = stopped_at_checkpoint,
+                      progress              = progress)
+
+# run several BPP jobs concurrently from one event loop, and display their average progress
+'''
+Each job is a dict of keyword arguments to "BPP_run_async" (at least "args"). The results are 
+returned in the same order as the jobs. If "show_progress" is True, the average progress of
+the jobs is periodically printed on a single line of the terminal.
+
+If "n_slots" is given, at most "n_slots" jobs run at the same time. Job i runs in slot i % n_slots,
+and the jobs of a slot run one after the other, matching the core pinning planned by "plan_BPP_cores".
+Jobs that are None are skipped (their result is None), so skipping a job does not move the others to other slots.
+'''
+async def BPP_gather_async  (
+        jobs:                       list[dict],
+        show_progress:              bool = True,
+        n_slots:                    int = None
+                            ) ->    list[BPP_result]:
+
+    if n_slots == None or n_slots > len(jobs):
+        n_slots = len(jobs)
+
+    progress_list = [BPP_progress() for _ in jobs]
+    results = [None for _ in jobs]
+    
+    async def run_slot(slot):
+        for i in range(slot, len(jobs), n_slots):
+            if jobs[i] != None:
+                results[i] = await BPP_run_async(**jobs[i], progress = progress_list[i])
+    
+    tasks = [asyncio.create_task(run_slot(slot)) for slot in range(n_slots)]
+    
+    async def display_progress():
+        while True:
+            percents = [progress.percent for progress in progress_list if progress.percent != None]
+            elapsed = [progress.elapsed for progress in progress_list if progress.elapsed != None]
+            rates = [progress.samples_per_second for progress in progress_list if progress.samples_per_second != None and progress.finished == False]
+            if len(percents) > 0:
+                extime = f"time {max(elapsed)}  " if len(elapsed) > 0 else ""
+                exrate = f"{sum(rates):.0f} samples/s  " if len(rates) > 0 else ""
+                print("avg progress", f"{sum(percents)/len(percents):.0f}%", extime, exrate, "        ", end = '\r')
+            await asyncio.sleep(1)
+    
+    if show_progress == True:
+        display_task = asyncio.create_task(display_progress())
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if show_progress == True:
+            display_task.cancel()
+            print()
+
+    return results
+
+# run several BPP jobs concurrently, and wait for all of them to finish
+def BPP_run_concurrent  (
+        jobs:                       list[dict],
+        show_progress:              bool = True,
+        n_slots:                    int = None
+                        ) ->        list[BPP_result]:
+
+    return asyncio.run(BPP_gather_async(jobs, show_progress, n_slots))
+
+
 ## BPP EXECUTABLE I-O FUNCTIONS
 
+# find the newest checkpoint file written by a BPP run with a given outfile, returning None if there is none
+'''
+BPP names its checkpoint files as "<outfile>.<checkpoint number>.chk", in the directory of the run.
+'''
+def newest_Checkpoint   (
+        outfile:            str,
+        job_dir:            str = None
+                        ):
+
+    chk_pattern = re.compile(f"^{re.escape(outfile)}\\.([0-9]+)\\.chk$")
+    chk_numbers = [int(chk_pattern.match(file).group(1)) for file in os.listdir(job_dir if job_dir != None else ".") if chk_pattern.match(file)]
+    if len(chk_numbers) == 0:
+        return None
+
+    return f"{outfile}.{max(chk_numbers)}.chk"
+
+# get the command line arguments that start BPP with a given control file
+'''
+If an earlier run of the same control file was interrupted after writing checkpoint files,
+the run is resumed from the newest checkpoint instead of being started from the beginning.
+'''
+def BPP_start_args  (
+        control_file:   BPP_control_file,
+        cwd:            str = None
+                    ) ->    list[str]:
+
+    args = ["--cfile", control_file]
+    try:
+        chkpoint_file = newest_Checkpoint(bppcfile_to_dict(os.path.join(cwd if cwd != None else "", control_file))["outfile"], cwd)
+    except Exception:
+        chkpoint_file = None
+    if chkpoint_file != None:
+        print(f"\nRESUMING BPP FROM THE CHECKPOINT FILE '{chkpoint_file}' OF AN INTERRUPTED RUN")
+        args = ["--resume", chkpoint_file]
+
+    return args
+
 # run BPP with a given control file
+'''
+If a "listener" function is given, it is called with the event dict of each progress line of the run.
+'''
 def BPP_run (
-        control_file:   BPP_control_file
-            ):
+        control_file:   BPP_control_file,
+        cwd:            str = None,
+        timeout:        float = None,
+        listener = None
+            ) ->        BPP_result:
+
+    args = BPP_start_args(control_file, cwd)
+    progress = BPP_progress()
+    if listener != None:
+        progress.subscribe(listener)
 
     try:
         print(f"{clprnt.GREEN}\nSTARTING BPP...\n")
-        subprocess.run(["bpp", "--cfile", control_file])
+        result = asyncio.run(BPP_run_async(args, cwd = cwd, timeout = timeout, progress = progress, echo = True))
+        result.output_paths = BPP_output_paths(["--cfile", control_file], cwd)
         print(f"{clprnt.end}")
     
     except:
         print(f"{clprnt.end}\n[X] ERROR: UNEXPECTED EXIT FROM BPP")
         exit()
 
-# run BPP with a given control file, and capture the stdout results
+    return result
+
+# run BPP with a given control file, and capture the stdout results until the first checkpoint is written
 def BPP_run_capture (
         control_file:   BPP_control_file,
-        proc_id
-            ):
+        proc_id,
+        cwd:            str = None
+            ) ->        BPP_result:
 
-    process = subprocess.Popen(f"bpp --cfile {control_file}", shell = True, bufsize = 1,
-                           stdout=subprocess.PIPE, stderr = subprocess.STDOUT,encoding='utf-8', errors = 'replace' ) 
-
-    extime = ""
-    while True:
-        realtime_output = process.stdout.readline()
-        if realtime_output == '' and process.poll() is not None:
-            break
-        if realtime_output:
-            text_out = f"{realtime_output}"
-            if "%" in text_out:
-                percent = text_out.split()[0]
-                if ":" in text_out.split()[-1]:
-                    extime = f"time {text_out.split()[-1]}        "
-                print("avg progress", percent, extime, end = '\r')
-            if "Writing checkpoint file out" in text_out:
-                print(text_out)
-                kill(process.pid)
-                
-
-# resume a BPP run from a checkpoint, and capture the stdout results
+    results = BPP_run_concurrent([{"args":["--cfile", control_file], "cwd":cwd, "stop_at_checkpoint":True}])
+    
+    return results[0]
+
+# resume a BPP run from a checkpoint, and capture the stdout results until the next checkpoint is written
 def BPP_resume_capture (
         chkpoint_file,
-        proc_id
-            ):
+        proc_id,
+        cwd:            str = None
+            ) ->        BPP_result:
 
-    process = subprocess.Popen(f"bpp --resume {chkpoint_file}", shell = True, bufsize = 1,
-                           stdout=subprocess.PIPE, stderr = subprocess.STDOUT,encoding='utf-8', errors = 'replace' ) 
-
-    extime = ""
-    while True:
-        realtime_output = process.stdout.readline()
-        if realtime_output == '' and process.poll() is not None:
-            break
-        if realtime_output:
-            text_out = f"{realtime_output}"
-            if "%" in text_out:
-                percent = text_out.split()[0]
-                if ":" in text_out.split()[-1]:
-                    extime = f"time {text_out.split()[-1]}        "
-                print("avg progress", percent, extime, end = '\r')
-            # kill when checkpoint file is written
-            if "Writing checkpoint file out" in text_out:
-                print(text_out)
-                kill(process.pid)
-                
+    results = BPP_run_concurrent([{"args":["--resume", chkpoint_file], "cwd":cwd, "stop_at_checkpoint":True}])
+    
+    return results[0]
 
 # get the summary of a BPP run with a given control file
 def BPP_summary (
-        control_file:   BPP_control_file
+        control_file:   BPP_control_file,
+        cwd:            str = None
             ):
 
-    process = subprocess.run(["bpp", "--summary", control_file], stdout=subprocess.PIPE, encoding='utf-8')
+    process = subprocess.run(["bpp", "--summary", control_file], stdout=subprocess.PIPE, encoding='utf-8', cwd = cwd)
     out_text = process.stdout
 
     return out_text
@@ -553,14 +976,16 @@ def BPP_summary (
 
 # extract the most probable species tree from the "outfile" produced by BPP A01 or BPP A11
 def extract_Speciestree (
-        control_file:           BPP_control_file
+        control_file:           BPP_control_file,
+        cwd:                    str = None
                         ) ->    Tree_newick:
 
+    job_dir = cwd if cwd != None else ""
     try:
         # find the name of the output file
-        BPP_outfile_name = bppcfile_to_dict(control_file)['outfile']
+        BPP_outfile_name = bppcfile_to_dict(os.path.join(job_dir, control_file))['outfile']
         # read in the output file
-        input_file = readLines(BPP_outfile_name)
+        input_file = readLines(os.path.join(job_dir, BPP_outfile_name))
 
         # find the index of the row where the most probable trees are outputted, and add one to move to the trees
         rowindex_tree = [i for i, s in enumerate(input_file) if '(A)' in s][0]+1
@@ -585,14 +1010,16 @@ def extract_Speciestree (
 
 # extract the best supported species list produced by BPP A11
 def extract_Pops(
-        control_file:   BPP_control_file
+        control_file:   BPP_control_file,
+        cwd:            str = None
                 ) ->    Population_list:
 
+    job_dir = cwd if cwd != None else ""
     try:
         # find the name of the output file
-        BPP_outfile_name = bppcfile_to_dict(control_file)['outfile']
+        BPP_outfile_name = bppcfile_to_dict(os.path.join(job_dir, control_file))['outfile']
         # read in the output file
-        input_file = readLines(BPP_outfile_name)
+        input_file = readLines(os.path.join(job_dir, BPP_outfile_name))
 
         # find the index of the row where the most probable trees are outputted, and add one to move to the trees
         rowindex_tree = [i for i, s in enumerate(input_file) if '(A)' in s][0]+1
@@ -605,16 +1032,3 @@ def extract_Pops(
     except:
         print("[X] ERROR: POPULATIONS COULD NOT BE EXTRACTED FROM BPP RESULTS")
         exit() 
-
-# get a dict of node names:tau values and node names:theta values from the outfile
-def extract_Name_TauTheta_dict  (
-        BPP_outfile:                    BPP_out_file
-                                ) ->    tuple[dict[str, float], dict[str, float]]:
-
-    lines = readLines(BPP_outfile)
-    relevant_index = lines.index("List of nodes, taus and thetas:") # find the line where the node labels are listed
-    lines = lines[relevant_index+2:]
-    tau_dict = {line.split()[3]:float(line.split()[1]) for line in lines if float(line.split()[1]) != 0} #0 values excluded because they only occur when tau is not estimated
-    theta_dict = {line.split()[3]:float(line.split()[2]) for line in lines if float(line.split()[2]) != -1} #-1 values excluded because they only occur when theta is not estimated (one seq for the population)
-
-    return tau_dict, theta_dict
\ No newline at end of file
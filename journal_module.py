@@ -0,0 +1,184 @@
+'''
+THIS MODULE CONTAINS THE FUNCTIONS FOR RECORDING THE PROGRESS OF THE PIPELINE
+IN A JOURNAL FILE, AND FOR RESUMING AN INTERRUPTED RUN FROM THE JOURNAL.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+import json
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import read_MasterControl
+
+# ALIGNMENT STORE DEPENDENCIES
+from alignment_store_module import file_Hash
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import Master_control_file
+from custom_types import Population_list
+from custom_types import Tree_newick
+from custom_types import Imap_list
+
+
+## JOURNAL FILE I-O
+
+# the name of the journal file belonging to a master control file
+def journal_Name(
+        input_mcfile:       Master_control_file
+                ) ->        str:
+
+    return f'{input_mcfile[0:-4]}_journal.json'
+
+# read the journal of a master control file, returning None if no journal exists
+def read_Journal(
+        input_mcfile:       Master_control_file
+                ):
+
+    try:
+        with open(journal_Name(input_mcfile), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# write the journal of a master control file
+'''
+The journal is first written to a temporary file, which then replaces the previous journal, so
+an interruption during writing can never leave behind a partially written journal.
+'''
+def write_Journal   (
+        input_mcfile:       Master_control_file,
+        journal:            dict
+                    ):
+
+    temp_file = f"{journal_Name(input_mcfile)}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump(journal, f, indent = 1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, journal_Name(input_mcfile))
+
+# collect the hashes of the input files, which must be unchanged for a run to be resumed
+def get_Input_hashes(
+        input_mcfile:       Master_control_file
+                    ) ->    dict[str, str]:
+
+    mc_dict = read_MasterControl(input_mcfile)
+    input_files = {"mcfile": input_mcfile, "seqfile": mc_dict["seqfile"], "Imapfile": mc_dict["Imapfile"]}
+
+    return {name:file_Hash(input_files[name]).hex() for name in input_files}
+
+
+## RECORDING PROGRESS
+
+# start a new journal at the beginning of a run
+def new_Journal (
+        input_mcfile:       Master_control_file,
+        p_state:            str
+                ):
+
+    journal = {"inputs": get_Input_hashes(input_mcfile),
+               "p_state": p_state,
+               "stages": {},
+               "HM": {"steps": []}}
+
+    write_Journal(input_mcfile, journal)
+
+# record the results of a finished stage (A01 or A11)
+def record_Stage(
+        input_mcfile:       Master_control_file,
+        stage:              str,
+        results:            dict
+                ):
+
+    journal = read_Journal(input_mcfile)
+    if journal == None:
+        return
+    journal["stages"][stage] = results
+    write_Journal(input_mcfile, journal)
+
+# record the inputs of the Hierarchical Method
+def record_HM_start (
+        input_mcfile:       Master_control_file,
+        guide_tree:         Tree_newick,
+        imap:               Imap_list
+                    ):
+
+    journal = read_Journal(input_mcfile)
+    if journal == None:
+        return
+    journal["HM"]["guide_tree"] = guide_tree
+    journal["HM"]["imap"] = imap
+    write_Journal(input_mcfile, journal)
+
+# record the results of a finished iteration of the Hierarchical Method
+def record_HM_step  (
+        input_mcfile:       Master_control_file,
+        step:               int,
+        accepted_pops:      Population_list,
+        to_iterate:         bool,
+        output_paths:       dict[str, str]
+                    ):
+
+    journal = read_Journal(input_mcfile)
+    if journal == None:
+        return
+    journal["HM"]["steps"] = [entry for entry in journal["HM"]["steps"] if entry["step"] < step]
+    journal["HM"]["steps"].append({"step": step,
+                                   "accepted_pops": accepted_pops,
+                                   "to_iterate": to_iterate,
+                                   "output_paths": output_paths})
+    write_Journal(input_mcfile, journal)
+
+
+## RESUMING
+
+# get the recorded results of a stage if the run is being resumed, and the stage was already finished
+def completed_Stage (
+        input_mcfile:       Master_control_file,
+        stage:              str,
+        resume:             bool
+                    ):
+
+    if resume == False:
+        return None
+
+    return read_Journal(input_mcfile)["stages"].get(stage)
+
+# get the recorded iterations of the Hierarchical Method if the run is being resumed
+def completed_HM_steps  (
+        input_mcfile:       Master_control_file,
+        resume:             bool
+                        ) ->    list[dict]:
+
+    if resume == False:
+        return []
+
+    return read_Journal(input_mcfile)["HM"]["steps"]
+
+# check that a run can be resumed from its journal, and exit the pipeline if not
+def check_Journal_resumable (
+        input_mcfile:       Master_control_file,
+        p_state:            str
+                            ):
+
+    journal = read_Journal(input_mcfile)
+    if journal == None:
+        print(f"[X] ERROR: NO JOURNAL '{journal_Name(input_mcfile)}' FOUND, THE RUN CAN NOT BE RESUMED")
+        exit()
+
+    if journal["inputs"] != get_Input_hashes(input_mcfile):
+        print(f"[X] ERROR: THE INPUT FILES CHANGED SINCE THE JOURNAL WAS WRITTEN, THE RUN CAN NOT BE RESUMED")
+        print("The master control file, the seqfile and the Imapfile must be identical to the interrupted run")
+        exit()
+
+    if journal["p_state"] != p_state:
+        print(f"[X] ERROR: THE JOURNAL DESCRIBES A RUN WITH STAGES {journal['p_state']}, NOT {p_state}")
+        exit()
+
+    print(f"{clprnt.BLUE}RESUMING THE PIPELINE FROM THE JOURNAL '{journal_Name(input_mcfile)}'{clprnt.end}")
+    print(f"\tfinished stages: {', '.join(journal['stages']) if len(journal['stages']) > 0 else 'none'}")
+    print(f"\tfinished HM iterations: {len(journal['HM']['steps'])}\n")
@@ -0,0 +1,177 @@
+'''
+THIS MODULE CONTAINS THE PARSED TABLE OF NODES, TAUS AND THETAS WRITTEN TO THE OUTFILE OF AN A00 BPP RUN.
+EACH OUTFILE IS ONLY READ ONCE, AND THE TABLE IS SHARED BY THE DECISION PROCESS AND THE VISUALIZATIONS
+OF THE SAME ITERATION THROUGH A CACHE. THE CACHE IS KEYED BY THE MODIFICATION TIME OF THE OUTFILE,
+SO AN OUTFILE THAT WAS REWRITTEN (E.G. BY "bpp --summary") IS READ AGAIN.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+
+# EXTERNAL LIBRARY DEPENDENCIES
+import numpy as np
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import readLines
+
+## TYPE HINTS
+from custom_types import BPP_out_file
+from custom_types import Species_name
+
+
+## SETTINGS
+
+# the number of parsed outfiles (or sets of replicate outfiles) kept in the cache
+node_table_cache_size = 64
+
+# the parsed tables of recently read outfiles
+node_table_cache = {}
+
+
+## NODE TABLE DEFINITION
+
+# the tau and theta values of the nodes of a BPP outfile
+'''
+The values are held in numeric arrays indexed by node ID (the order of the nodes in the outfile). Taus that
+were not estimated (0) and thetas that were not estimated (-1, only one sequence in the population) are NaN.
+BPP labels each internal node by joining the labels of its two children in the proposed tree, so the parent
+of every sibling pair is found by splitting the labels of the internal nodes, and stored in a map that
+answers the parent of a pair in constant time, in either order of the species.
+'''
+class BPP_node_table:
+
+    def __init__(
+            self,
+            names:          list[str],
+            tau:            np.ndarray,
+            theta:          np.ndarray
+                ):
+
+        self.names          = names
+        self.index          = {name:i for i, name in enumerate(names)}
+        self.tau            = tau
+        self.theta          = theta
+        self.pair_parent    = {}
+        for i, name in enumerate(names):
+            for k in range(1, len(name)):
+                if name[:k] in self.index and name[k:] in self.index:
+                    self.pair_parent[frozenset([name[:k], name[k:]])] = i
+
+    # the tau value of the common ancestor of two sibling species
+    def pair_Tau(
+            self,
+            species_1:      Species_name,
+            species_2:      Species_name
+                ) ->        float:
+
+        return float(self.tau[self.pair_parent[frozenset([species_1, species_2])]])
+
+    # the theta value of a species, or of its sibling if the theta of the species was not estimated
+    def pair_Theta  (
+            self,
+            species_1:      Species_name,
+            species_2:      Species_name
+                    ) ->    float:
+
+        theta = self.theta[self.index[species_1]]
+        if np.isnan(theta):
+            theta = self.theta[self.index[species_2]]
+
+        return float(theta)
+
+    # node names:tau values of the nodes where the tau value was estimated
+    def tau_Dict(
+            self
+                ) ->        dict[str, float]:
+
+        return {name:float(self.tau[i]) for i, name in enumerate(self.names) if not np.isnan(self.tau[i])}
+
+    # node names:theta values of the nodes where the theta value was estimated
+    def theta_Dict  (
+            self
+                    ) ->    dict[str, float]:
+
+        return {name:float(self.theta[i]) for i, name in enumerate(self.names) if not np.isnan(self.theta[i])}
+
+
+## SPECIALIZED FUNCTIONS
+
+# parse the table of nodes, taus and thetas from a BPP outfile
+def read_Node_table (
+        BPP_outfile:        BPP_out_file
+                    ) ->    BPP_node_table:
+
+    lines = readLines(BPP_outfile)
+    relevant_index = lines.index("List of nodes, taus and thetas:") # find the line where the node labels are listed
+    names = []
+    tau = []
+    theta = []
+    for line in lines[relevant_index+2:]:
+        fields = line.split()
+        if len(fields) < 4:
+            break
+        names.append(fields[3])
+        tau.append(float(fields[1]))
+        theta.append(float(fields[2]))
+
+    tau = np.array(tau)
+    theta = np.array(theta)
+    tau[tau == 0] = np.nan # 0 values only occur when tau is not estimated
+    theta[theta == -1] = np.nan # -1 values only occur when theta is not estimated
+
+    return BPP_node_table(names, tau, theta)
+
+# pool the node tables of several independent replicate chains
+'''
+The pooled value of a node is the mean of the posterior means reported by the chains that estimated it.
+As every chain samples the same number of iterations, this equals the posterior mean of the combined samples.
+'''
+def pool_Node_tables(
+        node_tables:        list[BPP_node_table]
+                    ) ->    BPP_node_table:
+
+    names = list(node_tables[0].names)
+    for node_table in node_tables[1:]:
+        names += [name for name in node_table.names if name not in names]
+
+    pooled = []
+    for param in ["tau", "theta"]:
+        chain_values = np.full((len(node_tables), len(names)), np.nan)
+        for i, node_table in enumerate(node_tables):
+            columns = [names.index(name) for name in node_table.names]
+            chain_values[i, columns] = getattr(node_table, param)
+        # nodes that were not estimated by any chain remain NaN
+        estimated = np.any(~np.isnan(chain_values), axis = 0)
+        values = np.full(len(names), np.nan)
+        values[estimated] = np.nanmean(chain_values[:, estimated], axis = 0)
+        pooled.append(values)
+
+    return BPP_node_table(names, pooled[0], pooled[1])
+
+
+## MAIN FUNCTION
+
+# get the node table of an outfile, reading the outfile only if its table is not in the cache
+'''
+If a list of outfiles produced by independent replicate chains is given, the tables of the chains are pooled.
+'''
+def node_Table  (
+        BPP_outfile:        BPP_out_file | list[BPP_out_file]
+                ) ->        BPP_node_table:
+
+    outfiles = BPP_outfile if isinstance(BPP_outfile, list) else [BPP_outfile]
+    cache_key = tuple((os.path.abspath(outfile), os.stat(outfile).st_mtime_ns, os.stat(outfile).st_size) for outfile in outfiles)
+    if cache_key in node_table_cache:
+        return node_table_cache[cache_key]
+
+    if isinstance(BPP_outfile, list):
+        node_table = pool_Node_tables([node_Table(outfile) for outfile in outfiles])
+    else:
+        node_table = read_Node_table(BPP_outfile)
+
+    if len(node_table_cache) >= node_table_cache_size:
+        del node_table_cache[next(iter(node_table_cache))]
+    node_table_cache[cache_key] = node_table
+
+    return node_table
@@ -0,0 +1,211 @@
+'''
+THIS MODULE CONTAINS THE FUNCTIONS FOR COMPUTING THE POSTERIOR DISTRIBUTION OF GDI VALUES FROM THE
+MCMC SAMPLE FILE OF BPP. THE SAMPLE FILE IS STREAMED IN CHUNKS OF ROWS, AND ONLY THE TAU AND THETA
+COLUMNS OF THE PROPOSED PAIRS ARE KEPT, SO SAMPLE FILES OF ANY LENGTH NEVER NEED TO FIT IN MEMORY.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import itertools
+
+# EXTERNAL LIBRARY DEPENDENCIES
+import numpy as np
+
+# NODE TABLE DEPENDENCIES
+from node_table_module import BPP_node_table
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import BPP_mcmc_file
+from custom_types import Species_name
+
+
+## SETTINGS
+
+# the number of samples read from the mcmcfile at once
+mcmc_chunk_rows = 100000
+
+# the number of bins the GDI values between 0 and 1 are counted in, which is also the precision of the median and the HPD interval
+gdi_bins = 10000
+
+# the posterior probability mass covered by the highest posterior density interval
+hpd_mass = 0.95
+
+
+## SPECIALIZED FUNCTIONS
+
+# find the column of a node parameter in the header of an mcmcfile, or None if the parameter was not sampled
+'''
+BPP names the columns of node parameters as "<parameter>_<node number><node name>", e.g. "tau_7ABC", where the
+node number is the position of the node in the node table of the outfile (starting from 1). The exact column
+name is built from the node table, as the boundary of the number and the name can not be told apart if the
+population names contain digits.
+'''
+def mcmc_Column (
+        header:             list[str],
+        parameter:          str,
+        node_name:          str,
+        node_table:         BPP_node_table
+                ) ->        int:
+
+    column = f"{parameter}_{node_table.index[node_name]+1}{node_name}"
+    if column not in header:
+        return None
+
+    return header.index(column)
+
+# find the columns of the tau and theta values needed to calculate the two GDI values of each pair
+'''
+Returns the columns of the tau values, and of the theta values that divide them, in the order
+[gdi_1 of each pair, gdi_2 of each pair]. The tau value is that of the parent of the pair in the node table.
+As in "calculate_GDI", if the theta value of a species was not sampled, the theta value of the other species
+is used. Returns None if the mcmcfile does not contain the parameters of all pairs.
+'''
+def GDI_Columns (
+        header:             list[str],
+        pairlist:           list[list[Species_name]],
+        node_table:         BPP_node_table
+                ) ->        tuple[list[int], list[int]]:
+
+    tau_columns = []
+    theta_columns = []
+    for order in [0, 1]:
+        for pair in pairlist:
+            species_1, species_2 = pair[order], pair[1-order]
+            parent = node_table.pair_parent.get(frozenset([species_1, species_2]))
+            if parent == None or species_1 not in node_table.index or species_2 not in node_table.index:
+                return None
+            tau_column = mcmc_Column(header, "tau", node_table.names[parent], node_table)
+            theta_column = mcmc_Column(header, "theta", species_1, node_table)
+            if theta_column == None:
+                theta_column = mcmc_Column(header, "theta", species_2, node_table)
+            if tau_column == None or theta_column == None:
+                return None
+
+            tau_columns.append(tau_column)
+            theta_columns.append(theta_column)
+
+    return tau_columns, theta_columns
+
+# read the requested columns of an mcmcfile in chunks of rows
+'''
+Yields 2D float arrays with one row per sample, and one column per requested column (in the order of
+"columns"). Only "chunk_rows" lines of the file are held in memory at once.
+'''
+def iterate_MCMC_chunks (
+        mcmcfile:           BPP_mcmc_file,
+        columns:            list[int],
+        chunk_rows:         int = mcmc_chunk_rows
+                        ):
+
+    with open(mcmcfile, "r") as f:
+        f.readline()
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if len(lines) == 0:
+                return
+
+            yield np.loadtxt(lines, usecols = columns, ndmin = 2, dtype = np.float64)
+
+# count the per-sample GDI values of all pairs in the histograms of their posterior distributions
+'''
+The tau and theta columns of every pair are read together, and the GDI values of all pairs are calculated
+in a single array operation on each chunk. Returns the sum of the GDI values (for an exact mean), the counts
+of the GDI values in "gdi_bins" equal bins between 0 and 1 (one row per GDI), and the number of samples.
+'''
+def accumulate_GDI_samples  (
+        mcmcfile:           BPP_mcmc_file,
+        tau_columns:        list[int],
+        theta_columns:      list[int]
+                            ) ->    tuple[np.ndarray, np.ndarray, int]:
+
+    # each column is only read once, even if it is needed by several pairs
+    read_columns = sorted(set(tau_columns + theta_columns))
+    tau_index = np.array([read_columns.index(column) for column in tau_columns])
+    theta_index = np.array([read_columns.index(column) for column in theta_columns])
+    n_gdis = len(tau_columns)
+
+    gdi_sum = np.zeros(n_gdis)
+    gdi_counts = np.zeros(n_gdis*gdi_bins, dtype = np.int64)
+    n_samples = 0
+    gdi_offsets = np.arange(n_gdis)*gdi_bins
+    for chunk in iterate_MCMC_chunks(mcmcfile, read_columns):
+        gdi = 1-np.exp(-2*chunk[:, tau_index]/chunk[:, theta_index])
+        gdi_sum += gdi.sum(axis = 0)
+        gdi_bin = np.clip((gdi*gdi_bins).astype(np.int64), 0, gdi_bins-1)
+        gdi_counts += np.bincount((gdi_bin + gdi_offsets).ravel(), minlength = n_gdis*gdi_bins)
+        n_samples += len(chunk)
+
+    return gdi_sum, gdi_counts.reshape(n_gdis, gdi_bins), n_samples
+
+# summarize the posterior distribution of a GDI value from the histogram of its samples
+'''
+The mean is exact, while the median and the bounds of the highest posterior density interval (the
+shortest interval holding "hpd_mass" of the samples) are precise to the width of the bins.
+'''
+def summarize_GDI_histogram (
+        gdi_sum:            float,
+        gdi_counts:         np.ndarray,
+        n_samples:          int
+                            ) ->    dict:
+
+    cumulative = np.concatenate([[0], np.cumsum(gdi_counts)])
+    median_bin = int(np.searchsorted(cumulative, n_samples/2)) - 1
+
+    # for each starting bin, find the last bin needed to hold the mass of the interval, and keep the shortest interval
+    # (intervals starting too late to hold the mass would end after the last bin, so they are excluded)
+    hpd_ends = np.searchsorted(cumulative, cumulative[:-1] + hpd_mass*n_samples) - 1
+    hpd_widths = np.where(hpd_ends < gdi_bins, hpd_ends - np.arange(gdi_bins), gdi_bins)
+    hpd_start = int(np.argmin(hpd_widths))
+
+    return {"mean":   float(np.round(gdi_sum/n_samples, decimals = 4)),
+            "median": float(np.round((median_bin + 0.5)/gdi_bins, decimals = 4)),
+            "hpd":    (float(np.round(hpd_start/gdi_bins, decimals = 4)), float(np.round((hpd_ends[hpd_start] + 1)/gdi_bins, decimals = 4))),
+            "n":      n_samples}
+
+
+## MAIN FUNCTION
+
+# calculate the posterior distributions of the GDI values for all elements in a list of possible mergeable/splittable pairs
+'''
+The columns of the mcmcfile are found from the node table of the outfile of the same run. If a list of mcmcfiles
+produced by independent replicate chains is given, the samples of the chains are pooled.
+Returns a [gdi_1 summary, gdi_2 summary] list for each pair, where each summary holds the posterior mean, median,
+and HPD interval of the GDI value. Returns None if the parameters of the pairs can not be found in the mcmcfiles.
+'''
+def posterior_GDI_Of_Pairs  (
+        BPP_mcmcfile:       BPP_mcmc_file | list[BPP_mcmc_file],
+        pairlist:           list[list[Species_name]],
+        node_table:         BPP_node_table
+                            ) ->    list[list[dict]]:
+
+    mcmcfiles = BPP_mcmcfile if isinstance(BPP_mcmcfile, list) else [BPP_mcmcfile]
+    n_pairs = len(pairlist)
+
+    gdi_sum = np.zeros(2*n_pairs)
+    gdi_counts = np.zeros((2*n_pairs, gdi_bins), dtype = np.int64)
+    n_samples = 0
+    for mcmcfile in mcmcfiles:
+        try:
+            with open(mcmcfile, "r") as f:
+                header = f.readline().split()
+        except OSError:
+            header = []
+        columns = GDI_Columns(header, pairlist, node_table)
+        if columns == None:
+            print(f"{clprnt.YELLOW}[!] THE MCMCFILE '{mcmcfile}' DOES NOT CONTAIN THE SAMPLES OF ALL PROPOSED PAIRS, THE POSTERIOR MEANS OF THE OUTFILE WILL BE USED{clprnt.end}")
+            return None
+
+        chain_sum, chain_counts, chain_samples = accumulate_GDI_samples(mcmcfile, *columns)
+        gdi_sum += chain_sum
+        gdi_counts += chain_counts
+        n_samples += chain_samples
+
+    if n_samples == 0:
+        return None
+
+    summaries = [summarize_GDI_histogram(gdi_sum[i], gdi_counts[i], n_samples) for i in range(2*n_pairs)]
+
+    return [[summaries[i], summaries[n_pairs + i]] for i in range(n_pairs)]
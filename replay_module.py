@@ -0,0 +1,288 @@
+'''
+THIS MODULE CONTAINS THE FUNCTIONS FOR REPLAYING THE DECISIONS OF A FINISHED HIERARCHICAL METHOD
+WITH A GRID OF OTHER DECISION THRESHOLDS AND CRITERIA. THE A00 OUTPUTS OF THE CONFIGURATIONS VISITED
+BY THE FINISHED RUN ARE REUSED, AND BPP IS ONLY RUN FOR CONFIGURATIONS THAT WERE NEVER SAMPLED.
+THE FINAL DELIMITATION OF EACH POINT OF THE GRID IS WRITTEN TO A SENSITIVITY TABLE.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+import io
+import json
+import copy
+import itertools
+import contextlib
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import read_MasterControl
+from helper_functions import get_HM_parameters
+from helper_functions import Imap_to_IndPop_Dict
+from helper_functions import pretty_Table
+from helper_functions import string_limit
+
+# BPP EXECUTION DEPENDENCIES
+from bpp_cache_module import BPP_run_cached
+from bpp_cache_module import BPP_run_cached_concurrent
+from bpp_cfile_module import get_known_BPP_param
+from core_scheduler_module import plan_BPP_cores
+
+# PROPOSAL AND DECISION DEPENDENCIES
+from proposal_module import HMproposal
+from proposal_module import get_HM_StartingState
+from proposal_module import get_HM_results
+from decision_module import get_MSC_param
+from decision_module import MSC_param_Columns
+from decision_module import criteria_Masks
+from decision_module import decision_Masks
+from decision_module import implement_decision
+from decision_module import stop_check
+from stage_modules import prepare_HMIteration
+
+# JOURNAL DEPENDENCIES
+from journal_module import read_Journal
+from journal_module import journal_Name
+
+# TREE HELPER DEPENDENCIES
+from tree_helper_functions import leafname_list
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import Master_control_file
+from custom_types import Master_control_dict
+from custom_types import HM_decision_parameters
+from custom_types import Population_list
+from custom_types import Tree_newick
+from custom_types import file_path
+
+
+## CONFIGURATION TABLE
+
+# the parameters of the master control file that can be varied by the replay
+replay_grid_params = ["GDI_thresh", "generations", "mutationrate", "HM_decision"]
+
+# the key of a configuration of the Hierarchical Method, which determines the proposal and its A00 job
+def config_Key  (
+        accepted_pops:      Population_list
+                ) ->        str:
+
+    return " ".join(sorted(accepted_pops))
+
+# the folder holding the A00 jobs run by the replay, and the table of their outputs
+def replay_Dir  (
+        input_mcfile:       Master_control_file
+                ) ->        str:
+
+    return f"{input_mcfile[0:-4]}_3_Replay"
+
+# collect the outputs of the A00 jobs of every configuration visited by the finished run, and by earlier replays
+'''
+The configuration of an HM iteration is the list of populations accepted before it. The first iteration
+starts from the result of the clade stage, if the run had one, and otherwise from the starting state.
+Configurations whose outfiles are missing are left out, and are run again if the replay reaches them.
+'''
+def read_Replay_table   (
+        input_mcfile:       Master_control_file,
+        start_pops:         Population_list
+                        ) ->    dict[str, dict]:
+
+    journal = read_Journal(input_mcfile)
+    previous_pops = journal["stages"].get("HM_clades", {}).get("accepted_pops", start_pops)
+    table = {}
+    for step in sorted(journal["HM"]["steps"], key = lambda entry: entry["step"]):
+        table[config_Key(previous_pops)] = {"outfile":  step["output_paths"]["outfile"],
+                                            "mcmcfile": step["output_paths"].get("mcmcfile")}
+        previous_pops = step["accepted_pops"]
+
+    table_file = os.path.join(replay_Dir(input_mcfile), "replay_table.json")
+    if os.path.isfile(table_file):
+        with open(table_file, "r") as f:
+            table.update(json.load(f))
+
+    return {key:outputs for key, outputs in table.items() if all(os.path.isfile(outfile) for outfile in (outputs["outfile"] if isinstance(outputs["outfile"], list) else [outputs["outfile"]]))}
+
+# run the A00 job(s) of a configuration that was never sampled, and add its outputs to the table
+'''
+The jobs are set up exactly as in "HMIteration", including the replicate chains, in their own folder inside the
+replay folder. The outputs of the configurations run by the replay are saved, so later replays can reuse them.
+'''
+def run_Replay_configuration(
+        input_mcfile:       Master_control_file,
+        mc_dict:            Master_control_dict,
+        guide_tree:         Tree_newick,
+        indpop_dict,
+        accepted_pops:      Population_list,
+        table:              dict[str, dict]
+                            ) ->    dict:
+
+    n_configs = len([folder for folder in os.listdir(replay_Dir(input_mcfile)) if folder.startswith("configuration_")])
+    config_dir = os.path.abspath(os.path.join(replay_Dir(input_mcfile), f"configuration_{n_configs+1}"))
+    os.makedirs(config_dir, exist_ok = True)
+    print(f"{clprnt.GREEN}\nTHE REPLAY REACHED A CONFIGURATION THAT WAS NEVER SAMPLED, RUNNING ITS A00 JOBS IN '{config_dir}'{clprnt.end}")
+
+    n_replicates = 1 if mc_dict["replicates"] == "?" else int(mc_dict["replicates"])
+    core_plan = plan_BPP_cores(n_replicates, get_known_BPP_param(input_mc_dict = mc_dict, BPP_mode = 'A00')["threads"])
+    cfile_names, cdicts = prepare_HMIteration(mc_dict, guide_tree, indpop_dict, accepted_pops, 1, config_dir, core_plan.threads, feedback = False)[3:5]
+    if n_replicates == 1:
+        BPP_run_cached(cfile_names[0], cwd = config_dir)
+        outputs = {"outfile":  os.path.join(config_dir, cdicts[0]["outfile"]),
+                   "mcmcfile": os.path.join(config_dir, cdicts[0]["mcmcfile"])}
+    else:
+        BPP_run_cached_concurrent(cfile_names, cwd = config_dir, n_slots = core_plan.n_slots)
+        outputs = {"outfile":  [os.path.join(config_dir, cdict["outfile"]) for cdict in cdicts],
+                   "mcmcfile": [os.path.join(config_dir, cdict["mcmcfile"]) for cdict in cdicts]}
+
+    table[config_Key(accepted_pops)] = outputs
+    replayed = {}
+    table_file = os.path.join(replay_Dir(input_mcfile), "replay_table.json")
+    if os.path.isfile(table_file):
+        with open(table_file, "r") as f:
+            replayed = json.load(f)
+    replayed[config_Key(accepted_pops)] = outputs
+    with open(table_file, "w") as f:
+        json.dump(replayed, f, indent = 1)
+
+    return outputs
+
+
+## REPLAY
+
+# get the decision parameters of each point of the grid
+'''
+The grid is the product of the values given for each parameter. Parameters without given values keep the value
+of the master control file. Points deciding on the age of the split without a mutation rate are left out.
+'''
+def replay_Grid (
+        mc_dict:            Master_control_dict,
+        grid_values:        dict[str, list[str]]
+                ) ->        list[HM_decision_parameters]:
+
+    values = [grid_values.get(param, [mc_dict[param]]) for param in replay_grid_params]
+    grid = []
+    for point in itertools.product(*values):
+        point_dict = copy.deepcopy(mc_dict)
+        point_dict.update(dict(zip(replay_grid_params, point)))
+        hm_param = get_HM_parameters(point_dict)
+        if hm_param["HM_decision"] in ["age", "one_gdi_&_age"] and hm_param["mutationrate"] == "?":
+            continue
+        grid.append(hm_param)
+
+    return grid
+
+# replay the iterations of the Hierarchical Method with every set of decision parameters of the grid
+'''
+The points of the grid are replayed together, one iteration at a time. Each iteration looks up the A00 outputs of
+its configuration in the table (running BPP if they are missing). The parameters inferred from the outputs only
+depend on the configuration and the mutation rate, so they are collected into columns once, and the points in the
+same configuration are decided on at once, with their thresholds and criteria as vectors (see "decision_Masks").
+Returns the final accepted populations, the number of iterations, and the number of new configurations of each point.
+'''
+def replay_Decisions(
+        grid:               list[HM_decision_parameters],
+        replay_state:       dict
+                    ) ->    list[tuple[Population_list, int, int]]:
+
+    points = [{"accepted_pops":replay_state["start_pops"], "visited":[], "to_iterate":True} for hm_param in grid]
+    column_cache = {}
+    # the configurations that had to be run by this replay
+    ran_keys = set()
+    while any(point["to_iterate"] == True for point in points):
+        # group the points that are still iterating by their configuration and mutation rate
+        groups = {}
+        for i, point in enumerate(points):
+            if point["to_iterate"] == True:
+                groups.setdefault((config_Key(point["accepted_pops"]), grid[i]["mutationrate"]), []).append(i)
+
+        for column_key, members in groups.items():
+            key = column_key[0]
+            accepted_pops = points[members[0]]["accepted_pops"]
+            hm_param = grid[members[0]]
+            if key not in replay_state["table"]:
+                run_Replay_configuration(replay_state["mcfile"], replay_state["mc_dict"], replay_state["guide_tree"], replay_state["indpop_dict"], accepted_pops, replay_state["table"])
+                ran_keys.add(key)
+            
+            if column_key not in column_cache:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    prop_change = HMproposal(replay_state["guide_tree"], replay_state["indpop_dict"], accepted_pops, hm_param["mode"])[0]
+                outputs = replay_state["table"][key]
+                # the GDIs are always collected, as the points of the group may use different decision criteria
+                MSC_param = get_MSC_param(outputs["outfile"], prop_change, {**hm_param, "HM_decision":"all"}, outputs["mcmcfile"])
+                column_cache[column_key] = MSC_param_Columns(MSC_param, hm_param)
+            pairs, gdi_1, gdi_2, age = column_cache[column_key]
+
+            matched, known = criteria_Masks(gdi_1, gdi_2, age, hm_param["mode"], [grid[i]["GDI_thresh"] for i in members], [grid[i]["generations"] for i in members])
+            accepted_masks = decision_Masks(matched, known, [grid[i]["HM_decision"] for i in members])
+            for row, i in enumerate(members):
+                decision = [pair for pair, is_accepted in zip(pairs, accepted_masks[row]) if is_accepted]
+                with contextlib.redirect_stdout(io.StringIO()):
+                    new_accepted_pops = implement_decision(points[i]["accepted_pops"], decision, grid[i])
+                    points[i]["to_iterate"] = stop_check(grid[i], decision, new_accepted_pops, replay_state["halt_pop_number"])
+                points[i]["accepted_pops"] = new_accepted_pops
+                points[i]["visited"].append(key)
+
+    # every point is credited with the new configurations on its path, regardless of which point ran them first
+    return [(point["accepted_pops"], len(point["visited"]), len([key for key in point["visited"] if key in ran_keys])) for point in points]
+
+# write the sensitivity table of the final delimitations across the grid, and print it to the user
+def write_Sensitivity_table (
+        rows:               list[list[str]],
+        table_file:         file_path
+                            ):
+
+    header = ["GDI threshold", "generations", "mutation rate", "decision criteria", "iterations", "new A00 runs", "n species", "delimitation"]
+    with open(table_file, "w") as f:
+        f.write("\t".join(header) + "\n")
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+
+    print(f"\n{clprnt.BLUE}SENSITIVITY OF THE FINAL DELIMITATION:{clprnt.end}\n")
+    pretty_Table([[string_limit(row[i], 64) for row in rows] for i in range(len(header))], [colname.upper() for colname in header])
+    print(f"\n{len(set(row[-1] for row in rows))} distinct delimitations across {len(rows)} points of the grid")
+    print(f"The sensitivity table was written to '{table_file}'\n")
+
+
+## MAIN FUNCTION
+
+# replay the decisions of a finished run of the Hierarchical Method for a grid of decision thresholds and criteria
+'''
+The guide tree, the Imap and the visited configurations are read from the journal of the finished run. The
+replay iterates the whole guide tree, starting from where the clade stage ended if the run had one, so the
+decisions made within the clades are not varied. The mode of the Hierarchical Method is not varied either.
+'''
+def HMreplay(
+        input_mcfile:       Master_control_file,
+        grid_values:        dict[str, list[str]]
+            ):
+
+    print(f"{clprnt.BLUE}<< REPLAYING THE DECISIONS OF THE HIERARCHICAL METHOD >>{clprnt.end}\n")
+
+    journal = read_Journal(input_mcfile)
+    if journal == None or "guide_tree" not in journal["HM"] or len(journal["HM"]["steps"]) == 0:
+        print(f"[X] ERROR: THE JOURNAL '{journal_Name(input_mcfile)}' DOES NOT DESCRIBE A RUN OF THE HIERARCHICAL METHOD")
+        print("Please finish a run of the pipeline with this master control file before replaying its decisions")
+        exit()
+
+    mc_dict = read_MasterControl(input_mcfile)
+    mode = get_HM_parameters(mc_dict)["mode"]
+    start_pops, halt_pop_number = get_HM_StartingState(journal["HM"]["guide_tree"], journal["HM"]["imap"], mode)[0:2]
+    os.makedirs(replay_Dir(input_mcfile), exist_ok = True)
+    replay_state = {"mcfile":          input_mcfile,
+                    "mc_dict":         mc_dict,
+                    "guide_tree":      journal["HM"]["guide_tree"],
+                    "indpop_dict":     Imap_to_IndPop_Dict(journal["HM"]["imap"]),
+                    "start_pops":      journal["stages"].get("HM_clades", {}).get("accepted_pops", start_pops),
+                    "halt_pop_number": halt_pop_number,
+                    "table":           read_Replay_table(input_mcfile, start_pops)}
+
+    grid = replay_Grid(mc_dict, grid_values)
+    print(f"{len(grid)} POINTS OF THE GRID WILL BE REPLAYED, {len(replay_state['table'])} CONFIGURATIONS WERE ALREADY SAMPLED\n")
+
+    rows = []
+    for hm_param, (accepted_pops, n_steps, n_new) in zip(grid, replay_Decisions(grid, replay_state)):
+        species = leafname_list(get_HM_results(replay_state["guide_tree"], replay_state["indpop_dict"], accepted_pops)[1])
+        rows.append([str(hm_param["GDI_thresh"]), str(hm_param["generations"]), str(hm_param["mutationrate"]), hm_param["HM_decision"],
+                     str(n_steps), str(n_new), str(len(species)), " ".join(species)])
+
+    write_Sensitivity_table(rows, os.path.join(replay_Dir(input_mcfile), "sensitivity_table.tsv"))
@@ -0,0 +1,260 @@
+'''
+THIS MODULE CONTAINS THE FUNCTIONS FOR SPECULATIVE EXECUTION OF THE HIERARCHICAL METHOD.
+WHILE THE BPP JOBS OF AN ITERATION ARE RUNNING, THE JOBS OF THE MOST LIKELY NEXT ITERATION
+ARE STARTED ON IDLE CORES. IF THE DECISION OF THE ITERATION MATCHES THE SPECULATION, THE
+RESULTS OF THE SPECULATIVE JOBS ARE ADOPTED, OTHERWISE THE SPECULATIVE JOBS ARE CANCELLED.
+'''
+## DEPENDENCIES
+
+# STANDARD LIBRARY DEPENDENCIES
+import os
+import shutil
+import asyncio
+import threading
+
+# HELPER FUNCTION DEPENDENCIES
+from helper_functions import bppcfile_to_dict
+from helper_functions import BPP_run_async
+
+# BPP CACHE DEPENDENCIES
+from bpp_cache_module import BPP_job_Key
+from bpp_cache_module import cache_Store
+from bpp_cache_module import cached_BPP_outputs
+from bpp_cache_module import BPP_cache_settings
+
+# CORE ALLOCATION DEPENDENCIES
+from core_scheduler_module import plan_BPP_cores
+
+## DATA DEPENDENCIES
+from data_dicts import clprnt
+
+## TYPE HINTS
+from custom_types import BPP_control_file
+from custom_types import HM_decision_parameters
+from custom_types import Population_list
+from custom_types import Species_name
+
+
+## SPECULATION STATE
+
+# the running speculative jobs, stored under the key of the BPP job they execute
+speculative_jobs = {}
+
+# counters of the outcomes of the speculative jobs during the run
+speculation_stats = {"launched": 0, "adopted": 0, "cancelled": 0}
+
+# the event loop running the speculative jobs in a background thread, started with the first speculative job
+speculation_runner = {"loop": None}
+
+
+## PLANNING
+
+# check if speculative execution is requested, and possible with the parameters of the run
+'''
+The jobs of the next iteration can only be recognized if they are reproducible, so a fixed seed is required.
+The results of adopted jobs are passed on through the BPP result cache, so the cache must be enabled.
+Speculation is only implemented in merge mode, where the next proposal is fully determined by the accepted merges.
+'''
+def speculation_Enabled (
+        mc_dict,
+        hm_param:               HM_decision_parameters,
+        seed
+                        ) ->    bool:
+
+    if mc_dict["speculative"] != "True":
+        return False
+
+    if hm_param["mode"] != "merge" or str(seed).strip() in ["-1", "?"] or BPP_cache_settings["directory"] == None:
+        print(f"{clprnt.YELLOW}[!] SPECULATIVE EXECUTION REQUIRES MERGE MODE, A FIXED SEED AND THE BPP RESULT CACHE, THE ITERATIONS WILL NOT BE SPECULATED{clprnt.end}")
+        return False
+
+    return True
+
+# plan the cores of the jobs of an iteration, and of the speculative jobs of the next iteration
+'''
+If the budget fits twice the jobs of an iteration, the slots are divided into two groups. The jobs of an
+iteration run in the group of its parity, and the speculative jobs of the next iteration in the other
+group, which is where the next iteration would run its jobs anyway. An adopted job can therefore keep
+running on its cores, while the speculation of the iteration after it starts on the cores that were freed.
+Returns the threads of the jobs of the iteration, their number of slots, and the threads of the
+speculative jobs (None if there are no idle cores to speculate on).
+'''
+def plan_Speculative_cores  (
+        n_jobs:                 int,
+        requested_threads:      str,
+        step:                   int,
+        speculate:              bool
+                            ) ->    tuple[list[str], int, list[str]]:
+
+    if speculate == True:
+        core_plan = plan_BPP_cores(2*n_jobs, requested_threads)
+        if core_plan.n_slots == 2*n_jobs:
+            group = step % 2
+            own_threads = core_plan.threads[group*n_jobs:(group+1)*n_jobs]
+            next_threads = core_plan.threads[(1-group)*n_jobs:(2-group)*n_jobs]
+
+            return own_threads, n_jobs, next_threads
+
+        print(f"{clprnt.YELLOW}[!] THERE ARE NO IDLE CORES TO SPECULATE ON, THE NEXT ITERATION WILL NOT BE SPECULATED{clprnt.end}")
+
+    core_plan = plan_BPP_cores(n_jobs, requested_threads)
+
+    return core_plan.threads, core_plan.n_slots, None
+
+# get the populations accepted after an iteration if all proposed merges are accepted, or None if the method would stop
+'''
+If no merges are accepted, the Hierarchical Method stops without running another iteration, so accepting
+all merges is the only outcome of an iteration that leads to further BPP jobs which can be speculated on.
+'''
+def speculated_Accepted_pops(
+        accepted_pops:          Population_list,
+        proposed_changes:       list[list[Species_name]],
+        halt_pop_number:        int
+                            ):
+
+    merged_pops = [pop for pair in proposed_changes for pop in pair]
+    speculated_pops = [pop for pop in accepted_pops if pop not in merged_pops]
+    if len(proposed_changes) == 0 or len(speculated_pops) <= halt_pop_number:
+        return None
+
+    return speculated_pops
+
+
+## EXECUTION
+
+# get the event loop of the speculative jobs, starting its background thread if it is not yet running
+'''
+The speculative jobs are executed by "BPP_run_async" like all other BPP jobs, so they report their progress to
+the metrics file of their directory, and are killed on timeouts and cancellation. Their event loop runs in a
+daemon thread, so the jobs keep running while the main thread waits for the jobs of the current iteration.
+'''
+def speculation_Loop(
+                    ) ->    asyncio.AbstractEventLoop:
+
+    if speculation_runner["loop"] == None:
+        speculation_runner["loop"] = asyncio.new_event_loop()
+        threading.Thread(target = speculation_runner["loop"].run_forever, daemon = True).start()
+
+    return speculation_runner["loop"]
+
+# start a BPP job as a task of the speculation loop
+async def start_Speculative_task(
+        control_file:           BPP_control_file,
+        cwd:                    str,
+        timeout:                float
+                                ) ->    asyncio.Task:
+
+    return asyncio.ensure_future(BPP_run_async(["--cfile", control_file], cwd = cwd, timeout = timeout))
+
+# wait for the task of a speculative job to finish, cancelling it first if requested, and return its result (None if cancelled)
+async def finish_Speculative_task   (
+        task:                   asyncio.Task,
+        cancel:                 bool
+                                    ):
+
+    if cancel == True:
+        task.cancel()
+    try:
+        return await task
+    except asyncio.CancelledError:
+        return None
+
+# start BPP jobs in the background, without waiting for them to finish
+def launch_Speculative  (
+        control_files:          list[BPP_control_file],
+        cwd:                    str,
+        timeout:                float = None
+                        ):
+
+    n_started = 0
+    for control_file in control_files:
+        BPP_cdict = bppcfile_to_dict(os.path.join(cwd, control_file))
+        key = BPP_job_Key(BPP_cdict, cwd)
+        if key == None or key in speculative_jobs:
+            continue
+
+        task = asyncio.run_coroutine_threadsafe(start_Speculative_task(control_file, cwd, timeout), speculation_Loop()).result()
+        speculative_jobs[key] = {"task":         task,
+                                 "cwd":          cwd,
+                                 "control_file": control_file,
+                                 "output_paths": {param:os.path.join(cwd, BPP_cdict[param]) for param in cached_BPP_outputs if param in BPP_cdict}}
+        speculation_stats["launched"] += 1
+        n_started += 1
+
+    if n_started > 0:
+        print(f"{clprnt.GREEN}\nTHE JOBS OF THE NEXT ITERATION WERE STARTED SPECULATIVELY, ASSUMING THAT ALL MERGES ARE ACCEPTED{clprnt.end}")
+
+# claim the speculative jobs matching a list of control files, and cancel all other speculative jobs
+'''
+A speculative job is claimed if it executes a BPP job identical to one of the control files. The other
+speculative jobs were based on a wrong speculation, so they are cancelled. The claimed jobs may still be running.
+'''
+def claim_Speculative   (
+        control_files:          list[BPP_control_file],
+        cwd:                    str = None
+                        ) ->    list[dict]:
+
+    job_dir = cwd if cwd != None else ""
+    keys = [BPP_job_Key(bppcfile_to_dict(os.path.join(job_dir, control_file)), job_dir) for control_file in control_files]
+    
+    claimed = []
+    for key in keys:
+        if key in speculative_jobs:
+            claimed.append({"key": key, **speculative_jobs.pop(key)})
+    
+    cancel_Speculative(keep_dirs = [job["cwd"] for job in claimed])
+
+    return claimed
+
+# adopt the results of claimed speculative jobs
+'''
+Each claimed job is waited for, and its outputs are stored in the BPP result cache, 
+from where they are reused when the matching control file is run.
+'''
+def adopt_Speculative   (
+        claimed:                list[dict]
+                        ):
+
+    for job in claimed:
+        print(f"{clprnt.GREEN}\nADOPTING THE RESULTS OF THE SPECULATIVE BPP JOB '{job['control_file']}'{clprnt.end}")
+        result = asyncio.run_coroutine_threadsafe(finish_Speculative_task(job["task"], cancel = False), speculation_Loop()).result()
+        if result != None:
+            cache_Store(job["key"], job["output_paths"], result)
+        speculation_stats["adopted"] += 1
+    
+    for job_dir in {job["cwd"] for job in claimed}:
+        remove_Speculative_dir(job_dir)
+
+# cancel all running speculative jobs, and remove their directories (except for the directories in "keep_dirs")
+def cancel_Speculative  (
+        keep_dirs:              list[str] = None
+                        ):
+
+    if keep_dirs == None:
+        keep_dirs = []
+
+    for key in list(speculative_jobs):
+        job = speculative_jobs.pop(key)
+        asyncio.run_coroutine_threadsafe(finish_Speculative_task(job["task"], cancel = True), speculation_Loop()).result()
+        speculation_stats["cancelled"] += 1
+        if job["cwd"] not in keep_dirs:
+            remove_Speculative_dir(job["cwd"])
+
+# remove the directory of speculative jobs once none of its jobs are running
+def remove_Speculative_dir  (
+        job_dir:                str
+                            ):
+
+    if all(job["cwd"] != job_dir for job in speculative_jobs.values()):
+        shutil.rmtree(job_dir, ignore_errors = True)
+
+# print the outcomes of the speculative jobs during the run
+def speculation_Report():
+
+    if speculation_stats["launched"] == 0:
+        return
+
+    print(f"\nSPECULATIVE EXECUTION:")
+    print(f"\tlaunched:  {speculation_stats['launched']}")
+    print(f"\tadopted:   {speculation_stats['adopted']}")
+    print(f"\tcancelled: {speculation_stats['cancelled']}\n")
@@ -13,16 +13,37 @@ from helper_functions import get_HM_parameters
 from helper_functions import dict_to_bppcfile
 from helper_functions import list_To_Imap
 from helper_functions import read_MasterControl
-from helper_functions import BPP_run
 from helper_functions import extract_Speciestree
 from helper_functions import extract_Pops
 from helper_functions import string_limit
+from helper_functions import overwrite_dict
+
+# BPP EXECUTION
+from bpp_cache_module import BPP_run_cached
+from bpp_cache_module import BPP_run_cached_concurrent
 
 # BPP CONTROL FILE RELATED FUNCTIONS
 from bpp_cfile_module import get_known_BPP_param 
 from bpp_cfile_module import generate_unkown_BPP_param
 from bpp_cfile_module import generate_unknown_BPP_tree
 from bpp_cfile_module import proposal_compliant_BPP_param
+from bpp_cfile_module import replicate_BPP_param
+from bpp_cfile_module import checkpoint_BPP_param
+
+# CORE ALLOCATION FUNCTIONS
+from core_scheduler_module import plan_BPP_cores
+
+# SPECULATIVE EXECUTION FUNCTIONS
+from speculation_module import speculation_Enabled
+from speculation_module import plan_Speculative_cores
+from speculation_module import speculated_Accepted_pops
+from speculation_module import launch_Speculative
+from speculation_module import claim_Speculative
+from speculation_module import adopt_Speculative
+
+# ADAPTIVE EARLY STOPPING FUNCTIONS
+from adaptive_module import adaptive_Enabled
+from adaptive_module import BPP_run_adaptive
 
 # UNIQUE ID ENCODING AND DECONDING FUNCTIONS
 from uniqueID_module import uniqueID_encoding
@@ -37,6 +58,13 @@ from proposal_module import get_HM_results
 from decision_module import decisionModule
 from decision_module import get_MSC_param
 
+# JOURNAL FUNCTIONS
+from journal_module import record_Stage
+from journal_module import record_HM_start
+from journal_module import record_HM_step
+from journal_module import completed_Stage
+from journal_module import completed_HM_steps
+
 # DEEP CONFLICT CHECKING FUNCTIONS
 from check_conflict_functions import check_GuideTree_Imap_MSA_compat
 
@@ -49,6 +77,10 @@ from tree_helper_functions import visualize_progress
 from tree_helper_functions import visualize_imap
 from tree_helper_functions import leafname_list
 from tree_helper_functions import accepted_leaves
+from tree_helper_functions import get_Clade_partition
+
+# ALIGNMENT STORE FUNCTIONS
+from alignment_store_module import write_Subset_alignment
 
 ## DATA DEPENDENCIES
 from data_dicts import clprnt
@@ -58,28 +90,38 @@ from custom_types import Imap_list
 from custom_types import Tree_newick
 from custom_types import Population_list
 from custom_types import Master_control_file
+from custom_types import Master_control_dict
+from custom_types import BPP_control_file
+from custom_types import BPP_control_dict
 
 
 # infer the starting topology before any delimitation steps
 def StartingTopolgy (
-        input_mcfile:       Master_control_file
+        input_mcfile:       Master_control_file,
+        resume:             bool = False
                     ) ->    Tree_newick:
 
-    parent_dir = os.getcwd()
     print(f"{clprnt.BLUE}\nBEGINNING STARTING PHYLOGENY INFERENCE\n{clprnt.end}")
     
+    # if the stage was finished before the run was interrupted, its result is read from the journal
+    journaled = completed_Stage(input_mcfile, "A01", resume)
+    if journaled != None:
+        print(f"The stage was already finished, the starting tree is read from the journal:\n\n\t{string_limit(journaled['tree'], 96)}")
+        return journaled["tree"]
+    
     # get master control file parameters
     mc_dict = read_MasterControl(input_mcfile)
     
     # create the target directory specific to the step, and the name of the MCF
     target_dir = f'{input_mcfile[0:-4]}_0_StartPhylo'
-    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the results for the Phylogeny Inference stage.")
+    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the results for the Phylogeny Inference stage.", exist_ok = resume)
 
     # set up the BPP control file specific to the A01 stage
     BPP_A01_cfile_name = "BPP_A01_StartPhylo.ctl"
     BPP_cdict = get_known_BPP_param(input_mc_dict = mc_dict, BPP_mode = 'A01')
     BPP_cdict = generate_unkown_BPP_param(BPP_cdict)
     BPP_cdict = generate_unknown_BPP_tree(BPP_cdict)
+    BPP_cdict["threads"] = plan_BPP_cores(1, BPP_cdict["threads"]).threads[0]
     # print feedback to the user
     print("\nBPP CONTROL FILE:")
     pretty(BPP_cdict)
@@ -92,43 +134,48 @@ def StartingTopolgy (
         # STARTING PHYLOGENY #
     ###############################
     #-----------------------------#
-    os.chdir(target_dir)
-    
     # run bpp
-    BPP_run(BPP_A01_cfile_name)
+    BPP_run_cached(BPP_A01_cfile_name, cwd = target_dir)
         
     # extract the species tree
-    tree = extract_Speciestree(BPP_A01_cfile_name)
+    tree = extract_Speciestree(BPP_A01_cfile_name, cwd = target_dir)
 
     # write resulting tree in newick and image format for manual inspection
-    write_Tree(tree, "OUTPUT_TREE.txt")
-    visualize_tree(tree, "OUTPUT_TREE.png")
-
-    os.chdir(parent_dir)
+    write_Tree(tree, os.path.join(target_dir, "OUTPUT_TREE.txt"))
+    visualize_tree(tree, os.path.join(target_dir, "OUTPUT_TREE.png"))
     #-----------------------------#
     print("\n>> RESULTS OF STARTING PHYLOGENY INFERENCE:")
     print(f"\t\t\nSTARTING NEWICK TREE:\n\n\t{string_limit(tree, 96)}")
     print(f"\nSTARTING ASCII TREE:")
     print(tree_ASCII(tree))
 
+    record_Stage(input_mcfile, "A01", {"tree":    tree, 
+                                       "outfile": os.path.join(target_dir, BPP_cdict["outfile"])})
+
     return tree
 
 
 # infer the starting delimitation. This consists of a guide tree and an associated Imap
 def StartingDelimitation(
         input_mcfile:           Master_control_file, 
-        starting_tree:          Tree_newick = None
+        starting_tree:          Tree_newick = None,
+        resume:                 bool = False
                         ) ->    tuple[Tree_newick, Imap_list]:
 
-    parent_dir = os.getcwd()
     print(f"{clprnt.BLUE}\nBEGINNING STARTING DELIMITATION{clprnt.end}\n")
 
+    # if the stage was finished before the run was interrupted, its results are read from the journal
+    journaled = completed_Stage(input_mcfile, "A11", resume)
+    if journaled != None:
+        print(f"The stage was already finished, the guide tree and Imap are read from the journal:\n\n\t{string_limit(journaled['guide_tree'], 96)}")
+        return journaled["guide_tree"], journaled["imap"]
+
     # get master control file parameters
     mc_dict = read_MasterControl(input_mcfile)
     
     # create the target directory specific to the step
     target_dir = f'{input_mcfile[0:-4]}_1_StartDelim'
-    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the results for the Starting Delimitation stage.")
+    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the results for the Starting Delimitation stage.", exist_ok = resume)
 
     # set up the BPP control file specific to the A11 stage
     BPP_A11_cfile_name = "BPP_A11_StartDelim.ctl"
@@ -137,6 +184,7 @@ def StartingDelimitation(
     # overwrite any existing starting tree if one was generated in the A01 step or supplied in the MCF
     if starting_tree != None:
         BPP_cdict["newick"] = starting_tree
+    BPP_cdict["threads"] = plan_BPP_cores(1, BPP_cdict["threads"]).threads[0]
     # print feedback to the user
     print("\nBPP CONTROL FILE:")
     pretty(BPP_cdict)
@@ -158,25 +206,21 @@ def StartingDelimitation(
        # STARTING DELIMITATION #
     ###############################
     #-----------------------------#
-    os.chdir(target_dir)
-
     # run BPP
-    BPP_run(BPP_A11_cfile_name)
+    BPP_run_cached(BPP_A11_cfile_name, cwd = target_dir)
         
     # capture output (encoded with unique IDs)
-    tree_encoded = extract_Speciestree(BPP_A11_cfile_name)
-    pops_encoded = extract_Pops(BPP_A11_cfile_name)
+    tree_encoded = extract_Speciestree(BPP_A11_cfile_name, cwd = target_dir)
+    pops_encoded = extract_Pops(BPP_A11_cfile_name, cwd = target_dir)
         
     # decode unique IDs back to user supplied names
     guide_tree, imap = uniqueID_decoding(imap_unique_ids, pops_encoded, tree_encoded, remap_dict)
         
     # write resulting Imap and tree for manual inspection if needed
-    list_To_Imap(imap, "OUTPUT_IMAP.txt")
-    visualize_imap  (guide_tree, Imap_to_PopInd_Dict(imap), BPP_outfile = None, image_name= f"OUTPUT_IMAP.png")
-    write_Tree(guide_tree, "OUTPUT_TREE.txt")
-    visualize_tree  (guide_tree, f"OUTPUT_TREE.png")
-
-    os.chdir(parent_dir)
+    list_To_Imap    (imap, os.path.join(target_dir, "OUTPUT_IMAP.txt"))
+    visualize_imap  (guide_tree, Imap_to_PopInd_Dict(imap), BPP_outfile = None, image_name = os.path.join(target_dir, "OUTPUT_IMAP.png"))
+    write_Tree      (guide_tree, os.path.join(target_dir, "OUTPUT_TREE.txt"))
+    visualize_tree  (guide_tree, os.path.join(target_dir, "OUTPUT_TREE.png"))
     #-----------------------------#
     ###############################
 
@@ -187,20 +231,87 @@ def StartingDelimitation(
     print(f"\t\t\nIMAP:\n")
     pretty(Imap_to_PopInd_Dict(imap))
 
+    record_Stage(input_mcfile, "A11", {"guide_tree": guide_tree, 
+                                       "imap":       imap, 
+                                       "outfile":    os.path.join(target_dir, BPP_cdict["outfile"])})
+
     return guide_tree, imap, 
 
 
+# generate the proposal of an iteration of the hierarchical method, and write the files of its BPP jobs to a directory
+'''
+If replicate chains are requested (one value in "threads" per chain), each chain gets its own control file 
+with a distinct seed, outputs and cores. Returns the proposed changes, tree and imap, and the names and 
+contents of the control files. "clade_param" replaces the seqfile, Imapfile and nloci parameters when the 
+iteration is run on a clade of the guide tree.
+'''
+def prepare_HMIteration (
+        mc_dict:                Master_control_dict,
+        input_guide_tree:       Tree_newick, 
+        input_indpop_dict, 
+        input_accepted_pops:    Population_list, 
+        step:                   int,
+        target_dir:             str,
+        threads:                list[str],
+        feedback:               bool = True,
+        clade_param:            dict = None
+                        ) ->    tuple[list[list[str]], Tree_newick, Imap_list, list[BPP_control_file], list[BPP_control_dict]]:
+
+    hm_param = get_HM_parameters(input_mc_dict = mc_dict)
+
+    # generate a proposal based on the previously accepted results
+    prop_change, prop_tree, prop_imap = HMproposal(guide_tree_newick = input_guide_tree,
+                                                   base_indpop_dict  = input_indpop_dict,
+                                                   current_pops_list = input_accepted_pops,
+                                                   mode              = hm_param["mode"])
+    prop_imap_name = "proposed_imap.txt"
+    
+    # set up the control file specific to the A00 stage
+    BPP_cdict = get_known_BPP_param(input_mc_dict = mc_dict, BPP_mode = 'A00')
+    if clade_param != None:
+        BPP_cdict = overwrite_dict(BPP_cdict, clade_param)
+    # adaptive runs write a checkpoint after every segment, where the decision is re-evaluated
+    if adaptive_Enabled(mc_dict):
+        BPP_cdict = checkpoint_BPP_param(BPP_cdict, mc_dict["adaptive_segment"])
+    BPP_cdict = generate_unkown_BPP_param(BPP_cdict) 
+    base_imap = [list(input_indpop_dict.keys()), list(input_indpop_dict.values())]
+    BPP_cdict = proposal_compliant_BPP_param(BPP_cdict, prop_imap, prop_imap_name, prop_tree, base_imap)
+    BPP_cdict["threads"] = threads[0]
+    # print feedback to the user
+    if feedback == True:
+        print("\nBPP CONTROL FILE:\n")
+        pretty(BPP_cdict)
+    
+    # write the relevant files
+    list_To_Imap        (prop_imap, os.path.join(target_dir, prop_imap_name))
+    shutil.copy         (src = BPP_cdict['seqfile'], dst = target_dir)
+    if len(threads) == 1:
+        cfile_names = [f"BPP_A00_HM_{step}.ctl"]
+        cdicts = [BPP_cdict]
+    else:
+        cfile_names = [f"BPP_A00_HM_{step}_rep_{replicate+1}.ctl" for replicate in range(len(threads))]
+        cdicts = [replicate_BPP_param(BPP_cdict, replicate, threads[replicate]) for replicate in range(len(threads))]
+    for cdict, cfile_name in zip(cdicts, cfile_names):
+        dict_to_bppcfile(cdict, os.path.join(target_dir, cfile_name))
+
+    return prop_change, prop_tree, prop_imap, cfile_names, cdicts
+
 # perform one iteration of the hierarchical method.
+'''
+If speculative execution is enabled, the jobs of the next iteration are started on idle cores, assuming that all
+proposed merges are accepted. The speculative jobs started during the previous iteration are adopted if they
+match the jobs of this iteration, and cancelled otherwise.
+'''
 def HMIteration (
         input_mcfile:           Master_control_file, 
         input_guide_tree:       Tree_newick, 
         input_indpop_dict, 
         input_accepted_pops:    Population_list, 
         halt_pop_number:        int, 
-        step:                   int
+        step:                   int,
+        resume:                 bool = False
                 ) ->            tuple[Population_list, bool]:
 
-    parent_dir = os.getcwd()
     print(f"{clprnt.BLUE}\nBEGINNING ITERATION {step} OF THE HIERARCHICAL METHOD{clprnt.end}\n")
     
     # get master control file parameters
@@ -211,55 +322,67 @@ def HMIteration (
 
     # create the target directory specific to the step
     target_dir = f'{input_mcfile[0:-4]}_2_HM_{step}'
-    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the results for step {step} of the Hierarchical Method.")
+    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the results for step {step} of the Hierarchical Method.", exist_ok = resume)
     
-    # generate a proposal based on the previously accepted results
-    prop_change, prop_tree, prop_imap = HMproposal(guide_tree_newick = input_guide_tree,
-                                                   base_indpop_dict  = input_indpop_dict,
-                                                   current_pops_list = input_accepted_pops,
-                                                   mode              = hm_param["mode"])
-    prop_imap_name = "proposed_imap.txt"
+    # plan the cores of the chain (or of each replicate chain), and of the speculative jobs of the next iteration
+    n_replicates = 1 if mc_dict["replicates"] == "?" else int(mc_dict["replicates"])
+    default_A00_param = get_known_BPP_param(input_mc_dict = mc_dict, BPP_mode = 'A00')
+    speculate = speculation_Enabled(mc_dict, hm_param, default_A00_param["seed"])
+    threads, n_slots, next_threads = plan_Speculative_cores(n_replicates, default_A00_param["threads"], step, speculate)
+
+    # generate the proposal, and write the files of the BPP jobs
+    prop_change, prop_tree, prop_imap, cfile_names, cdicts = prepare_HMIteration(mc_dict, input_guide_tree, input_indpop_dict, input_accepted_pops, step, target_dir, threads)
+
+    # claim the jobs of this iteration that were started speculatively during the previous iteration
+    claimed = claim_Speculative(cfile_names, target_dir)
     
-    # set up the control file specific to the A00 stage
-    proposed_cfile_name = f"BPP_A00_HM_{step}.ctl"
-    BPP_cdict = get_known_BPP_param(input_mc_dict = mc_dict, BPP_mode = 'A00')
-    BPP_cdict = generate_unkown_BPP_param(BPP_cdict) 
-    BPP_cdict = proposal_compliant_BPP_param(BPP_cdict, prop_imap, prop_imap_name, prop_tree)
-    # print feedback to the user
-    print("\nBPP CONTROL FILE:\n")
-    pretty(BPP_cdict)
+    # start the jobs of the next iteration speculatively, assuming that all proposed merges are accepted
+    if next_threads != None:
+        speculated_pops = speculated_Accepted_pops(input_accepted_pops, prop_change, halt_pop_number)
+        if speculated_pops != None:
+            speculative_dir = os.path.abspath(f'{input_mcfile[0:-4]}_2_HM_{step+1}_speculative')
+            os.makedirs(speculative_dir, exist_ok = True)
+            speculative_cfile_names = prepare_HMIteration(mc_dict, input_guide_tree, input_indpop_dict, speculated_pops, step+1, speculative_dir, next_threads, feedback = False)[3]
+            launch_Speculative(speculative_cfile_names, speculative_dir)
     
-    # write the relevant files
-    list_To_Imap        (prop_imap, os.path.join(target_dir, prop_imap_name))
-    shutil.copy         (src = BPP_cdict['seqfile'], dst = target_dir)
-    dict_to_bppcfile    (BPP_cdict, os.path.join(target_dir, proposed_cfile_name))
+    # wait for the claimed jobs, their results are then reused from the BPP result cache
+    adopt_Speculative(claimed)
 
            # HM ITERATION #
     ###############################
     #-----------------------------#
-    os.chdir(target_dir)
-        
-    # run BPP 
-    BPP_run(proposed_cfile_name)
-    outfilename = BPP_cdict["outfile"]
+    # run BPP, either as a single chain, or as concurrent replicate chains whose results are pooled
+    # in adaptive mode, the chains are run in segments, and stopped once the decision is stable
+    if adaptive_Enabled(mc_dict):
+        BPP_run_adaptive(cfile_names, target_dir, n_slots, prop_change, hm_param)
+    elif n_replicates == 1:
+        BPP_run_cached(cfile_names[0], cwd = target_dir)
+    else:
+        BPP_run_cached_concurrent(cfile_names, cwd = target_dir, n_slots = n_slots)
+    if n_replicates == 1:
+        outfile = os.path.join(target_dir, cdicts[0]["outfile"])
+        mcmcfile = os.path.join(target_dir, cdicts[0]["mcmcfile"])
+    else:
+        outfile = [os.path.join(target_dir, cdict["outfile"]) for cdict in cdicts]
+        mcmcfile = [os.path.join(target_dir, cdict["mcmcfile"]) for cdict in cdicts]
 
     # make decision about which proposals to accept based on BPP results and HM decision criteria
     accepted, to_iterate, decision = decisionModule(hm_param         = hm_param,
-                                                    BPP_outfile      = outfilename,
+                                                    BPP_outfile      = outfile,
                                                     proposed_changes = prop_change,
                                                     accepted_pops    = input_accepted_pops,
-                                                    halt_pop_number  = halt_pop_number)
+                                                    halt_pop_number  = halt_pop_number,
+                                                    output_dir       = target_dir,
+                                                    BPP_mcmcfile     = mcmcfile)
 
     # write tree and imap, and images corresponding to results
     imap, tree = get_HM_results(input_guide_tree, input_indpop_dict, accepted)
-    list_To_Imap    (imap, f"OUTPUT_IMAP_step_{step}.txt")
-    visualize_imap  (tree, Imap_to_PopInd_Dict(imap), outfilename, f"OUTPUT_IMAP_step_{step}.png")
-    write_Tree      (tree, f"OUTPUT_TREE_step_{step}.txt")
-    visualize_tree  (tree, f"OUTPUT_TREE_step_{step}.png")
-    visualize_decision  (prop_tree, get_MSC_param(outfilename, prop_change, hm_param), outfilename, prop_change, decision, f"DECISION_step_{step}.png")
-    visualize_progress  (input_guide_tree, accepted, f"GUIDE_VS_CURRENT_TREE_step_{step}.png")
-
-    os.chdir(parent_dir)
+    list_To_Imap    (imap, os.path.join(target_dir, f"OUTPUT_IMAP_step_{step}.txt"))
+    visualize_imap  (tree, Imap_to_PopInd_Dict(imap), outfile, os.path.join(target_dir, f"OUTPUT_IMAP_step_{step}.png"))
+    write_Tree      (tree, os.path.join(target_dir, f"OUTPUT_TREE_step_{step}.txt"))
+    visualize_tree  (tree, os.path.join(target_dir, f"OUTPUT_TREE_step_{step}.png"))
+    visualize_decision  (prop_tree, get_MSC_param(outfile, prop_change, hm_param, mcmcfile), outfile, prop_change, decision, os.path.join(target_dir, f"DECISION_step_{step}.png"))
+    visualize_progress  (input_guide_tree, accepted, os.path.join(target_dir, f"GUIDE_VS_CURRENT_TREE_step_{step}.png"))
     #-----------------------------#
     ###############################
 
@@ -274,17 +397,150 @@ def HMIteration (
     print(f"\nCURRENT IMAP:\n")
     pretty(Imap_to_PopInd_Dict(imap))
 
+    record_HM_step(input_mcfile, step, accepted, to_iterate, {"folder":  target_dir, 
+                                                              "outfile": outfile,
+                                                              "mcmcfile":mcmcfile,
+                                                              "imap":    os.path.join(target_dir, f"OUTPUT_IMAP_step_{step}.txt"),
+                                                              "tree":    os.path.join(target_dir, f"OUTPUT_TREE_step_{step}.txt")})
+
     return accepted, to_iterate
 
 
+# describe a clade of the guide tree in a single line of feedback
+def clade_name_line (
+        clade:              dict
+                    ) ->    str:
+
+    return f"{clade['name'].upper()}: {string_limit(clade['guide_tree'], 96)}"
+
+# run the hierarchical method independently on disjoint clades of the guide tree, and stitch their results together
+'''
+The guide tree is partitioned into the lowest clades with at least "clade_size" leaves. Each clade is an
+independent A00 problem, with its own guide tree, and an Imap and alignment holding only the individuals of
+the clade. The iterations of the clades run in lock-step, and the BPP jobs of all clades in an iteration run 
+concurrently. The merges accepted within each clade are then applied to the full guide tree, from where the
+regular iterations continue as a final pass over the whole tree. The merges within a clade are decided on the
+data of the clade alone, so the GDI values can differ slightly from those estimated on the full data.
+Returns the accepted populations of the full guide tree after the merges of the clades.
+'''
+def HMClades(
+        input_mcfile:           Master_control_file, 
+        input_guide_tree:       Tree_newick, 
+        input_indpop_dict, 
+        input_accepted_pops:    Population_list,
+        clade_size:             int,
+        resume:                 bool = False
+            ) ->                Population_list:
+
+    # replay the results if the clades were already finished before the run was interrupted
+    finished = completed_Stage(input_mcfile, "HM_clades", resume)
+    if finished != None:
+        print(f"THE CLADES OF THE HIERARCHICAL METHOD WERE ALREADY FINISHED, THEIR RESULTS ARE READ FROM THE JOURNAL\n")
+        return finished["accepted_pops"]
+
+    clade_trees = get_Clade_partition(input_guide_tree, clade_size)
+    if len(clade_trees) == 0:
+        print(f"{clprnt.YELLOW}[!] THE GUIDE TREE HAS NO CLADES WITH AT LEAST {clade_size} POPULATIONS, THE WHOLE TREE WILL BE ITERATED{clprnt.end}\n")
+        return input_accepted_pops
+
+    print(f"{clprnt.BLUE}\nBEGINNING THE HIERARCHICAL METHOD ON {len(clade_trees)} INDEPENDENT CLADES OF THE GUIDE TREE{clprnt.end}\n")
+    
+    mc_dict = read_MasterControl(input_mcfile)
+    hm_param = get_HM_parameters(input_mc_dict = mc_dict)
+    default_A00_param = get_known_BPP_param(input_mc_dict = mc_dict, BPP_mode = 'A00')
+    n_replicates = 1 if mc_dict["replicates"] == "?" else int(mc_dict["replicates"])
+
+    clades_dir = f'{input_mcfile[0:-4]}_2_HM_0_Clades'
+    create_TargetDir(clades_dir, f"The directory '{clades_dir}' was created to hold the results for the clades of the Hierarchical Method.", exist_ok = resume)
+    
+    # set up each clade as an independent problem, with its own Imap and alignment
+    clades = []
+    for i, clade_tree in enumerate(clade_trees):
+        clade_dir = os.path.abspath(os.path.join(clades_dir, f"clade_{i+1}"))
+        os.makedirs(clade_dir, exist_ok = True)
+        clade_leaves = leafname_list(clade_tree)
+        clade_indpop_dict = {indiv:pop for indiv, pop in input_indpop_dict.items() if pop in clade_leaves}
+        clade_param = {"seqfile":  os.path.join(clade_dir, "clade_MSA.phy"),
+                       "Imapfile": os.path.join(clade_dir, "clade_imap.txt")}
+        list_To_Imap([list(clade_indpop_dict.keys()), list(clade_indpop_dict.values())], clade_param["Imapfile"])
+        n_loci = write_Subset_alignment(default_A00_param["seqfile"], list(clade_indpop_dict.keys()), clade_param["seqfile"])
+        # the loci where none of the individuals of the clade were sequenced are absent from the clade alignment
+        clade_param["nloci"] = "?" if default_A00_param["nloci"] == "?" else str(min(int(default_A00_param["nloci"]), n_loci))
+        clade_pops, clade_halt_pop_number = get_HM_StartingState(clade_tree, [list(clade_indpop_dict.keys()), list(clade_indpop_dict.values())], "merge")[0:2]
+        clades.append({"name":            f"clade_{i+1}",
+                       "dir":             clade_dir,
+                       "guide_tree":      clade_tree,
+                       "indpop_dict":     clade_indpop_dict,
+                       "param":           clade_param,
+                       "start_pops":      clade_pops,
+                       "accepted_pops":   clade_pops,
+                       "halt_pop_number": clade_halt_pop_number,
+                       "to_iterate":      True})
+        print(clade_name_line(clades[-1]))
+
+    # iterate all clades in lock-step, until none of the clades can be merged further
+    step = 0
+    while any(clade["to_iterate"] == True for clade in clades):
+        step += 1
+        active = [clade for clade in clades if clade["to_iterate"] == True]
+        print(f"{clprnt.BLUE}\nBEGINNING ITERATION {step} OF THE HIERARCHICAL METHOD ON {len(active)} CLADES{clprnt.end}\n")
+        
+        # divide the cores between the chains of all active clades, and write the files of their BPP jobs
+        core_plan = plan_BPP_cores(len(active)*n_replicates, default_A00_param["threads"])
+        cfile_names = []
+        job_dirs = []
+        for i, clade in enumerate(active):
+            clade["step_dir"] = os.path.join(clade["dir"], f"step_{step}")
+            os.makedirs(clade["step_dir"], exist_ok = True)
+            threads = core_plan.threads[i*n_replicates:(i+1)*n_replicates]
+            clade["prop_change"], clade["prop_tree"], prop_imap, clade_cfile_names, clade_cdicts = prepare_HMIteration(mc_dict, clade["guide_tree"], clade["indpop_dict"], clade["accepted_pops"], step, clade["step_dir"], threads, feedback = False, clade_param = clade["param"])
+            clade["outfile"] = os.path.join(clade["step_dir"], clade_cdicts[0]["outfile"]) if n_replicates == 1 else [os.path.join(clade["step_dir"], cdict["outfile"]) for cdict in clade_cdicts]
+            clade["mcmcfile"] = os.path.join(clade["step_dir"], clade_cdicts[0]["mcmcfile"]) if n_replicates == 1 else [os.path.join(clade["step_dir"], cdict["mcmcfile"]) for cdict in clade_cdicts]
+            cfile_names += clade_cfile_names
+            job_dirs += [clade["step_dir"] for cfile_name in clade_cfile_names]
+        
+        # run the BPP jobs of all clades concurrently
+        BPP_run_cached_concurrent(cfile_names, cwd = job_dirs, n_slots = core_plan.n_slots)
+
+        # make the decision of each clade based on its own BPP results
+        for clade in active:
+            print(f"\n>> DECISION FOR {clade_name_line(clade)}\n")
+            clade["accepted_pops"], clade["to_iterate"], decision = decisionModule(hm_param         = hm_param,
+                                                                                   BPP_outfile      = clade["outfile"],
+                                                                                   proposed_changes = clade["prop_change"],
+                                                                                   accepted_pops    = clade["accepted_pops"],
+                                                                                   halt_pop_number  = clade["halt_pop_number"],
+                                                                                   output_dir       = clade["step_dir"],
+                                                                                   BPP_mcmcfile     = clade["mcmcfile"])
+            imap, tree = get_HM_results(clade["guide_tree"], clade["indpop_dict"], clade["accepted_pops"])
+            list_To_Imap        (imap, os.path.join(clade["step_dir"], f"OUTPUT_IMAP_step_{step}.txt"))
+            write_Tree          (tree, os.path.join(clade["step_dir"], f"OUTPUT_TREE_step_{step}.txt"))
+            visualize_decision  (clade["prop_tree"], get_MSC_param(clade["outfile"], clade["prop_change"], hm_param, clade["mcmcfile"]), clade["outfile"], clade["prop_change"], decision, os.path.join(clade["step_dir"], f"DECISION_step_{step}.png"))
+
+    # remove the populations merged within the clades from the populations of the full guide tree
+    merged_pops = [pop for clade in clades for pop in clade["start_pops"] if pop not in clade["accepted_pops"]]
+    accepted_pops = [pop for pop in input_accepted_pops if pop not in merged_pops]
+
+    print(f"\n>> RESULTS AFTER THE ITERATIONS ON THE CLADES:\n")
+    print("THE CURRENTLY ACCEPTED SPECIES ARE:\n")
+    for population in accepted_leaves(input_guide_tree, accepted_pops):
+        print(f"\t{population}")
+    print("\nTHE REMAINING MERGES WILL BE DECIDED ON THE FULL GUIDE TREE\n")
+
+    record_Stage(input_mcfile, "HM_clades", {"accepted_pops": accepted_pops,
+                                             "clades":        [clade["guide_tree"] for clade in clades]})
+
+    return accepted_pops
+
+
 # final wrapper function for starting and iterating through the Hierarchical Method
 def HierarchicalMethod  (
         input_mcfile:       Master_control_file, 
         input_guide_tree:   Tree_newick = None, 
         input_imap:         Imap_list = None,
+        resume:             bool = False
                         ):
 
-    parent_dir = os.getcwd()
     print(f"\n{clprnt.BLUE}BEGINNING THE HIERARCHICAL METHOD{clprnt.end}\n")
  
     mc_dict = read_MasterControl(input_mcfile)
@@ -328,6 +584,7 @@ def HierarchicalMethod  (
     HMmode = get_HM_parameters(mc_dict)["mode"]
     
     accepted_pops, halt_pop_number, start_tree, start_imap = get_HM_StartingState(guide_tree, input_imap, HMmode)
+    record_HM_start(input_mcfile, guide_tree, input_imap)
     
     accepted_pops_over_time = []
     if   HMmode == "merge":
@@ -359,13 +616,18 @@ def HierarchicalMethod  (
     
     # write files showing the user the starting state
     target_dir = f'{input_mcfile[0:-4]}_2_HM_0_StartState'
-    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the starting state of the Hierarchical Method.")
-    os.chdir(target_dir)
-    list_To_Imap    (start_imap, "HM_STARTING_IMAP.txt")
-    visualize_imap  (start_tree, Imap_to_PopInd_Dict(start_imap), BPP_outfile = None, image_name = "HM_STARTING_IMAP.png")
-    write_Tree      (start_tree, "HM_STARTING_TREE.txt")
-    visualize_tree  (start_tree, "HM_STARTING_TREE.png")
-    os.chdir(parent_dir)
+    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the starting state of the Hierarchical Method.", exist_ok = resume)
+    list_To_Imap    (start_imap, os.path.join(target_dir, "HM_STARTING_IMAP.txt"))
+    visualize_imap  (start_tree, Imap_to_PopInd_Dict(start_imap), BPP_outfile = None, image_name = os.path.join(target_dir, "HM_STARTING_IMAP.png"))
+    write_Tree      (start_tree, os.path.join(target_dir, "HM_STARTING_TREE.txt"))
+    visualize_tree  (start_tree, os.path.join(target_dir, "HM_STARTING_TREE.png"))
+
+    # merge the populations within large clades of the guide tree independently, before iterating the whole tree
+    if mc_dict["clade_size"] != "?":
+        if HMmode == "merge":
+            accepted_pops = HMClades(input_mcfile, guide_tree, indpop_dict, accepted_pops, int(mc_dict["clade_size"]), resume)
+        else:
+            print(f"{clprnt.YELLOW}[!] THE CLADES OF THE GUIDE TREE CAN ONLY BE ITERATED INDEPENDENTLY IN MERGE MODE, THE WHOLE TREE WILL BE ITERATED{clprnt.end}\n")
 
 
 
@@ -374,6 +636,13 @@ def HierarchicalMethod  (
     #-----------------------------#
     step = 0
     to_iterate = True
+    # replay the iterations that were finished before the run was interrupted from the journal
+    for finished_step in completed_HM_steps(input_mcfile, resume):
+        step = finished_step["step"]
+        accepted_pops = finished_step["accepted_pops"]
+        to_iterate = finished_step["to_iterate"]
+        accepted_pops_over_time.append(accepted_leaves(guide_tree, accepted_pops))
+        print(f"ITERATION {step} OF THE HIERARCHICAL METHOD WAS ALREADY FINISHED, ITS RESULTS ARE READ FROM THE JOURNAL")
     # run the HM until no more merges or splits can be executed
     while to_iterate == True:
         step += 1
@@ -382,7 +651,8 @@ def HierarchicalMethod  (
                                                 input_indpop_dict   = indpop_dict,
                                                 input_accepted_pops = accepted_pops,
                                                 halt_pop_number     = halt_pop_number,
-                                                step                = step)
+                                                step                = step,
+                                                resume              = resume)
         accepted_pops_over_time.append(accepted_leaves(guide_tree, accepted_pops))
     #-----------------------------#
     ###############################
@@ -394,7 +664,7 @@ def HierarchicalMethod  (
     
     # write final output state to an output folder
     target_dir = f'{input_mcfile[0:-4]}_Final_Result'
-    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the the final results.")
+    create_TargetDir(target_dir, f"The directory '{target_dir}' was created to hold the the final results.", exist_ok = resume)
     final_folder = f'{input_mcfile[0:-4]}_2_HM_{step}'
     shutil.copy(src = os.path.join(final_folder, f"OUTPUT_IMAP_step_{step}.txt"), dst = target_dir)
     shutil.copy(src = os.path.join(final_folder, f"OUTPUT_IMAP_step_{step}.png"), dst = target_dir)
@@ -25,7 +25,9 @@ import distinctipy
 # HELPER DEPENDENCIES
 from helper_functions import flatten
 from helper_functions import string_limit
-from helper_functions import extract_Name_TauTheta_dict
+
+# NODE TABLE DEPENDENCIES
+from node_table_module import node_Table
 
 ## TYPE HINTING 
 from custom_types import Species_name
@@ -89,6 +91,25 @@ def get_Splitable_from_tree (
     
     return splitpairs
 
+# partition the guide tree into disjoint clades with at least "clade_size" leaves
+'''
+The clades are the lowest non-root nodes with at least "clade_size" leaves, where neither child node
+reaches the size on its own. Clades found this way never overlap. Returns the clades as newick trees.
+'''
+def get_Clade_partition (
+        guide_tree:                 Tree_newick,
+        clade_size:                 int
+                        ) ->        list[Tree_newick]:
+
+    tree = Tree(guide_tree)
+    
+    clades = []
+    for node in tree.traverse("postorder"):
+        if not node.is_root() and len(node) >= clade_size and all(len(child) < clade_size for child in node.children):
+            clades.append(tree_To_Newick(node))
+    
+    return clades
+
 # small wrapper function that returns an ete3 tree in a newick formatted string
 def tree_To_Newick  (
         tree:               Tree
@@ -102,7 +123,7 @@ def write_Tree  (
         filename:       file_path,
                 ):
     
-    f = open(filename, "x")
+    f = open(filename, "w")
     f.writelines([f"{tree}"])
 
 # display the ASCII representation of the tree
@@ -240,8 +261,9 @@ def visualize_decision(proposed_tree, MSC_param, BPP_outfile, proposed_changes,
             rejected_changes.append(item)
 
     # collect the split ages
-    tau_dict = extract_Name_TauTheta_dict(BPP_outfile)[0]
-    theta_dict = extract_Name_TauTheta_dict(BPP_outfile)[1]
+    node_table = node_Table(BPP_outfile)
+    tau_dict = node_table.tau_Dict()
+    theta_dict = node_table.theta_Dict()
 
     # collect the decision parameters that are going to be visualized
     gdi_dict = {}
@@ -417,7 +439,7 @@ def visualize_imap(current_tree, popind_dict, BPP_outfile = None, image_name = "
     # if node lengths are available, make the tree ultrametric using the actual tau values
     elif BPP_outfile != None:
         # collect the split ages and add onto the tree
-        tau_dict = extract_Name_TauTheta_dict(BPP_outfile)[0]
+        tau_dict = node_Table(BPP_outfile).tau_Dict()
         for node in tree.iter_descendants("levelorder"):
             ancestor = node.up
             if ancestor.name in tau_dict: